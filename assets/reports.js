@@ -0,0 +1,102 @@
+// Lists the weekly MNE reports from the reports manifest (files/reports.jsonl),
+// which the pipeline appends a record to for each report it publishes. Fills
+// every table with a data-reports-manifest attribute, keeping the latest
+// record of each report, newest first, and at most data-limit of them.
+document.addEventListener("DOMContentLoaded", function () {
+  function formatBytes(bytes) {
+    if (bytes == null) {
+      return "";
+    }
+    var units = ["B", "KB", "MB", "GB"];
+    var unit = 0;
+    while (bytes >= 1024 && unit < units.length - 1) {
+      bytes /= 1024;
+      unit += 1;
+    }
+    return (unit ? bytes.toFixed(1) : bytes) + " " + units[unit];
+  }
+
+  function formatCount(count) {
+    return count == null ? "" : String(count);
+  }
+
+  function cell(row, content) {
+    var td = document.createElement("td");
+    if (content instanceof Node) {
+      td.appendChild(content);
+    } else {
+      td.textContent = content;
+    }
+    row.appendChild(td);
+  }
+
+  function link(href, text) {
+    var a = document.createElement("a");
+    a.href = href;
+    a.textContent = text;
+    return a;
+  }
+
+  function viewLinks(views) {
+    var span = document.createElement("span");
+    (views || []).forEach(function (path, index) {
+      if (index) {
+        span.appendChild(document.createTextNode(", "));
+      }
+      var name = path.split("_view-").pop().replace(/\.html$/, "");
+      span.appendChild(link(path, name));
+    });
+    return span;
+  }
+
+  function readManifest(text) {
+    var latest = {};
+    text.split("\n").forEach(function (line) {
+      if (line.trim()) {
+        var record = JSON.parse(line);
+        latest[record.path] = record;
+      }
+    });
+    return Object.keys(latest)
+      .map(function (path) { return latest[path]; })
+      .sort(function (a, b) {
+        return a.date < b.date ? 1 : a.date > b.date ? -1 : 0;
+      });
+  }
+
+  document.querySelectorAll("table[data-reports-manifest]").forEach(function (table) {
+    var body = table.querySelector("tbody");
+    var limit = parseInt(table.dataset.limit, 10);
+    fetch(table.dataset.reportsManifest, { cache: "no-cache" })
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.statusText);
+        }
+        return response.text();
+      })
+      .then(function (text) {
+        var reports = readManifest(text);
+        if (limit > 0) {
+          reports = reports.slice(0, limit);
+        }
+        body.textContent = "";
+        reports.forEach(function (report) {
+          var row = document.createElement("tr");
+          cell(row, link(report.path, report.date));
+          cell(row, report.week);
+          cell(row, formatCount(report.figures));
+          cell(row, formatCount(report.subjects));
+          cell(row, formatCount(report.tasks));
+          cell(row, formatBytes(report.bytes));
+          cell(row, viewLinks(report.views));
+          body.appendChild(row);
+        });
+        if (!reports.length) {
+          body.innerHTML = '<tr><td colspan="7">No report published yet.</td></tr>';
+        }
+      })
+      .catch(function () {
+        body.innerHTML = '<tr><td colspan="7">Could not load the reports list.</td></tr>';
+      });
+  });
+});
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import html
+import shutil
+import tarfile
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from string import Template
+
+from publish import run_git, PUSH_REMOTE
+from assets import referenced_assets, prune_assets
+from pipeline_config import logger, GITHUB_REPO_PATH, GITHUB_FILES_PATH
+
+# Configuration
+# Published reports older than this many days are archived when archive
+# mode is on
+ARCHIVE_AFTER_DAYS = 90
+# Archived week directories are packed into one compressed bundle per
+# quarter, <YYYY>-Q<n>.tar.xz, kept on this branch rather than on the
+# site's branch. The branch is a single commit, replaced whenever a bundle
+# changes (and force-pushed), so it never holds more than the current
+# bundles; the site's working clone can leave it out altogether (git
+# clone --single-branch).
+ARCHIVE_BRANCH = "report-archive"
+# Where the bundles are downloaded from; left empty, it is derived from the
+# GitHub remote the site is pushed to (see archive_url())
+ARCHIVE_URL = ""
+GITHUB_REMOTE_PATTERN = re.compile(r"github\.com[:/]([^/]+)/([^/]+?)(?:\.git)?/?$")
+# Lightweight index of the archived reports, on the site's branch
+GITHUB_ARCHIVE_PATH = os.path.join(GITHUB_FILES_PATH, "archive")
+ARCHIVE_MANIFEST = "archive.json"
+
+WEEK_DIR_PATTERN = re.compile(r"^week\d+_\d{4}$")
+REPORT_DATE_PATTERN = re.compile(r"^mne_report_(\d{4}-\d{2}-\d{2})")
+# First line of the stubs left in place of archived reports
+STUB_MARKER = "<!-- archived-report -->"
+
+STUB_TEMPLATE = Template("""<!doctype html>
+$marker
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <title>$report (archived) | pi-aiche-dee</title>
+  <link rel="stylesheet" href="../../assets/style.css">
+</head>
+<body>
+  <main class="container">
+    <section class="hero">
+      <div class="kicker">Archived report</div>
+      <h1>$report</h1>
+      <p>This report was archived on $archived. It is <code>$member</code> in the $quarter bundle.</p>
+      <p><a href="$bundle_url">Download $bundle</a> &middot; <a href="../archive/index.html">All archived reports</a></p>
+    </section>
+  </main>
+</body>
+</html>
+""")
+
+INDEX_TEMPLATE = Template("""<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <title>Archived reports | pi-aiche-dee</title>
+  <link rel="stylesheet" href="../../assets/style.css">
+</head>
+<body>
+  <main class="container">
+    <section class="hero">
+      <div class="kicker">Report Archive</div>
+      <h1>Archived reports</h1>
+      <p>Reports older than $max_age days, packed into one bundle per quarter.</p>
+    </section>
+    
+    <section class="section">
+      <table class="table">
+        <thead>
+          <tr>
+            <th>Date</th>
+            <th>Report</th>
+            <th>Bundle</th>
+          </tr>
+        </thead>
+        <tbody>
+$rows
+        </tbody>
+      </table>
+    </section>
+  </main>
+</body>
+</html>
+""")
+
+INDEX_ROW_TEMPLATE = Template("""          <tr>
+            <td>$date</td>
+            <td><a href="../$path">$member</a></td>
+            <td><a href="$bundle_url">$bundle</a></td>
+          </tr>""")
+
+def report_date(filename):
+    """Date of a report from its filename, or None"""
+    match = REPORT_DATE_PATTERN.match(filename)
+    return datetime.strptime(match.group(1), "%Y-%m-%d") if match else None
+
+def quarter_bundle(date):
+    """Name of the bundle of the quarter of a date"""
+    return f"{date.year}-Q{(date.month - 1) // 3 + 1}.tar.xz"
+
+def is_stub(file_path):
+    """Whether a published report is the stub of an archived one"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        f.readline()
+        return f.readline().strip() == STUB_MARKER
+
+def archive_candidates(files_path, cutoff):
+    """
+    Find the published week directories whose reports are all older than
+    cutoff and not archived yet
+    
+    Returns:
+    --------
+    dict
+        Mapping of bundle name to the list of (week_dir, report filenames)
+        it should receive
+    """
+    candidates = {}
+    for week_dir in sorted(os.listdir(files_path)):
+        week_path = os.path.join(files_path, week_dir)
+        if not WEEK_DIR_PATTERN.match(week_dir) or not os.path.isdir(week_path):
+            continue
+        reports = [
+            name for name in sorted(os.listdir(week_path))
+            if name.endswith('.html') and report_date(name)
+            and not is_stub(os.path.join(week_path, name))
+        ]
+        if not reports:
+            continue
+        latest = max(report_date(name) for name in reports)
+        if latest < cutoff:
+            candidates.setdefault(quarter_bundle(latest), []).append((week_dir, reports))
+    return candidates
+
+def branch_file_exists(spec, repo_path=None):
+    """Whether <rev>:<path> names an object of the repository"""
+    try:
+        run_git(["cat-file", "-e", spec], repo_path)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+def archive_branch_exists(repo_path=None):
+    """Whether the archive branch exists in the website repository"""
+    return branch_file_exists(f"refs/heads/{ARCHIVE_BRANCH}", repo_path)
+
+def archive_url(repo_path=None):
+    """
+    URL of the directory the bundles are downloaded from: ARCHIVE_URL if
+    set, otherwise the raw files of ARCHIVE_BRANCH on the GitHub repository
+    of the site's PUSH_REMOTE
+    """
+    if ARCHIVE_URL:
+        return ARCHIVE_URL
+    remote_url = run_git(["remote", "get-url", PUSH_REMOTE], repo_path).strip()
+    match = GITHUB_REMOTE_PATTERN.search(remote_url)
+    if not match:
+        raise ValueError(
+            f"Cannot tell the archive URL from the {PUSH_REMOTE} remote ({remote_url}), "
+            "set ARCHIVE_URL"
+        )
+    owner, repository = match.groups()
+    return f"https://github.com/{owner}/{repository}/raw/{ARCHIVE_BRANCH}/"
+
+def write_bundle(bundle_path, files_path, week_dirs, previous_path=None, asset_names=()):
+    """
+    Write a bundle of week directories (paths relative to files_path) and
+    of the shared assets their reports use, under assets/ so that the
+    reports find them once the bundle is extracted. The members of the
+    previous bundle of the quarter, if any, that are not replaced are kept.
+    """
+    asset_members = {f"assets/{asset_name}" for asset_name in asset_names}
+    with tarfile.open(bundle_path, 'w:xz') as bundle:
+        if previous_path:
+            with tarfile.open(previous_path, 'r:xz') as previous:
+                for member in previous:
+                    if (member.name.split('/', 1)[0] in week_dirs
+                            or member.name in asset_members):
+                        continue
+                    bundle.addfile(
+                        member, previous.extractfile(member) if member.isfile() else None
+                    )
+        for week_dir in week_dirs:
+            bundle.add(os.path.join(files_path, week_dir), arcname=week_dir)
+        for asset_name in sorted(asset_names):
+            asset_path = os.path.join(files_path, "assets", asset_name)
+            if os.path.exists(asset_path):
+                bundle.add(asset_path, arcname=f"assets/{asset_name}")
+            else:
+                logger.warning(f"Asset {asset_name} of an archived report is not published")
+
+def commit_bundles(bundles, commit_message, repo_path=None):
+    """
+    Replace the archive branch by a single commit holding its bundles and
+    the given ones, made with git plumbing through a temporary index so
+    the site's index and working tree are left alone
+    
+    Parameters:
+    -----------
+    bundles : dict
+        Mapping of bundle name to the path of its file
+    """
+    repo_path = repo_path or GITHUB_REPO_PATH
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = {'GIT_INDEX_FILE': os.path.join(temp_dir, 'index')}
+        parent = None
+        if archive_branch_exists(repo_path):
+            parent = run_git(["rev-parse", f"refs/heads/{ARCHIVE_BRANCH}"], repo_path).strip()
+            run_git(["read-tree", parent], repo_path, env=env)
+        for bundle_name, bundle_path in bundles.items():
+            blob = run_git(["hash-object", "-w", "--", bundle_path], repo_path).strip()
+            run_git(
+                ["update-index", "--add", "--cacheinfo", f"100644,{blob},{bundle_name}"],
+                repo_path, env=env
+            )
+        tree = run_git(["write-tree"], repo_path, env=env).strip()
+    commit = run_git(["commit-tree", tree, "-m", commit_message], repo_path).strip()
+    run_git(
+        ["update-ref", "-m", f"commit: {commit_message}", f"refs/heads/{ARCHIVE_BRANCH}",
+         commit, *([parent] if parent else [])],
+        repo_path
+    )
+    return commit
+
+def write_archive_index(entries, max_age_days, bundles_url, archive_path=None):
+    """
+    Write the manifest of the archived reports and the page listing them,
+    linking to the bundles under bundles_url
+    
+    Returns:
+    --------
+    list
+        Paths of the files written
+    """
+    archive_path = archive_path or GITHUB_ARCHIVE_PATH
+    os.makedirs(archive_path, exist_ok=True)
+    manifest_path = os.path.join(archive_path, ARCHIVE_MANIFEST)
+    with open(manifest_path, 'w') as f:
+        json.dump({'reports': entries}, f, indent=1)
+    
+    rows = "\n".join(
+        INDEX_ROW_TEMPLATE.substitute(
+            date=html.escape(entry['date']), path=html.escape(entry['path']),
+            member=html.escape(entry['path']), bundle=html.escape(entry['bundle']),
+            bundle_url=html.escape(f"{bundles_url}{entry['bundle']}")
+        )
+        for entry in sorted(entries, key=lambda entry: (entry['date'], entry['path']), reverse=True)
+    )
+    index_path = os.path.join(archive_path, "index.html")
+    with open(index_path, 'w') as f:
+        f.write(INDEX_TEMPLATE.substitute(max_age=max_age_days, rows=rows))
+    return [manifest_path, index_path]
+
+def archive_old_reports(max_age_days=None, today=None, repo_path=None):
+    """
+    Move the published reports older than max_age_days out of the site's
+    branch: their week directories are packed into per-quarter bundles on
+    ARCHIVE_BRANCH, with the shared assets they use, and each report is
+    replaced by a stub linking to its bundle, so links to it keep working.
+    files/archive/ lists every archived report. Assets no report left on
+    the site uses are then removed from files/assets/.
+    
+    Returns:
+    --------
+    list
+        Paths written or removed on the site's branch, to be committed
+    """
+    max_age_days = ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+    repo_path = repo_path or GITHUB_REPO_PATH
+    files_path = os.path.join(repo_path, "files")
+    archive_path = os.path.join(files_path, "archive")
+    today = today or datetime.now()
+    try:
+        if not os.path.isdir(files_path):
+            return []
+        candidates = archive_candidates(files_path, today - timedelta(days=max_age_days))
+        if not candidates:
+            logger.info(f"No published report older than {max_age_days} days to archive")
+            return []
+        bundles_url = archive_url(repo_path)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            bundles = {}
+            for bundle_name, weeks in candidates.items():
+                previous_path = None
+                if branch_file_exists(f"refs/heads/{ARCHIVE_BRANCH}:{bundle_name}", repo_path):
+                    previous_path = os.path.join(temp_dir, f"previous-{bundle_name}")
+                    with open(previous_path, 'wb') as f:
+                        subprocess.run(
+                            ["git", "-C", repo_path, "cat-file", "blob",
+                             f"refs/heads/{ARCHIVE_BRANCH}:{bundle_name}"],
+                            stdout=f, check=True
+                        )
+                bundles[bundle_name] = os.path.join(temp_dir, bundle_name)
+                week_dirs = [week_dir for week_dir, _ in weeks]
+                write_bundle(
+                    bundles[bundle_name], files_path, week_dirs, previous_path,
+                    referenced_assets(os.path.join(files_path, week_dir) for week_dir in week_dirs)
+                )
+            cutoff = today - timedelta(days=max_age_days)
+            commit_bundles(bundles, f"Archive reports older than {cutoff:%Y-%m-%d}", repo_path)
+        
+        # Only once the bundles are committed, replace the week
+        # directories by stubs of their reports
+        manifest_path = os.path.join(archive_path, ARCHIVE_MANIFEST)
+        entries = []
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                entries = json.load(f)['reports']
+        archived = today.strftime("%Y-%m-%d")
+        changed = []
+        for bundle_name, weeks in candidates.items():
+            quarter = bundle_name[:-len('.tar.xz')]
+            for week_dir, reports in weeks:
+                week_path = os.path.join(files_path, week_dir)
+                shutil.rmtree(week_path)
+                os.makedirs(week_path)
+                changed.append(week_path)
+                for report in reports:
+                    member = f"{week_dir}/{report}"
+                    with open(os.path.join(week_path, report), 'w') as f:
+                        f.write(STUB_TEMPLATE.substitute(
+                            marker=STUB_MARKER, report=html.escape(report),
+                            archived=archived, member=html.escape(member), quarter=quarter,
+                            bundle=bundle_name, bundle_url=f"{bundles_url}{bundle_name}"
+                        ))
+                    entries = [entry for entry in entries if entry['path'] != member]
+                    entries.append({
+                        'date': report_date(report).strftime("%Y-%m-%d"),
+                        'path': member,
+                        'bundle': bundle_name,
+                        'archived': archived
+                    })
+        changed.extend(write_archive_index(entries, max_age_days, bundles_url, archive_path))
+        
+        # The archived reports take their assets along
+        changed.extend(prune_assets(
+            referenced_assets(
+                os.path.join(files_path, week_dir) for week_dir in os.listdir(files_path)
+                if WEEK_DIR_PATTERN.match(week_dir)
+            ),
+            os.path.join(files_path, "assets")
+        ))
+        logger.info(
+            f"Archived {sum(len(weeks) for weeks in candidates.values())} week(s) of "
+            f"reports into {len(candidates)} bundle(s) on {ARCHIVE_BRANCH}"
+        )
+        return changed
+    except Exception as e:
+        logger.error(f"Error archiving old reports: {str(e)}")
+        return []
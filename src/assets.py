@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import os
+import re
+import shutil
+
+from metadata_store import compute_file_hash
+from pipeline_config import logger, LOCAL_REPORT_PATH, GITHUB_REPO_PATH
+
+# Configuration
+# Content-addressed store of report images, named <sha256>.<ext>. It is
+# published as files/assets/, next to the files/week*/ report directories.
+LOCAL_ASSET_PATH = os.path.join(LOCAL_REPORT_PATH, "assets")
+GITHUB_ASSET_PATH = os.path.join(GITHUB_REPO_PATH, "files", "assets")
+# URL of the published asset store, relative to a published report
+ASSET_URL_PREFIX = "../assets/"
+# Asset references in report HTML (and in the sections of paged reports,
+# which are inserted into the report page)
+ASSET_URL_PATTERN = re.compile(re.escape(ASSET_URL_PREFIX) + r"([0-9a-f]{64}\.\w+)")
+
+def store_asset(file_path, file_hash=None):
+    """
+    Add a file to the asset store under its content hash (computed when
+    file_hash is not given)
+    
+    Returns:
+    --------
+    str
+        The asset name, <sha256>.<ext>
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    asset_name = f"{file_hash or compute_file_hash(file_path)}{extension}"
+    asset_path = os.path.join(LOCAL_ASSET_PATH, asset_name)
+    if not os.path.exists(asset_path):
+        os.makedirs(LOCAL_ASSET_PATH, exist_ok=True)
+        temp_path = f"{asset_path}.{os.getpid()}.tmp"
+        try:
+            os.link(file_path, temp_path)
+        except OSError:
+            shutil.copy2(file_path, temp_path)
+        os.replace(temp_path, asset_path)
+    return asset_name
+
+def asset_url(asset_name):
+    """URL of an asset as referenced from a published report"""
+    return f"{ASSET_URL_PREFIX}{asset_name}"
+
+def referenced_assets(paths):
+    """
+    Names of the assets referenced by reports
+    
+    Parameters:
+    -----------
+    paths : iterable
+        Report files, or directories whose HTML files are all read
+    
+    Returns:
+    --------
+    set
+        Asset names, <sha256>.<ext>
+    """
+    html_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            html_paths.extend(
+                os.path.join(dirpath, filename)
+                for dirpath, _, filenames in os.walk(path)
+                for filename in filenames if filename.endswith('.html')
+            )
+        elif os.path.isfile(path):
+            html_paths.append(path)
+    names = set()
+    for html_path in html_paths:
+        with open(html_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                names.update(ASSET_URL_PATTERN.findall(line))
+    return names
+
+def publish_assets(asset_names, dest_path=None):
+    """
+    Copy the given assets to the published store, unless they are already
+    there; as names are content hashes, an existing file never needs to
+    be replaced
+    
+    Returns:
+    --------
+    list
+        Paths of the assets copied
+    """
+    dest_path = dest_path or GITHUB_ASSET_PATH
+    copied = []
+    for asset_name in sorted(asset_names):
+        published_path = os.path.join(dest_path, asset_name)
+        if os.path.exists(published_path):
+            continue
+        asset_path = os.path.join(LOCAL_ASSET_PATH, asset_name)
+        if not os.path.exists(asset_path):
+            logger.warning(f"Asset {asset_name} is missing from {LOCAL_ASSET_PATH}")
+            continue
+        os.makedirs(dest_path, exist_ok=True)
+        shutil.copy2(asset_path, published_path)
+        copied.append(published_path)
+    logger.info(f"Published {len(copied)} new asset(s) to {dest_path}")
+    return copied
+
+def prune_assets(asset_names, dest_path=None):
+    """
+    Remove the published assets that are not in asset_names, the assets
+    still referenced by a published report
+    
+    Returns:
+    --------
+    list
+        Paths of the assets removed
+    """
+    dest_path = dest_path or GITHUB_ASSET_PATH
+    if not os.path.isdir(dest_path):
+        return []
+    removed = []
+    for asset_name in sorted(os.listdir(dest_path)):
+        if asset_name not in asset_names:
+            os.remove(os.path.join(dest_path, asset_name))
+            removed.append(os.path.join(dest_path, asset_name))
+    logger.info(f"Removed {len(removed)} asset(s) no published report uses from {dest_path}")
+    return removed
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark filename parsing: the per-stage regex/split code the pipeline used
+before figure_names.py, against one parse_figure_name() call per filename.
+
+Both sides derive what organization and report generation need for every
+figure: metadata, main component, subcategory parts and title parts.
+
+Also times a one-pass scan over the '_'-separated parts (token_scan_parse),
+the alternative to the per-field regexes parse_figure_name() runs, and counts
+the names it reads differently.
+"""
+import os
+import re
+import time
+import random
+import argparse
+import gc
+
+from figure_names import (
+    METADATA_PATTERNS, COMMON_TERMS, parse_figure_name, parse_figure_names,
+    figure_name_metadata
+)
+
+
+def make_names(count, seed=0):
+    """Generate synthetic BIDS-style figure filenames"""
+    rng = random.Random(seed)
+    experiments = ['mindsentences', 'probe', 'expertlm', 'distraction']
+    analyses = ['decoding', 'erp', 'topo', 'source', 'tfr', 'connectivity']
+    names = []
+    for i in range(count):
+        parts = [rng.choice(experiments), rng.choice(analyses),
+                 f"sub-{rng.randint(1, 40):02d}"]
+        if rng.random() < 0.7:
+            parts.append(f"ses-{rng.randint(1, 3)}")
+        parts.append(f"task-{rng.choice(['read', 'listen', 'repeat'])}")
+        if rng.random() < 0.5:
+            parts.append(f"cond-{rng.choice(['nat', 'ctrl'])}")
+        if rng.random() < 0.5:
+            parts.append(f"{rng.choice('NP')}{rng.choice([100, 200, 400, 600])}")
+        parts.append(rng.choice(['meg', 'eeg']))
+        parts.append(f"2025{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}T"
+                     f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}{i % 60:02d}")
+        names.append('_'.join(parts) + '.png')
+    return names
+
+
+def legacy_parse(filename):
+    """The previous per-stage parsing, as done across sync_org and gen_report"""
+    # organize_figures(): extract_metadata()
+    metadata = {}
+    for key, pattern in METADATA_PATTERNS.items():
+        match = re.search(pattern, filename)
+        if match:
+            metadata[key] = match.group(1)
+    
+    # generate_mne_report(): overview stats, then grouping
+    overview_component = os.path.splitext(filename)[0].split('_')[0].lower()
+    main_component = os.path.splitext(filename)[0].split('_')[0].lower()
+    
+    # parse_remaining_components()
+    remaining_parts = os.path.splitext(filename)[0].split('_')[1:]
+    sub_parts = [part.lower() for part in remaining_parts
+                 if len(part) >= 3 and not part.isdigit()
+                 and part.lower() not in COMMON_TERMS]
+    
+    # Figure title
+    title_parts = os.path.splitext(filename)[0].split('_')
+    return metadata, main_component, sub_parts, title_parts
+
+
+def token_scan_parse(filename):
+    """
+    Parse a filename in one pass over its '_'-separated parts, matching each
+    part against the field prefixes instead of searching the whole name
+    """
+    parts = os.path.splitext(filename)[0].split('_')
+    metadata = {}
+    sub_parts = []
+    for index, part in enumerate(parts):
+        lower = part.lower()
+        if index and len(lower) >= 3 and not lower.isdigit() and lower not in COMMON_TERMS:
+            sub_parts.append(lower)
+        if part.startswith('sub-'):
+            metadata.setdefault('subject', part[4:])
+        elif part.startswith('task-'):
+            metadata.setdefault('task', part[5:])
+        elif part.startswith('cond-'):
+            metadata.setdefault('condition', part[5:])
+        elif part in ('meg', 'eeg', 'source', 'topo'):
+            metadata.setdefault('analysis_type', part)
+        elif part[:1] in ('N', 'P') and part[1:].isdigit():
+            metadata.setdefault('component', part)
+        elif len(part) == 15 and part[8] == 'T' and part[:8].isdigit() and part[9:].isdigit():
+            metadata.setdefault('timestamp', part)
+    return metadata, parts[0].lower(), sub_parts, parts
+
+
+def as_legacy_results(records):
+    """Convert FigureName records to legacy_parse() results for comparison"""
+    return [
+        (figure_name_metadata(record), record.main_component,
+         list(record.sub_parts), list(record.parts))
+        for record in records
+    ]
+
+
+def timed(function, *args):
+    """Run function with the garbage collector paused, return (result, seconds)"""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark figure filename parsing')
+    parser.add_argument('--names', type=int, default=100000,
+                        help='Number of synthetic filenames (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timing repetitions, best is reported (default: 3)')
+    args = parser.parse_args()
+    
+    names = make_names(args.names)
+    
+    legacy_times = []
+    new_times = []
+    token_scan_times = []
+    for _ in range(args.repeat):
+        legacy_results, elapsed = timed(lambda: [legacy_parse(name) for name in names])
+        legacy_times.append(elapsed)
+        
+        parse_figure_name.cache_clear()
+        records, elapsed = timed(parse_figure_names, names)
+        new_times.append(elapsed)
+        
+        token_scan_results, elapsed = timed(lambda: [token_scan_parse(name) for name in names])
+        token_scan_times.append(elapsed)
+    
+    # Later stages hit the cache instead of parsing again
+    _, cached_time = timed(parse_figure_names, names)
+    
+    if legacy_results != as_legacy_results(records):
+        raise SystemExit("Parsed results differ from the legacy parser")
+    
+    print(f"{len(names)} filenames, results identical")
+    print(f"legacy per-stage parsing : {min(legacy_times):.3f} s")
+    print(f"parse_figure_name()      : {min(new_times):.3f} s "
+          f"({min(legacy_times) / min(new_times):.1f}x faster)")
+    print(f"cached re-use            : {cached_time:.3f} s")
+    differing = sum(
+        token[0] != legacy[0] for token, legacy in zip(token_scan_results, legacy_results)
+    )
+    print(f"one-pass token scan      : {min(token_scan_times):.3f} s, "
+          f"metadata differs for {differing} of {len(names)} names")
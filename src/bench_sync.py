@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the rsync and archive sync transports.
+
+A local directory stands in for the cluster: both transports are pointed at
+it with an empty host, so rsync reads it directly and the tar stream is
+produced by a local shell instead of over SSH. Network latency is therefore
+not included; run against a real host with --host to measure it.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+
+import sync_org
+
+
+def make_fake_figures(directory, count, size, start=0):
+    """Write count small random files that look like figure PNGs"""
+    os.makedirs(directory, exist_ok=True)
+    for i in range(start, start + count):
+        path = os.path.join(
+            directory, f"mindsentences_sub-{i % 30:02d}_task-read_fig{i:06d}.png"
+        )
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+
+
+def run_transport(transport, local_dir, host, remote_path):
+    """Sync into local_dir with the given transport and return elapsed seconds"""
+    sync_org.LOCAL_FIG_PATH = local_dir
+    sync_org.SYNC_MANIFEST_FILE = os.path.join(local_dir, "sync_manifest.json")
+    sync_org.SYNC_STAGING_PATH = os.path.join(local_dir, os.pardir, f"incoming_{transport}")
+    
+    sources = [{'name': 'bench', 'host': host, 'path': remote_path}]
+    start = time.perf_counter()
+    if transport == 'archive':
+        ok = sync_org.sync_figures_archive(sources=sources)
+    else:
+        ok = sync_org.sync_figures_incremental(sources=sources)
+    elapsed = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(f"{transport} sync failed")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark figure sync transports')
+    parser.add_argument('--files', type=int, default=2000,
+                        help='Number of figures in the stand-in remote (default: 2000)')
+    parser.add_argument('--size', type=int, default=20000,
+                        help='Size of each figure in bytes (default: 20000)')
+    parser.add_argument('--new', type=int, default=200,
+                        help='Figures added before the second, incremental run (default: 200)')
+    parser.add_argument('--host', default='',
+                        help='SSH host serving --remote-path instead of a local stand-in')
+    parser.add_argument('--remote-path',
+                        help='Remote directory to sync (default: a generated temp dir)')
+    parser.add_argument('--transports', nargs='+', default=list(sync_org.SYNC_TRANSPORTS),
+                        choices=sync_org.SYNC_TRANSPORTS)
+    args = parser.parse_args()
+    
+    logging.getLogger("mne_pipeline").setLevel(logging.WARNING)
+    work_dir = tempfile.mkdtemp(prefix="bench_sync_")
+    try:
+        remote_path = args.remote_path
+        if remote_path is None:
+            remote_path = os.path.join(work_dir, "remote") + os.sep
+            make_fake_figures(remote_path, args.files, args.size)
+        
+        results = {}
+        for transport in args.transports:
+            local_dir = os.path.join(work_dir, f"local_{transport}") + os.sep
+            results[transport] = [run_transport(transport, local_dir, args.host, remote_path)]
+        
+        if args.remote_path is None and args.new:
+            make_fake_figures(remote_path, args.new, args.size, start=args.files)
+            for transport in args.transports:
+                local_dir = os.path.join(work_dir, f"local_{transport}") + os.sep
+                results[transport].append(
+                    run_transport(transport, local_dir, args.host, remote_path)
+                )
+        
+        print(f"{'transport':<10} {'full sync (s)':>14} {'incremental (s)':>16}")
+        for transport, timings in results.items():
+            incremental = f"{timings[1]:.3f}" if len(timings) > 1 else "-"
+            print(f"{transport:<10} {timings[0]:>14.3f} {incremental:>16}")
+    finally:
+        shutil.rmtree(work_dir)
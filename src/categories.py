@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import os
+import json
+from collections import deque
+
+from pipeline_config import logger, LOCAL_REPORT_PATH
+
+# Configuration
+# Optional JSON object {category: [keywords, ...]}, in priority order
+CATEGORY_CONFIG_FILE = os.path.join(LOCAL_REPORT_PATH, "categories.json")
+
+# Primary categories based on analysis type, in priority order
+DEFAULT_FIGURE_CATEGORIES = {
+    'language_processing': ['mindsentences', 'language', 'semantic', 'syntactic'],
+    'eeg_analysis': ['eeg', 'erp'],
+    'meg_analysis': ['meg', 'event'],
+    'source_localization': ['source', 'mne', 'dics', 'lcmv'],
+    'topographic_maps': ['topo', 'map'],
+    'connectivity': ['connect', 'network'],
+    'time_frequency': ['tf', 'frequency', 'power', 'tfr']
+}
+
+def load_category_table(config_path=None):
+    """
+    Load the category keyword table from CATEGORY_CONFIG_FILE if it exists,
+    falling back to DEFAULT_FIGURE_CATEGORIES
+    """
+    config_path = config_path or CATEGORY_CONFIG_FILE
+    if not os.path.exists(config_path):
+        return DEFAULT_FIGURE_CATEGORIES
+    try:
+        with open(config_path, 'r') as f:
+            table = json.load(f)
+        if not isinstance(table, dict) or not all(
+            isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+            for keywords in table.values()
+        ):
+            raise ValueError("expected an object mapping categories to keyword lists")
+        logger.info(f"Loaded {len(table)} figure categories from {config_path}")
+        return table
+    except Exception as e:
+        logger.error(f"Error loading category table, using defaults: {str(e)}")
+        return DEFAULT_FIGURE_CATEGORIES
+
+def build_category_matcher(categories):
+    """
+    Compile a category keyword table into an Aho-Corasick automaton
+    
+    Each state keeps the best (lowest) priority of any keyword ending there,
+    including through its failure links, so one scan of a filename yields
+    the first category in table order with a keyword in the filename -- the
+    same answer as checking every keyword of every category in turn.
+    
+    Returns:
+    --------
+    tuple
+        (transitions, best_priority, category_names)
+    """
+    category_names = list(categories)
+    transitions = [{}]
+    best_priority = [None]
+    
+    for priority, keywords in enumerate(categories.values()):
+        for keyword in keywords:
+            state = 0
+            for char in keyword.lower():
+                next_state = transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions[state][char] = next_state
+                    transitions.append({})
+                    best_priority.append(None)
+                state = next_state
+            if keyword and (best_priority[state] is None or priority < best_priority[state]):
+                best_priority[state] = priority
+    
+    # Breadth-first pass to set failure links and merge their outputs
+    failure = [0] * len(transitions)
+    queue = deque(transitions[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in transitions[state].items():
+            queue.append(next_state)
+            fallback = failure[state]
+            while fallback and char not in transitions[fallback]:
+                fallback = failure[fallback]
+            failure[next_state] = transitions[fallback].get(char, 0)
+            inherited = best_priority[failure[next_state]]
+            if inherited is not None and (
+                best_priority[next_state] is None or inherited < best_priority[next_state]
+            ):
+                best_priority[next_state] = inherited
+    
+    # Fold failure links into full transition tables so a scan never
+    # has to follow them
+    goto = [dict(row) for row in transitions]
+    queue = deque(transitions[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in transitions[state].items():
+            queue.append(next_state)
+        for char, next_state in goto[failure[state]].items():
+            goto[state].setdefault(char, next_state)
+    
+    return goto, best_priority, category_names
+
+def match_category(matcher, filename):
+    """
+    Return the highest-priority category whose keywords occur in filename
+    (case-insensitive), or None
+    """
+    goto, best_priority, category_names = matcher
+    state = 0
+    best = None
+    for char in filename.lower():
+        state = goto[state].get(char, 0)
+        priority = best_priority[state]
+        if priority is not None and (best is None or priority < best):
+            best = priority
+            if best == 0:
+                break
+    return None if best is None else category_names[best]
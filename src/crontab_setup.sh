@@ -1,9 +1,23 @@
 #!/bin/bash
 
+# Usage: crontab_setup.sh [--daemon]
+# By default the pipeline runs daily at 8pm; with --daemon it is started at
+# boot and publishes new figures as they land instead.
+
 # Define script paths
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
 PIPELINE_SCRIPT="$SCRIPT_DIR/pipeline.py"
 
+if [ "$1" == "--daemon" ]; then
+    CRON_SCHEDULE="@reboot"
+    PIPELINE_ARGS=" --daemon"
+    SCHEDULE_DESCRIPTION="as a daemon started at boot"
+else
+    CRON_SCHEDULE="0 20 * * *"
+    PIPELINE_ARGS=""
+    SCHEDULE_DESCRIPTION="daily at 8pm"
+fi
+
 # Make sure the pipeline script is executable
 chmod +x "$PIPELINE_SCRIPT"
 
@@ -17,13 +31,13 @@ crontab -l > "$TEMP_CRONTAB" 2>/dev/null || echo "# MNE Pipeline Crontab" > "$TE
 if grep -q "$PIPELINE_SCRIPT" "$TEMP_CRONTAB"; then
     echo "Cron job already exists for MNE Pipeline."
 else
-    # Add new cron job to run daily at 8pm
-    echo "0 20 * * * $PIPELINE_SCRIPT >> $SCRIPT_DIR/cron_output.log 2>&1" >> "$TEMP_CRONTAB"
+    # Add new cron job
+    echo "$CRON_SCHEDULE $PIPELINE_SCRIPT$PIPELINE_ARGS >> $SCRIPT_DIR/cron_output.log 2>&1" >> "$TEMP_CRONTAB"
     echo "# MNE Pipeline added $(date)" >> "$TEMP_CRONTAB"
     
     # Install new crontab
     crontab "$TEMP_CRONTAB"
-    echo "Cron job installed to run MNE Pipeline daily at 8pm."
+    echo "Cron job installed to run MNE Pipeline $SCHEDULE_DESCRIPTION."
 fi
 
 # Clean up
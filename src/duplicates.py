@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Pillow is only needed for near-duplicates; without it only figures with
+# identical contents are collapsed
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from metadata_store import get_perceptual_hashes, upsert_perceptual_hashes
+from pipeline_config import logger
+
+# Difference hash on a DHASH_SIZE x DHASH_SIZE grid, DHASH_SIZE ** 2 bits.
+# Plots are mostly white with thin lines, so a finer grid than the usual
+# 8 x 8 keeps different curves apart.
+DHASH_SIZE = 16
+DHASH_BITS = DHASH_SIZE ** 2
+
+# Largest number of differing hash bits for two figures to be collapsed
+# into one report entry; None keeps every figure. Figures with identical
+# contents are always collapsed.
+DUPLICATE_THRESHOLD = 4
+
+def difference_hash(image_path, hash_size=None):
+    """
+    Difference hash of an image: whether each pixel of a downscaled
+    greyscale copy is brighter than its right neighbour
+    
+    Returns:
+    --------
+    int
+        The hash, hash_size ** 2 bits
+    """
+    hash_size = hash_size or DHASH_SIZE
+    with Image.open(image_path) as image:
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            # Transparent areas show the white page
+            rgba = image.convert('RGBA')
+            image = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+            image.alpha_composite(rgba)
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def perceptual_hashes(conn, file_hashes, hash_size=None):
+    """
+    Return the perceptual hashes of figures, computing them only for the
+    contents not hashed by an earlier run
+    
+    Parameters:
+    -----------
+    conn : sqlite3.Connection
+        Metadata store, where the hashes are kept by content hash
+    file_hashes : dict
+        Mapping of figure path to content hash
+    
+    Returns:
+    --------
+    dict
+        Mapping of figure path to perceptual hash (int); figures that could
+        not be read are left out
+    """
+    if Image is None:
+        return {}
+    hash_size = hash_size or DHASH_SIZE
+    stored = {
+        content_hash: int(dhash, 16)
+        for content_hash, dhash in get_perceptual_hashes(
+            conn, set(file_hashes.values()), hash_size
+        ).items()
+    }
+    computed = {}
+    for fig_path, content_hash in file_hashes.items():
+        if content_hash in stored or content_hash in computed:
+            continue
+        try:
+            computed[content_hash] = difference_hash(fig_path, hash_size)
+        except Exception as e:
+            logger.error(f"Error hashing {fig_path}: {str(e)}")
+    upsert_perceptual_hashes(
+        conn,
+        [(content_hash, hash_size, f"{dhash:x}") for content_hash, dhash in computed.items()]
+    )
+    stored.update(computed)
+    logger.info(
+        f"Perceptual hashes: {len(stored) - len(computed)} stored, "
+        f"{len(computed)} computed"
+    )
+    return {
+        fig_path: stored[content_hash]
+        for fig_path, content_hash in file_hashes.items()
+        if content_hash in stored
+    }
+
+def hash_bands(value, bands, bits=None):
+    """Split a hash into bands of bits, tagged with their position"""
+    bits = bits or DHASH_BITS
+    bounds = [band * bits // bands for band in range(bands + 1)]
+    return [
+        (band, (value >> start) & ((1 << (end - start)) - 1))
+        for band, (start, end) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+def collapse_duplicates(fig_paths, file_hashes, dhashes, threshold):
+    """
+    Group figures with identical contents, or perceptual hashes at most
+    threshold bits apart, under the first of them in fig_paths order
+    
+    Two hashes at most threshold bits apart agree on at least one of any
+    threshold + 1 disjoint bands, so each figure is only compared with the
+    kept figures sharing a band with it.
+    
+    Returns:
+    --------
+    dict
+        Mapping of each kept figure with duplicates to the list of its
+        duplicates, in order
+    """
+    bands = min(threshold + 1, DHASH_BITS)
+    kept_by_content = {}
+    kept_by_band = {}
+    groups = {}
+    for fig_path in fig_paths:
+        kept = kept_by_content.get(file_hashes[fig_path])
+        dhash = dhashes.get(fig_path)
+        if kept is None and dhash is not None:
+            fig_bands = hash_bands(dhash, bands)
+            kept = next(
+                (
+                    candidate
+                    for band in fig_bands
+                    for candidate in kept_by_band.get(band, ())
+                    if bin(dhashes[candidate] ^ dhash).count('1') <= threshold
+                ),
+                None
+            )
+        if kept is not None:
+            groups[kept].append(fig_path)
+            continue
+        
+        groups[fig_path] = []
+        kept_by_content[file_hashes[fig_path]] = fig_path
+        if dhash is not None:
+            for band in fig_bands:
+                kept_by_band.setdefault(band, []).append(fig_path)
+    return {kept: duplicates for kept, duplicates in groups.items() if duplicates}
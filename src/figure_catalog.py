@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import os
+
+from figure_names import parse_figure_names
+from metadata_store import open_metadata_store, get_metadata
+from pipeline_config import logger, LOCAL_FIG_PATH
+
+class FigureRecord:
+    """One organized figure, with what the report needs to place it"""
+    __slots__ = ('path', 'filename', 'main_component', 'subcategory', 'metadata')
+    
+    def __init__(self, path, figure_name, metadata):
+        self.path = path
+        self.filename = figure_name.filename
+        self.main_component = figure_name.main_component
+        # Figures are grouped under the first descriptive part after the
+        # main component, if any
+        self.subcategory = figure_name.sub_parts[0] if figure_name.sub_parts else None
+        self.metadata = metadata
+
+def iter_category_figures(directory):
+    """
+    Yield the PNG paths under a category directory, in the order of
+    glob('**/*.png', recursive=True): a directory's own figures, then each
+    subdirectory depth-first. Hidden entries are skipped, as glob does.
+    """
+    with os.scandir(directory) as entries:
+        entries = [entry for entry in entries if not entry.name.startswith('.')]
+    for entry in entries:
+        if entry.name.endswith('.png') and entry.is_file():
+            yield entry.path
+    for entry in entries:
+        if entry.is_dir():
+            yield from iter_category_figures(entry.path)
+
+def build_records(paths, metadata_db=None):
+    """FigureRecords of organized figure paths, with their stored metadata"""
+    figure_names = parse_figure_names(os.path.basename(path) for path in paths)
+    
+    if metadata_db is None:
+        metadata_db = {}
+        try:
+            conn = open_metadata_store()
+            try:
+                metadata_db = get_metadata(conn, (name.filename for name in figure_names))
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Error reading metadata: {str(e)}")
+    
+    return [
+        FigureRecord(path, name, metadata_db.get(name.filename, {}))
+        for path, name in zip(paths, figure_names)
+    ]
+
+class FigureCatalog:
+    """
+    All organized figures, listed in one os.scandir walk of the category
+    directories, with indexes by main component, subcategory, subject and
+    task. Index lists keep catalog order.
+    """
+    __slots__ = ('records', 'by_main_component', 'by_subcategory',
+                 'by_subject', 'by_task')
+    
+    def __init__(self, records):
+        self.records = list(records)
+        self.by_main_component = {}
+        # {main_component: {subcategory: [records]}}
+        self.by_subcategory = {}
+        self.by_subject = {}
+        self.by_task = {}
+        for record in self.records:
+            self.by_main_component.setdefault(record.main_component, []).append(record)
+            subcategories = self.by_subcategory.setdefault(record.main_component, {})
+            if record.subcategory is not None:
+                subcategories.setdefault(record.subcategory, []).append(record)
+            if 'subject' in record.metadata:
+                self.by_subject.setdefault(record.metadata['subject'], []).append(record)
+            if 'task' in record.metadata:
+                self.by_task.setdefault(record.metadata['task'], []).append(record)
+    
+    @classmethod
+    def scan(cls, root=None, metadata_db=None):
+        """
+        Build the catalog of the figures in the category directories of
+        root (top-level files are not organized yet and are left out)
+        
+        Parameters:
+        -----------
+        root : str, optional
+            Figures directory, defaults to LOCAL_FIG_PATH
+        metadata_db : dict, optional
+            Filename to metadata; read from the metadata store when not given
+        """
+        root = root or LOCAL_FIG_PATH
+        with os.scandir(root) as entries:
+            category_dirs = [entry.path for entry in entries if entry.is_dir()]
+        paths = [
+            fig_path
+            for category_dir in category_dirs
+            for fig_path in iter_category_figures(category_dir)
+        ]
+        catalog = cls(build_records(paths, metadata_db))
+        logger.info(
+            f"Catalogued {len(catalog)} figures in {len(category_dirs)} categories"
+        )
+        return catalog
+    
+    def updated(self, paths, metadata_db=None, removed=()):
+        """
+        Return a catalog with the figures at paths added and those at removed
+        left out, without scanning the category directories again. A figure
+        that is already catalogued keeps its place, with its record refreshed.
+        
+        Parameters:
+        -----------
+        paths : list
+            Organized paths of the new or replaced figures
+        metadata_db : dict, optional
+            Filename to metadata; read from the metadata store when not given
+        removed : iterable
+            Organized paths of figures taken out of the organized tree
+        """
+        new_records = {
+            record.path: record for record in build_records(paths, metadata_db)
+        }
+        removed = set(removed)
+        records = [
+            new_records.pop(record.path, record) for record in self.records
+            if record.path not in removed
+        ]
+        return type(self)(records + list(new_records.values()))
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __iter__(self):
+        return iter(self.records)
+    
+    @property
+    def paths(self):
+        return [record.path for record in self.records]
+    
+    def uncategorized(self, main_component):
+        """Figures of a main component that are in none of its subcategories"""
+        return [
+            record for record in self.by_main_component.get(main_component, [])
+            if record.subcategory is None
+        ]
+    
+    def stats(self):
+        """
+        Count figures, and the distinct subjects, tasks and experiment types
+        (main components) among the figures with stored metadata
+        """
+        main_components = {
+            record.main_component for record in self.records
+            if record.metadata and record.main_component != 'unknown'
+        }
+        return {
+            'figures': len(self.records),
+            'subjects': len(self.by_subject),
+            'tasks': len(self.by_task),
+            'main_components': len(main_components)
+        }
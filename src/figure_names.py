@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Figure metadata patterns
+METADATA_PATTERNS = {
+    'subject': r'sub-(\w+)',
+    'task': r'task-(\w+)',
+    'condition': r'cond-(\w+)',
+    'analysis_type': r'(meg|eeg|source|topo)',
+    'component': r'(N[0-9]+|P[0-9]+)',
+    'timestamp': r'([0-9]{8}T[0-9]{6})'
+}
+
+# Filename parts that are not descriptive enough to group figures by
+COMMON_TERMS = ['sub', 'ses', 'run', 'img', 'fig', 'the', 'and', 'for', 'to']
+
+# Compiled once; CPython's re keeps its literal-prefix fast paths for these,
+# which a single combined pattern would lose. They search the whole name
+# rather than each '_'-separated part: \w+ runs across '_' ('sub-03_ses'), and
+# those are the values the metadata store, the organized folders and the
+# reports already hold. A one-pass scan of the parts is about 1.3x faster,
+# under half a second per 100k names parsed once per run (the parse is
+# cached), but reads different values for every BIDS-style name (see
+# bench_figure_names.py).
+COMPILED_METADATA_PATTERNS = tuple(
+    re.compile(pattern) for pattern in METADATA_PATTERNS.values()
+)
+
+# Everything the pipeline derives from a figure filename
+FigureName = namedtuple('FigureName', [
+    'filename',
+    *METADATA_PATTERNS,
+    'main_component',  # first '_'-separated part, lowercased
+    'parts',           # all '_'-separated parts of the name without extension
+    'sub_parts'        # descriptive parts after the main component, lowercased
+])
+
+@lru_cache(maxsize=1 << 17)
+def parse_figure_name(filename):
+    """
+    Parse a figure filename once into a FigureName record
+    
+    Fields of METADATA_PATTERNS that are not found are None. Results are
+    cached, so every pipeline stage can call this on the same filename and
+    only the first call does any work.
+    """
+    parts = tuple(os.path.splitext(filename)[0].split('_'))
+    sub_parts = tuple(
+        lower for lower in (part.lower() for part in parts[1:])
+        if len(lower) >= 3 and not lower.isdigit() and lower not in COMMON_TERMS
+    )
+    matches = [pattern.search(filename) for pattern in COMPILED_METADATA_PATTERNS]
+    return FigureName(
+        filename,
+        *(match.group(1) if match else None for match in matches),
+        parts[0].lower(),
+        parts,
+        sub_parts
+    )
+
+def parse_figure_names(filenames):
+    """Parse a batch of filenames, returning FigureName records in order"""
+    return [parse_figure_name(filename) for filename in filenames]
+
+def figure_name_metadata(record):
+    """Return the METADATA_PATTERNS fields found in a FigureName as a dict"""
+    return {
+        key: value
+        for key, value in zip(METADATA_PATTERNS, record[1:1 + len(METADATA_PATTERNS)])
+        if value is not None
+    }
@@ -1,27 +1,120 @@
 #!/usr/bin/env python3
 import os
+import re
 import mne
+import html
 from datetime import datetime
 import glob
 import shutil
 import json
-import logging
+import hashlib
 import traceback
+from urllib.parse import quote
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-import subprocess
 
 # Import logging config
 from sync_org import logger
+from pipeline_config import LOCAL_FIG_PATH, LOCAL_REPORT_PATH, GITHUB_REPO_PATH, GITHUB_FILES_PATH
+from metadata_store import (
+    open_metadata_store, content_hashes, find_fragments,
+    get_fragment, upsert_fragments, prune_fragments
+)
+from figure_names import parse_figure_name
+from figure_catalog import FigureCatalog
+from previews import (
+    make_preview, preview_path, image_data_uri, PREVIEW_FORMAT, PREVIEW_MAX_WIDTH, PREVIEW_QUALITY,
+    BUDGET_PREVIEW_MAX_WIDTH, BUDGET_PREVIEW_QUALITY
+)
+from assets import store_asset, asset_url, referenced_assets, publish_assets
+from publish import git_commit_and_push
+from reports_manifest import report_record, append_report
+from archive import archive_old_reports, archive_branch_exists, ARCHIVE_BRANCH
+from report_writer import figure_marker, write_expanded, stream_report
+from duplicates import perceptual_hashes, collapse_duplicates, DUPLICATE_THRESHOLD
+from report_delta import write_catalog_snapshot, load_previous_snapshot, compare_with_snapshot
+from report_templates import (
+    stylesheet_link_html, publish_report_stylesheet, OVERVIEW_TEMPLATE, DELTA_TEMPLATE,
+    TOC_TEMPLATE, TOC_ITEM_TEMPLATE, EXPERIMENT_TEMPLATE, SUBCATEGORY_TEMPLATE, GENERAL_HTML,
+    FIGURE_TEMPLATE, PREVIOUS_FIGURE_TEMPLATE, COMPARISON_TEMPLATE, SECTION_ITEM_TEMPLATE,
+    LAZY_SECTION_TEMPLATE, VIEWS_TEMPLATE, VIEW_ITEM_TEMPLATE
+)
 
-# Configuration
-LOCAL_FIG_PATH = "/home/co/data/mne_reports/figures/"
-LOCAL_REPORT_PATH = "/home/co/data/mne_reports/"
-GITHUB_REPO_PATH = "/home/co/git/pi-aiche-dee/"
-GITHUB_FILES_PATH = os.path.join(GITHUB_REPO_PATH, "files")
-METADATA_FILE = os.path.join(LOCAL_FIG_PATH, "metadata.json")
+# How reports include their images: 'inline' embeds them in the HTML,
+# 'external' references the shared content-addressed store (see assets.py)
+# so each unique image is published, and downloaded, only once
+REPORT_ASSET_MODES = ('inline', 'external')
+
+# Rendered figure fragments are cached in the metadata store and dropped
+# once unused for this many days
+FRAGMENT_CACHE_MAX_AGE_DAYS = 30
+# Stands for the report-specific directory of full-resolution figures in
+# cached inline fragments, so they can be reused by the next day's report
+FIGURES_HREF_PLACEHOLDER = "{{figures_href}}"
+
+# How reports are laid out: 'single' is one page holding every figure,
+# 'paged' a landing page loading each experiment's figures on demand
+REPORT_LAYOUTS = ('single', 'paged')
+
+# Loads the sections of a paged report when their button is clicked or
+# their entry of either table of contents is followed. Sections are
+# fetched, so paged reports have to be served over HTTP (as on GitHub
+# Pages) rather than opened from disk.
+LAZY_SECTION_SCRIPT = """
+<script>
+document.addEventListener("DOMContentLoaded", function () {
+    function loadSection(section) {
+        if (!section || section.dataset.loading) {
+            return;
+        }
+        section.dataset.loading = "1";
+        section.querySelector(".lazy-section-status").textContent = "Loading...";
+        fetch(section.dataset.src)
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function (sectionHtml) {
+                section.outerHTML = sectionHtml;
+            })
+            .catch(function () {
+                delete section.dataset.loading;
+                section.querySelector(".lazy-section-status").textContent =
+                    "Could not load these figures.";
+            });
+    }
+    function loadLinkedSection() {
+        var id = decodeURIComponent(location.hash.slice(1));
+        var target = id && document.getElementById(id);
+        loadSection(
+            document.querySelector('.lazy-section[data-section="' + id + '"]') ||
+            (target && target.querySelector(".lazy-section"))
+        );
+    }
+    document.querySelectorAll(".lazy-section-button").forEach(function (button) {
+        button.addEventListener("click", function () {
+            loadSection(button.closest(".lazy-section"));
+        });
+    });
+    window.addEventListener("hashchange", loadLinkedSection);
+    loadLinkedSection();
+});
+</script>
+"""
+
+# Targeted reports made along with the combined one: 'experiment' for one
+# per main component, 'subject' for one per subject
+REPORT_VIEWS = ('experiment', 'subject')
+
+# Reports whose figures weigh more than this (bytes, after optimization)
+# get smaller previews, see previews.BUDGET_PREVIEW_*; 0 disables it
+REPORT_BYTE_BUDGET = 200 * 1024 ** 2
 
 # Email configuration
 EMAIL_CONFIG = {
@@ -33,19 +126,6 @@ EMAIL_CONFIG = {
     'smtp_port': 587
 }
 
-def read_metadata():
-    """Read the metadata database"""
-    try:
-        if os.path.exists(METADATA_FILE):
-            with open(METADATA_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            logger.warning("Metadata file not found")
-            return {}
-    except Exception as e:
-        logger.error(f"Error reading metadata: {str(e)}")
-        return {}
-
 def get_section_title(category_path):
     """Generate a human-readable section title from the path"""
     category = os.path.basename(category_path)
@@ -73,7 +153,7 @@ def group_figures_by_metadata(category_path, metadata_db):
                 grouped[task][subject] = {}
             if condition not in grouped[task][subject]:
                 grouped[task][subject][condition] = []
-                
+            
             grouped[task][subject][condition].append((fig_path, filename, meta))
         else:
             # No metadata, add to unknown group
@@ -129,507 +209,805 @@ def get_experiment_description(experiment_name):
     
     return descriptions.get(experiment_name.lower(), default_desc)
 
-def extract_main_component(filename):
+def report_figures_directory(report_path):
+    """Directory next to a report holding its full-resolution figures"""
+    return f"{os.path.splitext(report_path)[0]}_figures"
+
+def report_sections_directory(report_path):
+    """Directory next to a paged report holding its per-experiment sections"""
+    return f"{os.path.splitext(report_path)[0]}_sections"
+
+def copy_report_figures(figures, figures_dir):
+    """Copy the full-resolution figures linked from a report next to it"""
+    os.makedirs(figures_dir, exist_ok=True)
+    for fig_path in figures:
+        dest_path = os.path.join(figures_dir, os.path.basename(fig_path))
+        # Skip figures already copied by an earlier run the same day
+        if (os.path.exists(dest_path)
+                and os.path.getsize(dest_path) == os.path.getsize(fig_path)
+                and os.path.getmtime(dest_path) == os.path.getmtime(fig_path)):
+            continue
+        # Copied under a temporary name, as targeted reports written
+        # concurrently share the directory
+        temp_path = f"{dest_path}.{os.getpid()}.tmp"
+        shutil.copy2(fig_path, temp_path)
+        os.replace(temp_path, dest_path)
+
+def copy_changed_files(source_dir, dest_dir):
+    """
+    Copy the files of a directory tree over another, skipping those already
+    copied (same size and modification time)
+    
+    Returns:
+    --------
+    list
+        Paths of the files written under dest_dir
+    """
+    written = []
+    for dirpath, _, filenames in os.walk(source_dir):
+        dest_dirpath = os.path.join(dest_dir, os.path.relpath(dirpath, source_dir))
+        os.makedirs(dest_dirpath, exist_ok=True)
+        for filename in filenames:
+            source_path = os.path.join(dirpath, filename)
+            dest_path = os.path.join(dest_dirpath, filename)
+            if (os.path.exists(dest_path)
+                    and os.path.getsize(dest_path) == os.path.getsize(source_path)
+                    and os.path.getmtime(dest_path) == os.path.getmtime(source_path)):
+                continue
+            shutil.copy2(source_path, dest_path)
+            written.append(dest_path)
+    return written
+
+def figure_title(filename, *excluded_parts):
     """
-    Extract the first substring from a filename as the main component
-    (e.g., 'probe' from 'probe_spacy_to_probe.png')
+    Create a descriptive title from a figure filename, leaving out the
+    given parts (the main component and subcategory it is shown under)
+    """
+    excluded = {part.lower() for part in excluded_parts}
+    filtered_parts = [p for p in parse_figure_name(filename).parts
+                      if p.lower() not in excluded]
+    if filtered_parts:
+        return ' '.join(word.capitalize() for word in filtered_parts)
+    return filename
+
+def figure_sources(fig_path, preview, asset_mode, file_hash=None):
     """
-    # Remove file extension and split by underscore
-    base_name = os.path.splitext(filename)[0]
-    parts = base_name.split('_')
+    Return the image source and the full-resolution link of a figure: a
+    data URI and the copy next to the report (under FIGURES_HREF_PLACEHOLDER)
+    in 'inline' mode, asset URLs in 'external' mode
+    """
+    if asset_mode == 'external':
+        return (
+            asset_url(store_asset(preview) if preview else store_asset(fig_path, file_hash)),
+            asset_url(store_asset(fig_path, file_hash))
+        )
+    return (
+        image_data_uri(preview or fig_path),
+        f"{FIGURES_HREF_PLACEHOLDER}/{os.path.basename(fig_path)}"
+    )
+
+def render_figure(entry, preview_format, preview_max_width, asset_mode,
+                  preview_quality=None):
+    """
+    Read, downscale and encode one figure into its report fragment
     
-    # Get the first part as the main component
-    if parts and len(parts) > 0:
-        return parts[0].lower()
-    else:
-        return "unknown"
+    Parameters:
+    -----------
+    entry : tuple
+        (fig_path, file_hash, title, caption)
+    
+    Returns:
+    --------
+    tuple
+        (made_preview, html)
+    """
+    fig_path, file_hash, title, caption = entry
+    preview = make_preview(
+        fig_path, preview_format, preview_max_width, preview_quality, file_hash=file_hash
+    )
+    src, href = figure_sources(fig_path, preview, asset_mode, file_hash)
+    return preview is not None, figure_html(src, href, title, caption)
+
+def fragment_key(file_hash, settings, title, caption):
+    """Cache key of a figure fragment: everything its HTML depends on"""
+    return hashlib.sha256(
+        json.dumps([file_hash, settings, title, caption]).encode()
+    ).hexdigest()
 
-def parse_remaining_components(filename, main_component):
+def prepare_figures(entries, preview_format=None, preview_max_width=None,
+                    asset_mode='inline', jobs=1, preview_quality=None):
     """
-    Parse the remaining parts of the filename after the main component
-    to create subcategories
+    Render the fragments of a report's figures, reusing the ones cached by
+    earlier reports and encoding the rest on a pool of jobs worker
+    processes when jobs > 1
+    
+    Parameters:
+    -----------
+    entries : list
+        (fig_path, title, caption) of every figure
+    
+    Fragments are stored in the metadata store as they are rendered and
+    read back one at a time when the report is written (see
+    read_report_fragment), so the report is the same whatever the number
+    of jobs or cache hits.
+    
+    Returns:
+    --------
+    dict
+        Mapping of figure path to fragment key
     """
-    # Remove file extension and split by underscore
-    base_name = os.path.splitext(filename)[0]
-    parts = base_name.split('_')
+    settings = [
+        preview_format or PREVIEW_FORMAT, preview_max_width or PREVIEW_MAX_WIDTH,
+        preview_quality or PREVIEW_QUALITY, asset_mode
+    ]
+    conn = open_metadata_store()
+    try:
+        file_hashes = content_hashes(conn, [fig_path for fig_path, _, _ in entries])
+        keys = [
+            fragment_key(file_hashes[fig_path], settings, title, caption)
+            for fig_path, title, caption in entries
+        ]
+        cached = find_fragments(conn, keys)
+        misses = [
+            (key, (fig_path, file_hashes[fig_path], title, caption))
+            for key, (fig_path, title, caption) in zip(keys, entries)
+            if key not in cached
+        ]
+        
+        task = partial(
+            render_figure,
+            preview_format=preview_format,
+            preview_max_width=preview_max_width,
+            asset_mode=asset_mode,
+            preview_quality=preview_quality
+        )
+        to_render = [entry for _, entry in misses]
+        made = []
+        
+        def store_rendered(results):
+            # Fragments go to the store as they are rendered, so only a few
+            # are ever held in memory
+            for (key, _), (made_preview, fragment) in zip(misses, results):
+                made.append(made_preview)
+                yield key, fragment
+        
+        if jobs > 1 and len(to_render) > 1:
+            chunksize = max(1, len(to_render) // (jobs * 4))
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                upsert_fragments(conn, store_rendered(
+                    executor.map(task, to_render, chunksize=chunksize)
+                ))
+        else:
+            upsert_fragments(conn, store_rendered(map(task, to_render)))
+        pruned = prune_fragments(conn, FRAGMENT_CACHE_MAX_AGE_DAYS)
+    finally:
+        conn.close()
     
-    # Skip the first part (main component)
-    remaining_parts = parts[1:] if len(parts) > 1 else []
+    logger.info(
+        f"Figure fragments: {len(entries) - len(misses)} cached, "
+        f"{len(misses)} rendered with {jobs} job(s) "
+        f"({sum(made)} as downscaled previews), {pruned} expired"
+    )
+    if made and not any(made):
+        logger.warning("No previews could be made (is Pillow installed?), "
+                       "using full-resolution figures")
+    return {fig_path: key for key, (fig_path, _, _) in zip(keys, entries)}
+
+def read_report_fragment(conn, key, figures_href):
+    """
+    Read a cached figure fragment, linking it to the report's directory of
+    full-resolution figures
+    """
+    return get_fragment(conn, key).replace(FIGURES_HREF_PLACEHOLDER, figures_href)
+
+def previous_figure_html(src, title, caption):
+    """Markup of the previous version of a figure, as figure_html() without link"""
+    return PREVIOUS_FIGURE_TEMPLATE.substitute(
+        src=html.escape(src), title=html.escape(title), caption=html.escape(caption)
+    )
+
+def comparison_html(previous, current):
+    """Show the previous and current versions of a figure side by side"""
+    return COMPARISON_TEMPLATE.substitute(previous=previous, current=current)
+
+def prepare_previous_figures(previous, previous_date, preview_format=None,
+                             preview_max_width=None, preview_quality=None,
+                             asset_mode='inline'):
+    """
+    Render the fragments showing the previous versions of changed figures,
+    from their cached previews (a version without one is not shown)
     
-    # Filter out very short parts or common non-descriptive terms
-    filtered_parts = []
-    common_terms = ['sub', 'ses', 'run', 'img', 'fig', 'the', 'and', 'for', 'to']
+    Parameters:
+    -----------
+    previous : dict
+        Mapping of figure path to its catalog snapshot entry
+    previous_date : str
+        Date of the report the snapshot belongs to
     
-    for part in remaining_parts:
-        if len(part) >= 3 and not part.isdigit() and part.lower() not in common_terms:
-            filtered_parts.append(part.lower())
+    Returns:
+    --------
+    dict
+        Mapping of figure path to fragment key, for the versions shown
+    """
+    settings = [
+        preview_format or PREVIEW_FORMAT, preview_max_width or PREVIEW_MAX_WIDTH,
+        preview_quality or PREVIEW_QUALITY, asset_mode, 'previous'
+    ]
+    caption = f"Previous version, report of {previous_date}"
+    previews = {}
+    for fig_path, entry in previous.items():
+        path = preview_path(
+            entry['source_sha256'], preview_format, preview_max_width, preview_quality
+        )
+        if os.path.exists(path):
+            previews[fig_path] = (path, entry)
     
-    return filtered_parts
+    keys = {
+        fig_path: fragment_key(entry['source_sha256'], settings, entry['filename'], caption)
+        for fig_path, (_, entry) in previews.items()
+    }
+    conn = open_metadata_store()
+    try:
+        cached = find_fragments(conn, keys.values())
+        upsert_fragments(conn, (
+            (
+                keys[fig_path],
+                previous_figure_html(
+                    asset_url(store_asset(path)) if asset_mode == 'external'
+                    else image_data_uri(path),
+                    entry['filename'], caption
+                )
+            )
+            for fig_path, (path, entry) in previews.items()
+            if keys[fig_path] not in cached
+        ))
+    finally:
+        conn.close()
+    logger.info(
+        f"Showing the previous version of {len(keys)} of {len(previous)} changed figure(s)"
+    )
+    return keys
 
-def group_figures_hierarchically(figures, metadata_db):
+def figure_html(src, href, title, caption):
     """
-    Group figures hierarchically - first by main component, then by subcategories
-    derived from remaining filename parts
+    Markup of a figure as mne.Report.add_image lays it out, showing the
+    image at src and linking to the full-resolution original at href
+    """
+    return FIGURE_TEMPLATE.substitute(
+        src=html.escape(src), href=html.escape(href), title=html.escape(title),
+        caption=html.escape(caption)
+    )
+
+def find_duplicate_figures(report_sections, threshold):
     """
-    main_categories = {}
+    Find the duplicates within each report section, given as
+    (main_component, subcategory, records) tuples
     
-    for fig_path in figures:
-        filename = os.path.basename(fig_path)
+    Returns:
+    --------
+    dict
+        Mapping of the figure path kept for each group of duplicates to the
+        paths of the others
+    """
+    fig_paths = [record.path for _, _, records in report_sections for record in records]
+    conn = open_metadata_store()
+    try:
+        file_hashes = content_hashes(conn, fig_paths)
+        dhashes = perceptual_hashes(conn, file_hashes)
+    finally:
+        conn.close()
+    
+    duplicates = {}
+    for _, _, records in report_sections:
+        duplicates.update(collapse_duplicates(
+            [record.path for record in records], file_hashes, dhashes, threshold
+        ))
+    logger.info(
+        f"Collapsed {sum(len(copies) for copies in duplicates.values())} duplicate "
+        f"figure(s) into {len(duplicates)} report entries"
+    )
+    return duplicates
+
+def duplicates_caption(caption, fig_path, duplicates):
+    """Add the filenames of a figure's collapsed duplicates to its caption"""
+    if fig_path not in duplicates:
+        return caption
+    filenames = [os.path.basename(path) for path in (fig_path, *duplicates[fig_path])]
+    return f"{caption} | Shown once for {len(filenames)} figures: {', '.join(filenames)}"
+
+def section_item_html(item_id, title, body):
+    """Markup of one report item as mne.Report lays out its collapsible cards"""
+    return SECTION_ITEM_TEMPLATE.substitute(item_id=item_id, title=html.escape(title), body=body)
+
+def write_report_section(section_path, main_component, items, read_fragment):
+    """
+    Write the items (html, title, tags) of a paged report section,
+    expanding their figure markers with read_fragment (see report_writer.py)
+    """
+    with open(section_path, 'w') as f:
+        for index, (item_html, title, _) in enumerate(items):
+            write_expanded(
+                f, section_item_html(f"{main_component.lower()}-{index}", title, item_html),
+                read_fragment
+            )
+
+def lazy_section_html(main_component, section_href, figure_count):
+    """Placeholder of a paged report section, replaced by it once loaded"""
+    return LAZY_SECTION_TEMPLATE.substitute(
+        section=html.escape(main_component.lower()), src=html.escape(section_href),
+        figure_count=figure_count
+    )
+
+def report_view_path(report_path, view_name):
+    """Path of a targeted report (view) made next to a combined report"""
+    return f"{os.path.splitext(report_path)[0]}_view-{view_name}.html"
+
+def report_view_paths(report_path):
+    """Paths of the targeted reports made next to a combined report"""
+    pattern = f"{glob.escape(os.path.splitext(report_path)[0])}_view-*.html"
+    # Leave out the temporary files of a report being written
+    return sorted(
+        path for path in glob.glob(pattern) if '.html.' not in os.path.basename(path)
+    )
+
+def report_views(catalog, views):
+    """
+    List the targeted reports of a catalog
+    
+    Parameters:
+    -----------
+    catalog : FigureCatalog
+        Every figure of the combined report
+    views : iterable
+        Kinds of targeted reports, from REPORT_VIEWS: 'experiment' for one
+        per main component, 'subject' for one per subject
+    
+    Returns:
+    --------
+    list
+        (view_name, view_title, figure paths) of each targeted report
+    """
+    targeted = []
+    if 'experiment' in views:
+        for main_component, records in sorted(catalog.by_main_component.items()):
+            if main_component == 'unknown':
+                view_title = 'Other Figures'
+            else:
+                view_title = main_component.capitalize()
+            targeted.append(
+                (main_component.lower(), view_title, {record.path for record in records})
+            )
+    if 'subject' in views:
+        for subject, records in sorted(catalog.by_subject.items(), key=lambda item: str(item[0])):
+            subject = str(subject)
+            slug = re.sub(r'[^A-Za-z0-9_-]+', '_', subject)
+            targeted.append((
+                slug if slug.startswith('sub-') else f"sub-{slug}",
+                f"Subject {subject}",
+                {record.path for record in records}
+            ))
+    return targeted
+
+def write_report(report_path, title, catalog, current_date, sources, figures_dir,
+                 preview_settings, asset_mode='inline', jobs=1, layout='single',
+                 duplicate_threshold=DUPLICATE_THRESHOLD, delta=None, side_by_side=False,
+                 view_links=()):
+    """
+    Write one report of the figures of a catalog, laid out as described in
+    generate_mne_report(). Targeted reports are written by worker processes.
+    
+    Parameters:
+    -----------
+    report_path : str
+        Where to write the report
+    title : str
+        Title of the report, also heading its overview
+    catalog : FigureCatalog
+        The figures to report
+    current_date : str
+        Report date, YYYY-MM-DD
+    sources : dict
+        Mapping of figure path to the version shown (its optimized copy, if
+        any)
+    figures_dir : str
+        Directory next to report_path of the full-resolution figures
+        linked to in 'inline' mode, shared by a report and its views
+    preview_settings : tuple
+        (preview_format, preview_max_width, preview_quality)
+    delta : dict, optional
+        In delta mode: 'date' of the report compared with, 'changes'
+        mapping each reported figure to its snapshot entry (None if it is
+        new), and the number of 'unchanged' figures left out
+    view_links : iterable
+        (href, name) of the targeted reports to link to
+    
+    Returns:
+    --------
+    tuple
+        (report_path, stats): FigureCatalog.stats() of the figures shown,
+        leaving out collapsed duplicates
+    """
+    preview_format, preview_max_width, preview_quality = preview_settings
+    changes = delta['changes'] if delta else {}
+    stats = catalog.stats()
+    
+    # Create a new report with a more specific title
+    report = mne.Report(title=title)
+    
+    # Link the shared report stylesheet rather than embedding it
+    report.include += stylesheet_link_html()
+    
+    # Full-resolution figures and the sections of a paged report
+    figures_href = os.path.basename(figures_dir)
+    sections_dir = report_sections_directory(report_path)
+    sections_href = os.path.basename(sections_dir)
+    
+    # Add overview section
+    overview_html = OVERVIEW_TEMPLATE.substitute(
+        title=title,
+        date=datetime.strptime(current_date, '%Y-%m-%d').strftime('%A, %B %d, %Y'),
+        **stats
+    )
+    report.add_html(overview_html, title="Overview")
+    
+    if delta:
+        changed = sum(entry is not None for entry in changes.values())
+        delta_html = DELTA_TEMPLATE.substitute(
+            previous_date=delta['date'], new=len(changes) - changed, changed=changed,
+            unchanged=delta['unchanged']
+        )
+        report.add_html(delta_html, title="Changes")
+    
+    # Figures of each report section, in report order: by main
+    # component, then by subcategory, then the figures that are in no
+    # subcategory
+    main_components = sorted(catalog.by_main_component)
+    report_sections = []
+    for main_component in main_components:
+        for subcat_key, subcat_figures in sorted(catalog.by_subcategory[main_component].items()):
+            report_sections.append((main_component, subcat_key, subcat_figures))
+        report_sections.append(
+            (main_component, None, catalog.uncategorized(main_component))
+        )
+    
+    # Collapse the duplicates of each section into its first copy
+    duplicates = {}
+    if duplicate_threshold is not None and duplicate_threshold >= 0:
+        duplicates = find_duplicate_figures(report_sections, duplicate_threshold)
+    collapsed = {fig_path for copies in duplicates.values() for fig_path in copies}
+    
+    # Title every figure left, leaving out the parts it is shown under
+    figure_entries = []
+    for main_component, subcat_key, section_figures in report_sections:
+        shown_under = (main_component,) if subcat_key is None else (main_component, subcat_key)
+        figure_entries.extend(
+            (record.path, figure_title(record.filename, *shown_under),
+             duplicates_caption(generate_caption(record.metadata), record.path, duplicates))
+            for record in section_figures
+            if record.path not in collapsed
+        )
+    figure_titles = {fig_path: title for fig_path, title, _ in figure_entries}
+    
+    # Render figure fragments ahead of assembling the report, and keep
+    # the originals to link to (the asset store keeps them in external
+    # mode). The report only holds markers of the fragments until it
+    # is written out.
+    fragment_keys = prepare_figures(
+        [(sources[fig_path], title, caption) for fig_path, title, caption in figure_entries],
+        preview_format, preview_max_width, asset_mode, jobs, preview_quality
+    )
+    fragments = {
+        fig_path: figure_marker(fragment_keys[sources[fig_path]])
+        for fig_path, _, _ in figure_entries
+    }
+    
+    # Show changed figures next to their previous version
+    if side_by_side and changes:
+        previous_keys = prepare_previous_figures(
+            {
+                fig_path: entry for fig_path, entry in changes.items()
+                if entry is not None and fig_path in fragments
+            },
+            delta['date'], preview_format, preview_max_width, preview_quality,
+            asset_mode
+        )
+        for fig_path, key in previous_keys.items():
+            fragments[fig_path] = comparison_html(figure_marker(key), fragments[fig_path])
+    if asset_mode == 'inline':
+        copy_report_figures([sources[fig_path] for fig_path in fragments], figures_dir)
+    
+    # Create table of contents based on main components
+    toc_items = []
+    for main_component in main_components:
+        if main_component != 'unknown':  # Skip unknown category in TOC
+            display_name = main_component.capitalize()
+            toc_items.append(TOC_ITEM_TEMPLATE.substitute(
+                anchor=main_component.lower(), name=display_name
+            ))
+    
+    # Add "Other" category to TOC if we have unknown items
+    if 'unknown' in catalog.by_main_component:
+        toc_items.append(TOC_ITEM_TEMPLATE.substitute(anchor='unknown', name='Other Figures'))
+    
+    # Add table of contents
+    toc_html = TOC_TEMPLATE.substitute(items=''.join(toc_items))
+    if layout == 'paged':
+        # Start from an empty directory, so no stale section is left
+        shutil.rmtree(sections_dir, ignore_errors=True)
+        os.makedirs(sections_dir)
+        toc_html += LAZY_SECTION_SCRIPT
+    report.add_html(toc_html, title="Table of Contents")
+    
+    # Link the targeted reports made along with this one
+    if view_links:
+        views_html = VIEWS_TEMPLATE.substitute(items=''.join(
+            VIEW_ITEM_TEMPLATE.substitute(href=html.escape(href), name=html.escape(name))
+            for href, name in view_links
+        ))
+        report.add_html(views_html, title="Targeted Reports")
+    
+    # Process each main component group
+    paged_sections = []
+    for main_component in main_components:
+        figures = catalog.by_main_component[main_component]
+        subcategories = catalog.by_subcategory[main_component]
         
-        # Get main component (first substring)
-        main_component = extract_main_component(filename)
+        if not figures:  # Skip empty groups
+            continue
         
-        # Create main category if it doesn't exist
-        if main_component not in main_categories:
-            main_categories[main_component] = {'figures': [], 'subcategories': {}}
+        # Get main component description (experiment description)
+        main_desc = get_experiment_description(main_component)
+        main_title = main_component.capitalize()
         
-        # Add to the main category's figure list
-        main_categories[main_component]['figures'].append(
-            (fig_path, filename, metadata_db.get(filename, {}))
+        # Add main component section header with anchor
+        main_html = EXPERIMENT_TEMPLATE.substitute(
+            anchor=main_component.lower(), title=main_title,
+            short_description=main_desc.get('short', ''),
+            full_description=main_desc.get('full', ''), figure_count=len(figures)
         )
+        report.add_html(main_html, title=main_title)
         
-        # Extract subcategories from remaining parts of the filename
-        subcategories = parse_remaining_components(filename, main_component)
+        # Items (html, title, tags) of the section below the header
+        section_items = []
         
-        # If we have subcategories, add to respective subcategory
+        # Add figures by subcategory
         if subcategories:
-            # Use the first subcategory as the grouping key
-            subcat_key = subcategories[0]
-            
-            if subcat_key not in main_categories[main_component]['subcategories']:
-                main_categories[main_component]['subcategories'][subcat_key] = []
-            
-            main_categories[main_component]['subcategories'][subcat_key].append(
-                (fig_path, filename, metadata_db.get(filename, {}))
+            for subcat_key, subcat_figures in sorted(subcategories.items()):
+                # Create readable subcategory title
+                subcat_title = subcat_key.replace('_', ' ').title()
+                
+                # Add subcategory container
+                subcat_html = SUBCATEGORY_TEMPLATE.substitute(title=subcat_title)
+                section_items.append(
+                    (subcat_html, f"{main_title} - {subcat_title}", ("custom-html",))
+                )
+                
+                # Add figures for this subcategory
+                section_items.extend(
+                    (fragments[record.path], figure_titles[record.path], ("custom-image",))
+                    for record in subcat_figures
+                    if record.path not in collapsed
+                )
+        
+        # Add figures that weren't categorized into subcategories
+        uncategorized_figures = catalog.uncategorized(main_component)
+        
+        # Add uncategorized figures section if there are any
+        if uncategorized_figures:
+            section_items.append((
+                GENERAL_HTML,
+                f"{main_title} - General",
+                ("custom-html",)
+            ))
+            section_items.extend(
+                (fragments[record.path], figure_titles[record.path], ("custom-image",))
+                for record in uncategorized_figures
+                if record.path not in collapsed
+            )
+        
+        if layout == 'paged':
+            # The figures go to their own page, fetched when opened
+            section_file = f"{main_component.lower()}.html"
+            paged_sections.append(
+                (os.path.join(sections_dir, section_file), main_component, section_items)
+            )
+            report.add_html(
+                lazy_section_html(
+                    main_component, f"{sections_href}/{quote(section_file)}", len(figures)
+                ),
+                title=f"{main_title} - Figures"
             )
+        else:
+            for item_html, item_title, tags in section_items:
+                report.add_html(item_html, title=item_title, tags=tags)
     
-    return main_categories
+    # Save the report, reading each figure fragment from the store
+    # only as it is written
+    conn = open_metadata_store()
+    try:
+        read_fragment = partial(read_report_fragment, conn, figures_href=figures_href)
+        for section_path, main_component, section_items in paged_sections:
+            write_report_section(section_path, main_component, section_items, read_fragment)
+        stream_report(report, report_path, read_fragment)
+    finally:
+        conn.close()
+    shown = FigureCatalog(record for record in catalog if record.path not in collapsed)
+    return report_path, shown.stats()
 
-def generate_mne_report(custom_date=None):
-    """Generate an MNE report from the organized figures with improved organization and layout"""
+def generate_mne_report(custom_date=None, preview_format=None, preview_max_width=None,
+                        asset_mode='inline', jobs=1, catalog=None, layout='single',
+                        optimized=None, byte_budget=REPORT_BYTE_BUDGET,
+                        duplicate_threshold=DUPLICATE_THRESHOLD, delta=False,
+                        side_by_side=False, views=()):
+    """
+    Generate an MNE report from the organized figures with improved organization and layout
+    
+    The figures, their grouping and the overview counts come from catalog,
+    a FigureCatalog of LOCAL_FIG_PATH scanned here when not given.
+    
+    Figures are shown as downscaled previews (see previews.py, by default
+    PREVIEW_FORMAT at most PREVIEW_MAX_WIDTH wide) linking to the
+    full-resolution originals. With asset_mode='inline' the previews are
+    embedded and the originals copied next to the report; with 'external'
+    both are written to the shared asset store and referenced by URL.
+    Figures are read and encoded by prepare_figures() on jobs processes,
+    and streamed into the report file one at a time when it is saved (see
+    report_writer.py), so memory use does not grow with the week's figures.
+    
+    optimized maps figures to the optimized versions made by
+    optimize.optimize_figures(), which are shown and linked to instead. If
+    the figures weigh more than byte_budget bytes, previews are made with
+    the smaller BUDGET_PREVIEW_MAX_WIDTH and BUDGET_PREVIEW_QUALITY.
+    
+    Figures of a section with identical contents, or perceptual hashes at
+    most duplicate_threshold bits apart, are shown once, captioned with all
+    their filenames (see duplicates.py; None or negative keeps them all).
+    
+    Each report records a snapshot of its figures (see report_delta.py).
+    With delta=True, only the figures added or changed since the latest
+    snapshot from an earlier date are reported, changed ones next to a
+    preview of their previous version with side_by_side=True.
+    
+    With layout='paged' the report is a landing page with the overview and
+    table of contents, and the figures of each main component are written
+    to a page of their own in the report's sections directory, fetched
+    when the section is opened (see LAZY_SECTION_SCRIPT).
+    
+    The report chrome comes from the templates of report_templates.py, and
+    its style from the shared stylesheet published next to the website's
+    (see publish_report_stylesheet()), linked rather than embedded.
+    
+    views lists the kinds of targeted reports (REPORT_VIEWS) to make along
+    with the combined report, linked from it: one per main component for
+    'experiment', one per subject for 'subject' (see report_view_paths()).
+    They are cut from the same catalog and reuse the figure fragments
+    cached for the combined report and its figures directory, and are
+    written on jobs processes.
+    
+    Returns:
+    --------
+    tuple
+        (report_path, date, stats): the report (None if it failed), its
+        date, and FigureCatalog.stats() of the figures it shows
+    """
     try:
-        # Create a new report with a more specific title
-        report = mne.Report(title='MEG Weekly Analysis Report')
-        
         # Get current date for report naming, or use custom date if provided
         if custom_date:
             current_date = custom_date.strftime("%Y-%m-%d")
         else:
             current_date = datetime.now().strftime("%Y-%m-%d")
         
-        # Read metadata database
-        metadata_db = read_metadata()
-        
-        # Get all top-level category directories
-        category_dirs = [d for d in os.listdir(LOCAL_FIG_PATH) 
-                        if os.path.isdir(os.path.join(LOCAL_FIG_PATH, d))]
-        
-        # Custom CSS for better formatting and smaller figures
-        custom_css = """
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                margin: 20px;
-                line-height: 1.6;
-                color: #333;
-                background-color: #f8f9fa;
-            }
-            
-            .mne-report-section {
-                margin-bottom: 30px;
-                background-color: white;
-                padding: 20px;
-                border-radius: 8px;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            
-            .mne-report-section h2 {
-                padding: 10px 15px;
-                background-color: #e7f5ff;
-                border-left: 5px solid #1e88e5;
-                margin: 20px 0;
-                border-radius: 0 4px 4px 0;
-                font-size: 1.5em;
-            }
-            
-            .mne-report-section h3 {
-                margin-top: 25px;
-                border-bottom: 2px solid #bbdefb;
-                padding-bottom: 5px;
-                color: #1976d2;
-                font-size: 1.3em;
-            }
-            
-            .mne-report-section h4 {
-                margin-top: 15px;
-                color: #2962ff;
-                font-size: 1.1em;
-            }
-            
-            .mne-report-section figure {
-                box-shadow: 0 1px 3px rgba(0,0,0,0.12);
-                padding: 15px;
-                margin: 15px 0;
-                transition: transform 0.2s;
-                max-width: 650px;
-                background-color: white;
-                border-radius: 4px;
-            }
-            
-            .mne-report-section figure:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-            }
-            
-            .mne-report-section img {
-                max-width: 100%;
-                height: auto;
-            }
-            
-            .mne-report-section figcaption {
-                font-size: 13px;
-                margin-top: 10px;
-                font-style: italic;
-                color: #505050;
-                border-top: 1px solid #eee;
-                padding-top: 8px;
-            }
-            
-            .experiment-description {
-                background-color: #f0f7fb;
-                padding: 15px;
-                border-left: 3px solid #1e88e5;
-                margin: 15px 0;
-                font-size: 14px;
-                border-radius: 0 4px 4px 0;
-            }
-            
-            .figure-grid {
-                display: grid;
-                grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
-                grid-gap: 20px;
-                margin: 20px 0;
-            }
-            
-            .overview-container {
-                background-color: #e3f2fd;
-                border-radius: 8px;
-                padding: 20px;
-                margin-bottom: 25px;
-                border-left: 5px solid #1e88e5;
-                color: #0d47a1;
-            }
-            
-            .overview-container h2 {
-                margin-top: 0;
-                color: #0d47a1;
-                background: none;
-                border-left: none;
-                padding: 0;
-            }
-            
-            .toc-container {
-                background-color: #fff;
-                border: 1px solid #e0e0e0;
-                border-radius: 8px;
-                padding: 20px;
-                margin: 20px 0;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            
-            .toc-container h3 {
-                margin-top: 0;
-                border-bottom: 1px solid #e0e0e0;
-                padding-bottom: 10px;
-                color: #1976d2;
-            }
-            
-            .toc-container ul {
-                list-style-type: none;
-                padding-left: 5px;
-            }
-            
-            .toc-container li {
-                margin-bottom: 8px;
-                padding-left: 15px;
-                position: relative;
-            }
-            
-            .toc-container li:before {
-                content: '•';
-                position: absolute;
-                left: 0;
-                color: #1e88e5;
-            }
-            
-            .toc-container a {
-                text-decoration: none;
-                color: #1976d2;
-                font-weight: 500;
-                transition: all 0.2s;
-            }
-            
-            .toc-container a:hover {
-                color: #0d47a1;
-                padding-left: 3px;
-            }
-            
-            .date-stamp {
-                color: #666;
-                font-style: italic;
-                margin-bottom: 15px;
-            }
-            
-            .figures-summary {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 10px;
-                margin: 15px 0;
-            }
-            
-            .figure-stat {
-                background-color: #bbdefb;
-                padding: 8px 15px;
-                border-radius: 20px;
-                font-weight: 500;
-                color: #0d47a1;
-            }
-            
-            .experiment-container {
-                margin-bottom: 30px;
-                padding: 20px;
-                background-color: white;
-                border-radius: 8px;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            
-            .experiment-heading {
-                font-size: 1.4em;
-                color: #0d47a1;
-                border-bottom: 2px solid #bbdefb;
-                padding-bottom: 10px;
-                margin-bottom: 15px;
-            }
-            
-            .experiment-full-description {
-                background-color: #f5f5f5;
-                padding: 15px;
-                border-radius: 5px;
-                margin: 15px 0;
-                font-size: 14px;
-                line-height: 1.6;
-            }
-            
-            .subcategory-container {
-                margin: 15px 0 30px 0;
-                padding: 15px;
-                background-color: #f8f9fa;
-                border-radius: 6px;
-                border-left: 3px solid #bbdefb;
-            }
-            
-            .subcategory-heading {
-                font-size: 1.2em;
-                color: #1976d2;
-                margin-bottom: 15px;
-            }
-            
-            .no-subcategory-container {
-                margin-top: 20px;
-            }
-        </style>
-        """
-        
-        # Add custom CSS to the report
-        report.add_custom_css(custom_css)
-        
-        # Count total figures
-        total_figures = 0
-        for category in category_dirs:
-            category_path = os.path.join(LOCAL_FIG_PATH, category)
-            figures = glob.glob(os.path.join(category_path, "**/*.png"), recursive=True)
-            total_figures += len(figures)
-        
-        # Get unique subjects and tasks
-        subjects = set()
-        tasks = set()
-        main_components = set()
-        for meta in metadata_db.values():
-            if 'subject' in meta:
-                subjects.add(meta['subject'])
-            if 'task' in meta:
-                tasks.add(meta['task'])
-            
-            # Extract main component from filename
-            if 'filename' in meta:
-                main_component = extract_main_component(meta['filename'])
-                if main_component and main_component != 'unknown':
-                    main_components.add(main_component)
-        
-        # Add overview section
-        overview_html = f"""
-        <div class="overview-container">
-            <h2>MEG Weekly Analysis Report</h2>
-            <p class="date-stamp">Generated on {datetime.strptime(current_date, '%Y-%m-%d').strftime('%A, %B %d, %Y')}</p>
-            
-            <p>This report contains MEG/EEG analysis results from the past week.</p>
-            
-            <div class="figures-summary">
-                <span class="figure-stat">{total_figures} figures</span>
-                <span class="figure-stat">{len(subjects)} subjects</span>
-                <span class="figure-stat">{len(tasks)} tasks</span>
-                <span class="figure-stat">{len(main_components)} experiment types</span>
-            </div>
-        </div>
-        """
-        report.add_html(overview_html, title="Overview")
-        
-        # Create collection of all figures across categories
-        all_figures = []
-        for category in category_dirs:
-            category_path = os.path.join(LOCAL_FIG_PATH, category)
-            figures = glob.glob(os.path.join(category_path, "**/*.png"), recursive=True)
-            all_figures.extend(figures)
-        
-        # Group all figures hierarchically
-        hierarchical_groups = group_figures_hierarchically(all_figures, metadata_db)
-        
-        # Create table of contents based on main components
-        toc_items = []
-        for main_component in sorted(hierarchical_groups.keys()):
-            if main_component != 'unknown':  # Skip unknown category in TOC
-                display_name = main_component.capitalize()
-                toc_items.append(f'<li><a href="#{main_component.lower()}">{display_name}</a></li>')
-        
-        # Add "Other" category to TOC if we have unknown items
-        if 'unknown' in hierarchical_groups:
-            toc_items.append('<li><a href="#unknown">Other Figures</a></li>')
-        
-        # Add table of contents
-        toc_html = f"""
-        <div class="toc-container">
-            <h3>Contents</h3>
-            <ul>
-                {''.join(toc_items)}
-            </ul>
-        </div>
-        """
-        report.add_html(toc_html, title="Table of Contents")
-        
-        # Process each main component group
-        for main_component, group_data in sorted(hierarchical_groups.items()):
-            figures = group_data['figures']
-            subcategories = group_data['subcategories']
-            
-            if not figures:  # Skip empty groups
-                continue
-                
-            # Get main component description (experiment description)
-            main_desc = get_experiment_description(main_component)
-            main_title = main_component.capitalize()
-            
-            # Add main component section header with anchor
-            main_html = f"""
-            <div id="{main_component.lower()}" class="experiment-container">
-                <h2 class="experiment-heading">{main_title}</h2>
-                
-                <div class="experiment-description">
-                    {main_desc.get('short', '')}
-                </div>
-                
-                <div class="experiment-full-description">
-                    {main_desc.get('full', '')}
-                </div>
-                
-                <p><strong>Figures:</strong> {len(figures)}</p>
-            </div>
-            """
-            report.add_html(main_html, title=main_title)
-            
-            # Add figures by subcategory
-            if subcategories:
-                for subcat_key, subcat_figures in sorted(subcategories.items()):
-                    # Create readable subcategory title
-                    subcat_title = subcat_key.replace('_', ' ').title()
-                    
-                    # Add subcategory container
-                    subcat_html = f"""
-                    <div class="subcategory-container">
-                        <h3 class="subcategory-heading">{subcat_title}</h3>
-                    </div>
-                    """
-                    report.add_html(subcat_html, title=f"{main_title} - {subcat_title}")
-                    
-                    # Add figures for this subcategory
-                    for fig_path, filename, meta in subcat_figures:
-                        # Create a descriptive title by removing main component and current subcategory
-                        parts = os.path.splitext(filename)[0].split('_')
-                        filtered_parts = [p for p in parts 
-                                        if p.lower() != main_component.lower() 
-                                        and p.lower() != subcat_key.lower()]
-                        
-                        if filtered_parts:
-                            fig_title = ' '.join(word.capitalize() for word in filtered_parts)
-                        else:
-                            fig_title = filename
-                        
-                        # Add the figure
-                        report.add_image(
-                            image=fig_path,
-                            title=fig_title,
-                            caption=generate_caption(meta)
-                        )
-            
-            # Add figures that weren't categorized into subcategories
-            uncategorized_figures = []
-            for fig_path, filename, meta in figures:
-                # Check if this figure is already in a subcategory
-                in_subcategory = False
-                for subcat_figures in subcategories.values():
-                    if any(f[1] == filename for f in subcat_figures):
-                        in_subcategory = True
-                        break
-                
-                if not in_subcategory:
-                    uncategorized_figures.append((fig_path, filename, meta))
-            
-            # Add uncategorized figures section if there are any
-            if uncategorized_figures:
-                report.add_html(
-                    '<div class="no-subcategory-container"><h3>General</h3></div>',
-                    title=f"{main_title} - General"
-                )
-                
-                for fig_path, filename, meta in uncategorized_figures:
-                    # Create a descriptive title by removing main component
-                    parts = os.path.splitext(filename)[0].split('_')
-                    filtered_parts = [p for p in parts 
-                                     if p.lower() != main_component.lower()]
-                    
-                    if filtered_parts:
-                        fig_title = ' '.join(word.capitalize() for word in filtered_parts)
-                    else:
-                        fig_title = filename
-                    
-                    # Add the figure
-                    report.add_image(
-                        image=fig_path,
-                        title=fig_title,
-                        caption=generate_caption(meta)
-                    )
-        
-        # Save the report
+        # List every organized figure once, unless the caller already did
+        if catalog is None:
+            catalog = FigureCatalog.scan(LOCAL_FIG_PATH)
+        
+        # Optimized versions of the figures stand in for them (under the
+        # same filenames)
+        optimized = optimized or {}
+        sources = {record.path: optimized.get(record.path, record.path) for record in catalog}
+        
+        # Every report is snapshotted for later delta reports, which only
+        # show what changed since the previous snapshot
+        conn = open_metadata_store()
+        try:
+            file_hashes = content_hashes(conn, catalog.paths)
+            shown_hashes = content_hashes(conn, sorted(set(sources.values())))
+            source_hashes = {fig_path: shown_hashes[source] for fig_path, source in sources.items()}
+        finally:
+            conn.close()
+        full_catalog = catalog
+        snapshot = load_previous_snapshot(current_date) if delta else None
+        changes = {}
+        if delta and snapshot is None:
+            logger.info("No earlier report to compare with, reporting every figure")
+        elif snapshot is not None:
+            changes = compare_with_snapshot(catalog, file_hashes, snapshot)
+            catalog = FigureCatalog(record for record in catalog if record.path in changes)
+        
+        # Heavy weeks get smaller previews to stay within the byte budget
+        preview_quality = None
+        week_bytes = sum(os.path.getsize(sources[record.path]) for record in catalog)
+        if byte_budget and week_bytes > byte_budget:
+            preview_max_width = BUDGET_PREVIEW_MAX_WIDTH
+            preview_quality = BUDGET_PREVIEW_QUALITY
+            logger.info(
+                f"Figures weigh {week_bytes} bytes, over the {byte_budget} byte "
+                f"budget: previews at most {preview_max_width}px wide, "
+                f"quality {preview_quality}"
+            )
+        preview_settings = (preview_format, preview_max_width, preview_quality)
+        
+        # Report file and the directory of its full-resolution figures
         report_filename = f"mne_report_{current_date}.html"
         report_path = os.path.join(LOCAL_REPORT_PATH, report_filename)
-        report.save(report_path, overwrite=True)
+        figures_dir = report_figures_directory(report_path)
+        
+        # Targeted reports, cut from the reported figures. Those of an
+        # earlier run the same day are replaced.
+        for view_path in report_view_paths(report_path):
+            os.remove(view_path)
+            shutil.rmtree(report_sections_directory(view_path), ignore_errors=True)
+        view_reports = []
+        for view_name, view_title, view_paths in report_views(full_catalog, views):
+            view_catalog = FigureCatalog(record for record in catalog if record.path in view_paths)
+            if len(view_catalog):
+                view_reports.append((
+                    report_view_path(report_path, view_name), view_title, view_catalog,
+                    len(view_paths) - len(view_catalog)
+                ))
         
+        def report_delta(report_catalog, unchanged):
+            """Delta mode summary of the figures of one report"""
+            if snapshot is None:
+                return None
+            return {
+                'date': snapshot['date'],
+                'changes': {record.path: changes[record.path] for record in report_catalog},
+                'unchanged': unchanged
+            }
+        
+        _, stats = write_report(
+            report_path, 'MEG Weekly Analysis Report', catalog, current_date, sources,
+            figures_dir, preview_settings, asset_mode, jobs, layout, duplicate_threshold,
+            report_delta(catalog, len(full_catalog) - len(catalog)), side_by_side,
+            [(quote(os.path.basename(view_path)), view_title)
+             for view_path, view_title, _, _ in view_reports]
+        )
+        write_catalog_snapshot(current_date, full_catalog, file_hashes, source_hashes)
         logger.info(f"Report generated at: {report_path}")
-        return report_path, current_date
+        
+        # The figure fragments are all cached by now, so targeted reports
+        # are mostly assembled and written, one per worker process
+        view_tasks = [
+            (
+                view_path, f"MEG Weekly Analysis Report - {view_title}", view_catalog,
+                current_date, {record.path: sources[record.path] for record in view_catalog},
+                figures_dir, preview_settings, asset_mode, 1, layout, duplicate_threshold,
+                report_delta(view_catalog, unchanged), side_by_side
+            )
+            for view_path, view_title, view_catalog, unchanged in view_reports
+        ]
+        written = 0
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(write_report, *task): task[0] for task in view_tasks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Error generating report {futures[future]}: {str(e)}")
+        if view_tasks:
+            logger.info(
+                f"Generated {written} of {len(view_tasks)} targeted report(s) "
+                f"with {jobs} job(s)"
+            )
+        
+        return report_path, current_date, stats
     
     except Exception as e:
         logger.error(f"Error generating report: {str(e)}")
         logger.error(traceback.format_exc())
-        return None, datetime.now().strftime("%Y-%m-%d")
+        return None, datetime.now().strftime("%Y-%m-%d"), None
 
 def generate_caption(metadata):
     """Generate a concise, descriptive caption from metadata"""
@@ -664,24 +1042,86 @@ def generate_caption(metadata):
     # Join parts with a separator
     return " | ".join(caption_parts) if caption_parts else "No metadata available"
 
-def update_github_website(report_path, date):
-    """Copy the report to the GitHub repo and update the website"""
+def update_github_website(report_path, date, stats=None, archive_after=None):
+    """
+    Copy the report to the GitHub repo and update the website
+    
+    stats are the counts of the figures the report shows, as returned by
+    generate_mne_report(), recorded in the reports manifest.
+    
+    With archive_after set, reports published more than archive_after days
+    ago are moved to the archive branch, leaving stubs (see archive.py),
+    and the branch is pushed along with the site.
+    """
     try:
         # Create weekly directory structure if needed
         week_dir = get_week_directory(date)
         github_week_dir = os.path.join(GITHUB_FILES_PATH, week_dir)
         os.makedirs(github_week_dir, exist_ok=True)
         
-        # Copy the report to the GitHub repo
+        # Copy the report to the GitHub repo, keeping track of every file
+        # written or removed, which are the only ones committed
         report_filename = os.path.basename(report_path)
         github_report_path = os.path.join(github_week_dir, report_filename)
         shutil.copy2(report_path, github_report_path)
+        published = [github_report_path]
         
-        # Update index.html
-        update_index_html(report_filename, week_dir, date)
+        # Copy the full-resolution figures the report links to, the
+        # sections of a paged report, and the images of the shared asset
+        # store it and its targeted reports use
+        figures_dir = report_figures_directory(report_path)
+        if os.path.isdir(figures_dir):
+            published.extend(copy_changed_files(
+                figures_dir, report_figures_directory(github_report_path)
+            ))
+        sections_dir = report_sections_directory(report_path)
+        if os.path.isdir(sections_dir):
+            github_sections_dir = report_sections_directory(github_report_path)
+            shutil.rmtree(github_sections_dir, ignore_errors=True)
+            shutil.copytree(sections_dir, github_sections_dir)
+            published.append(github_sections_dir)
         
-        # Commit and push changes
-        git_commit_and_push(f"Update MNE report on the {date}")
+        # Replace the targeted reports published by an earlier run the
+        # same day, with their sections
+        for view_path in report_view_paths(github_report_path):
+            os.remove(view_path)
+            shutil.rmtree(report_sections_directory(view_path), ignore_errors=True)
+            published.extend([view_path, report_sections_directory(view_path)])
+        for view_path in report_view_paths(report_path):
+            shutil.copy2(view_path, github_week_dir)
+            published.append(os.path.join(github_week_dir, os.path.basename(view_path)))
+            view_sections_dir = report_sections_directory(view_path)
+            if os.path.isdir(view_sections_dir):
+                github_view_sections_dir = os.path.join(
+                    github_week_dir, os.path.basename(view_sections_dir)
+                )
+                shutil.copytree(view_sections_dir, github_view_sections_dir)
+                published.append(github_view_sections_dir)
+        view_paths = report_view_paths(report_path)
+        published.extend(publish_assets(referenced_assets(
+            [report_path, sections_dir, *view_paths, *map(report_sections_directory, view_paths)]
+        )))
+        stylesheet_path = publish_report_stylesheet()
+        if stylesheet_path:
+            published.append(stylesheet_path)
+        
+        # Record the report in the reports manifest, which index.html and
+        # reports.html list reports from
+        published.append(append_report(report_record(
+            github_report_path, date, week_dir, stats,
+            report_view_paths(github_report_path)
+        )))
+        
+        # Archive old reports
+        push_refs = None
+        if archive_after is not None:
+            published.extend(archive_old_reports(archive_after, repo_path=GITHUB_REPO_PATH))
+            if archive_branch_exists(GITHUB_REPO_PATH):
+                # The archive branch is replaced rather than extended
+                push_refs = ["HEAD", f"+{ARCHIVE_BRANCH}"]
+        
+        # Commit the published files, pushing them in the background
+        git_commit_and_push(f"Update MNE report on the {date}", published, refs=push_refs)
         
         # Send success notification
         # send_email_notification(
@@ -710,80 +1150,6 @@ def get_week_directory(date_str):
     week_num = date_obj.isocalendar()[1]
     return f"week{week_num}_{year}"
 
-def update_index_html(report_filename, week_dir, date_str):
-    """Update the index.html file to include the new report"""
-    try:
-        index_path = os.path.join(GITHUB_REPO_PATH, "index.html")
-        
-        with open(index_path, 'r') as file:
-            content = file.read()
-        
-        # Format date for display
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        formatted_date = date_obj.strftime("%A, %B %d, %Y")
-        
-        # Get metadata summary for the report
-        metadata_db = read_metadata()
-        total_figures = len(metadata_db)
-        subjects = set(meta.get('subject', 'unknown') for meta in metadata_db.values())
-        tasks = set(meta.get('task', 'unknown') for meta in metadata_db.values())
-        
-        # Create a section ID for the meeting date
-        meeting_id = f"meeting-{date_str}"
-        
-        # Check if this meeting section already exists in the page
-        if meeting_id in content:
-            # If section exists, update the MNE report link
-            logger.info(f"Found existing meeting section for {date_str}, updating report link")
-            
-            # Find the report link and update it
-            report_link_pattern = f'<a href="files/[^"]+" class="report-link">View MNE Report</a>'
-            new_report_link = f'<a href="files/{week_dir}/{report_filename}" class="report-link">View MNE Report</a>'
-            
-            # Use regular expression to replace the link
-            import re
-            updated_content = re.sub(report_link_pattern, new_report_link, content)
-            
-            # Write the updated content back to the file
-            with open(index_path, 'w') as file:
-                file.write(updated_content)
-            
-            logger.info(f"Updated index.html with new report link for {date_str}")
-            return True
-        
-        else:
-            # If section doesn't exist, this is an old meeting that should be archived
-            logger.warning(f"Could not find meeting section for {date_str} in index.html")
-            
-            # Instead of failing, we'll just log the warning and continue
-            return True
-    except Exception as e:
-        logger.error(f"Error updating index.html: {str(e)}")
-        return False
-
-def git_commit_and_push(commit_message):
-    """Commit and push changes to GitHub"""
-    try:
-        os.chdir(GITHUB_REPO_PATH)
-        
-        # Add all changes
-        subprocess.run(["git", "add", "."], check=True)
-        
-        # Commit
-        subprocess.run(["git", "commit", "-m", commit_message], check=True)
-        
-        # Push
-        subprocess.run(["git", "push"], check=True)
-        
-        logger.info("Changes committed and pushed to GitHub")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Git error: {str(e)}")
-        return False
-    except Exception as e:
-        logger.error(f"Error in git operations: {str(e)}")
-        return False
-
 def send_email_notification(subject, body, success=True):
     """Send email notification about pipeline status"""
     if not EMAIL_CONFIG['enabled']:
@@ -822,6 +1188,6 @@ def send_email_notification(subject, body, success=True):
         logger.error(f"Failed to send email notification: {str(e)}")
 
 if __name__ == "__main__":
-    report_path, date = generate_mne_report()
+    report_path, date, stats = generate_mne_report()
     if report_path:
-        update_github_website(report_path, date)
\ No newline at end of file
+        update_github_website(report_path, date, stats)
\ No newline at end of file
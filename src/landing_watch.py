@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import os
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+
+from pipeline_config import logger
+
+# inotify(7) event masks: a file written and closed, or moved into the
+# watched directory (rsync and scp both end with one of these), and the
+# kernel queue overflowing, after which events were lost
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+# struct inotify_event: wd, mask, cookie, len, then len bytes of name
+INOTIFY_EVENT = struct.Struct('iIII')
+INOTIFY_READ_SIZE = 64 * 1024
+
+class LandingWatcher:
+    """
+    Wait for files to land in a directory with inotify, instead of
+    scanning it at intervals. Linux only: opening one raises OSError where
+    inotify is not available, see open_landing_watcher().
+    """
+    
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        
+        self.directory = directory
+        self.fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), directory)
+    
+    def wait(self, timeout=None):
+        """
+        Wait for files to land
+        
+        Parameters:
+        -----------
+        timeout : float, optional
+            Seconds to wait at most; waits until something lands if None
+        
+        Returns:
+        --------
+        tuple
+            (names, overflowed): the names of the files that landed (empty
+            on timeout), and whether events were lost, in which case the
+            directory has to be scanned
+        """
+        names = set()
+        overflowed = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self.fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif name:
+                    names.add(os.fsdecode(name))
+        return names, overflowed
+    
+    def close(self):
+        os.close(self.fd)
+
+def open_landing_watcher(directory):
+    """
+    Return a LandingWatcher on directory, or None if inotify cannot be
+    used there and the directory has to be polled instead
+    """
+    try:
+        return LandingWatcher(directory)
+    except OSError as e:
+        logger.warning(f"Cannot watch {directory} with inotify ({str(e)}), polling instead")
+        return None
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+import os
+import json
+import hashlib
+import sqlite3
+import time
+import argparse
+from datetime import datetime
+
+from pipeline_config import logger, LOCAL_FIG_PATH
+
+# Configuration
+METADATA_FILE = os.path.join(LOCAL_FIG_PATH, "metadata.json")
+METADATA_DB_FILE = os.path.join(LOCAL_FIG_PATH, "metadata.sqlite")
+
+# Metadata fields stored for each figure, besides the filename
+METADATA_FIELDS = (
+    'subject', 'task', 'condition', 'analysis_type', 'component',
+    'timestamp', 'added_date'
+)
+
+# Date formats of the 'timestamp' and 'added_date' fields
+TIMESTAMP_FORMAT = '%Y%m%dT%H%M%S'
+ADDED_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Version stored in PRAGMA user_version once the schema exists
+# (2 added the file_hashes and fragments tables, 3 perceptual_hashes)
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS figures (
+    filename TEXT PRIMARY KEY,
+    subject TEXT,
+    task TEXT,
+    condition TEXT,
+    analysis_type TEXT,
+    component TEXT,
+    timestamp TEXT,
+    added_date TEXT,
+    -- Epoch of 'timestamp' if it parses, else of 'added_date'
+    date_epoch REAL
+);
+CREATE INDEX IF NOT EXISTS idx_figures_subject ON figures(subject);
+CREATE INDEX IF NOT EXISTS idx_figures_task ON figures(task);
+CREATE INDEX IF NOT EXISTS idx_figures_condition ON figures(condition);
+CREATE INDEX IF NOT EXISTS idx_figures_timestamp ON figures(timestamp);
+CREATE INDEX IF NOT EXISTS idx_figures_date_epoch ON figures(date_epoch);
+
+-- Content hashes of files, valid while their size and mtime are unchanged
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT
+);
+
+-- Rendered report fragments, keyed by their inputs (see gen_report.py)
+CREATE TABLE IF NOT EXISTS fragments (
+    key TEXT PRIMARY KEY,
+    html TEXT,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS idx_fragments_last_used ON fragments(last_used);
+
+-- Perceptual hashes of figure contents, as hex (see duplicates.py)
+CREATE TABLE IF NOT EXISTS perceptual_hashes (
+    sha256 TEXT,
+    hash_size INTEGER,
+    dhash TEXT,
+    PRIMARY KEY (sha256, hash_size)
+);
+"""
+
+# SQLite caps the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+
+def metadata_date_epoch(metadata):
+    """
+    Return the figure date as an epoch, preferring the filename timestamp
+    over the date the figure was added (same precedence as is_recent_file)
+    """
+    for key, date_format in (('timestamp', TIMESTAMP_FORMAT),
+                             ('added_date', ADDED_DATE_FORMAT)):
+        try:
+            return datetime.strptime(metadata[key], date_format).timestamp()
+        except (KeyError, ValueError, TypeError):
+            continue
+    return None
+
+def open_metadata_store(db_path=None, json_path=None):
+    """
+    Open the metadata store, creating it on first use.
+    
+    When the database is created and a legacy metadata.json exists (by
+    default METADATA_FILE, pass '' to skip), its entries are imported once.
+    Older schemas are upgraded in place.
+    The connection may be shared between threads as long as callers
+    serialize access to it.
+    """
+    db_path = db_path or METADATA_DB_FILE
+    json_path = METADATA_FILE if json_path is None else json_path
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    
+    user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if user_version < SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        if user_version == 0 and json_path and os.path.exists(json_path):
+            import_metadata_json(conn, json_path)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    return conn
+
+def import_metadata_json(conn, json_path=None):
+    """Import the entries of a metadata.json file into the store"""
+    json_path = json_path or METADATA_FILE
+    with open(json_path, 'r') as f:
+        metadata_db = json.load(f)
+    count = upsert_metadata(conn, metadata_db.values())
+    logger.info(f"Imported {count} metadata entries from {json_path}")
+    return count
+
+def upsert_metadata(conn, records):
+    """
+    Insert or replace metadata records (dicts with at least a 'filename')
+    
+    Returns:
+    --------
+    int
+        Number of records written
+    """
+    rows = [
+        (record['filename'],
+         *(record.get(field) for field in METADATA_FIELDS),
+         metadata_date_epoch(record))
+        for record in records
+    ]
+    columns = ('filename',) + METADATA_FIELDS + ('date_epoch',)
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO figures ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+    return len(rows)
+
+def select_in_chunks(conn, query, values):
+    """
+    Run a SELECT whose '{placeholders}' is filled with an IN list of values,
+    in chunks of QUERY_CHUNK_SIZE, yielding every row
+    """
+    values = list(values)
+    for start in range(0, len(values), QUERY_CHUNK_SIZE):
+        chunk = values[start:start + QUERY_CHUNK_SIZE]
+        yield from conn.execute(
+            query.format(placeholders=', '.join('?' * len(chunk))), chunk
+        )
+
+def row_to_metadata(row):
+    """Convert a database row to the metadata dict format used by the pipeline"""
+    metadata = {'filename': row['filename']}
+    for field in METADATA_FIELDS:
+        if row[field] is not None:
+            metadata[field] = row[field]
+    return metadata
+
+def get_metadata(conn, filenames):
+    """
+    Look up the metadata of the given figures
+    
+    Returns:
+    --------
+    dict
+        Mapping of filename to metadata dict, for the filenames that are known
+    """
+    return {
+        row['filename']: row_to_metadata(row)
+        for row in select_in_chunks(
+            conn, "SELECT * FROM figures WHERE filename IN ({placeholders})", filenames
+        )
+    }
+
+def get_date_epochs(conn, filenames):
+    """
+    Look up the figure dates (see metadata_date_epoch) of the given figures
+    
+    Returns:
+    --------
+    dict
+        Mapping of filename to date epoch, for the filenames that have one
+    """
+    return dict(select_in_chunks(
+        conn,
+        "SELECT filename, date_epoch FROM figures "
+        "WHERE date_epoch IS NOT NULL AND filename IN ({placeholders})",
+        filenames
+    ))
+
+def compute_file_hash(file_path, chunk_size=1 << 20):
+    """Compute the SHA-256 content hash of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_file_hashes(conn, paths):
+    """
+    Look up the cached content hashes of files
+    
+    Returns:
+    --------
+    dict
+        Mapping of path to (size, mtime_ns, sha256), for the known paths
+    """
+    return {
+        row[0]: tuple(row[1:])
+        for row in select_in_chunks(
+            conn,
+            "SELECT path, size, mtime_ns, sha256 FROM file_hashes "
+            "WHERE path IN ({placeholders})",
+            paths
+        )
+    }
+
+def upsert_file_hashes(conn, rows):
+    """Insert or replace (path, size, mtime_ns, sha256) rows"""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) "
+            "VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+def content_hashes(conn, file_paths):
+    """
+    Return the content hashes of files as {path: sha256}, only hashing the
+    files whose size or modification time changed since they were last
+    hashed
+    """
+    known = get_file_hashes(conn, file_paths)
+    hashes = {}
+    updates = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        cached = known.get(file_path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            hashes[file_path] = cached[2]
+        else:
+            hashes[file_path] = compute_file_hash(file_path)
+            updates.append((file_path, stat.st_size, stat.st_mtime_ns, hashes[file_path]))
+    upsert_file_hashes(conn, updates)
+    return hashes
+
+def get_perceptual_hashes(conn, content_hashes, hash_size):
+    """
+    Look up the stored perceptual hashes of the given size
+    
+    Returns:
+    --------
+    dict
+        Mapping of content hash to perceptual hash (hex), for the known ones
+    """
+    return dict(select_in_chunks(
+        conn,
+        f"SELECT sha256, dhash FROM perceptual_hashes WHERE hash_size = {int(hash_size)} "
+        "AND sha256 IN ({placeholders})",
+        content_hashes
+    ))
+
+def upsert_perceptual_hashes(conn, rows):
+    """Insert or replace (sha256, hash_size, dhash) rows"""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO perceptual_hashes (sha256, hash_size, dhash) "
+            "VALUES (?, ?, ?)",
+            rows
+        )
+
+def find_fragments(conn, keys):
+    """
+    Look up which report fragments are cached and mark them as used,
+    without reading their HTML
+    
+    Returns:
+    --------
+    set
+        The cached keys
+    """
+    cached = {
+        key for key, in select_in_chunks(
+            conn, "SELECT key FROM fragments WHERE key IN ({placeholders})", keys
+        )
+    }
+    with conn:
+        conn.executemany(
+            "UPDATE fragments SET last_used = ? WHERE key = ?",
+            [(time.time(), key) for key in cached]
+        )
+    return cached
+
+def get_fragment(conn, key):
+    """Return the HTML of a cached report fragment, or None"""
+    row = conn.execute("SELECT html FROM fragments WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def upsert_fragments(conn, fragments):
+    """
+    Insert or replace report fragments, given as {key: html} or as an
+    iterable of (key, html) pairs, which is consumed one pair at a time
+    """
+    pairs = fragments.items() if isinstance(fragments, dict) else fragments
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO fragments (key, html, last_used) VALUES (?, ?, ?)",
+            ((key, html, time.time()) for key, html in pairs)
+        )
+
+def prune_fragments(conn, max_age_days):
+    """Drop fragments not used in the last max_age_days days"""
+    with conn:
+        cursor = conn.execute(
+            "DELETE FROM fragments WHERE last_used < ?",
+            (time.time() - max_age_days * 86400,)
+        )
+    return cursor.rowcount
+
+def query_metadata(conn, since=None, until=None, **filters):
+    """
+    Query figures by date range and/or exact field values
+    
+    Parameters:
+    -----------
+    since, until : datetime, optional
+        Bounds on the figure date (see metadata_date_epoch), inclusive
+    **filters : str
+        Exact matches on 'subject', 'task', 'condition', ...
+    
+    Returns:
+    --------
+    list
+        Metadata dicts ordered by date
+    """
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append("date_epoch >= ?")
+        params.append(since.timestamp())
+    if until is not None:
+        clauses.append("date_epoch <= ?")
+        params.append(until.timestamp())
+    for field, value in filters.items():
+        if field not in METADATA_FIELDS:
+            raise ValueError(f"Unknown metadata field: {field}")
+        clauses.append(f"{field} = ?")
+        params.append(value)
+    
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(f"SELECT * FROM figures{where} ORDER BY date_epoch", params)
+    return [row_to_metadata(row) for row in rows]
+
+def summarize_metadata(conn, filenames=None):
+    """
+    Count figures, distinct subjects and distinct tasks, over the whole
+    store or only over the given filenames
+    """
+    if filenames is None:
+        row = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT subject), COUNT(DISTINCT task) FROM figures"
+        ).fetchone()
+        return {'figures': row[0], 'subjects': row[1], 'tasks': row[2]}
+    
+    subjects = set()
+    tasks = set()
+    metadata_db = get_metadata(conn, filenames)
+    for meta in metadata_db.values():
+        if 'subject' in meta:
+            subjects.add(meta['subject'])
+        if 'task' in meta:
+            tasks.add(meta['task'])
+    return {'figures': len(metadata_db), 'subjects': len(subjects), 'tasks': len(tasks)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Figure metadata store')
+    parser.add_argument(
+        '--import-json', nargs='?', const=METADATA_FILE, metavar='PATH',
+        help='Import a metadata.json file (default: the pipeline one)'
+    )
+    args = parser.parse_args()
+    
+    conn = open_metadata_store(json_path='')
+    if args.import_json:
+        import_metadata_json(conn, args.import_json)
+    print(summarize_metadata(conn))
+    conn.close()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import os
+import shutil
+
+import numpy as np
+
+# Pillow is only needed to recompress figures; without it reports use the
+# figures as they were delivered
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from metadata_store import open_metadata_store, content_hashes
+from pipeline_config import logger, LOCAL_REPORT_PATH
+
+# Configuration
+# Optimized figures, under the content hash of the original and the
+# optimization settings, so each figure is only ever optimized once. They
+# keep the original filename, which reports link to.
+OPTIMIZED_CACHE_PATH = os.path.join(LOCAL_REPORT_PATH, "optimized")
+
+# 'none' uses figures as delivered, 'lossless' recompresses them with the
+# same pixels, 'quantize' also tries a palette of QUANTIZE_COLORS colours,
+# kept only if it stays above QUANTIZE_MIN_PSNR
+OPTIMIZE_MODES = ('none', 'lossless', 'quantize')
+PNG_COMPRESS_LEVEL = 9
+QUANTIZE_COLORS = 256
+# Peak signal-to-noise ratio (dB) of a quantized figure against the
+# original, below which the lossless version is kept
+QUANTIZE_MIN_PSNR = 40.0
+
+def optimized_path(file_hash, filename, mode, min_psnr=None):
+    """Return the cache path of the optimized version of a figure"""
+    variant = mode
+    if mode == 'quantize':
+        variant = f"quantize{QUANTIZE_COLORS}_psnr{min_psnr or QUANTIZE_MIN_PSNR:g}"
+    return os.path.join(OPTIMIZED_CACHE_PATH, variant, file_hash, filename)
+
+def image_psnr(reference, candidate):
+    """Peak signal-to-noise ratio (dB) of candidate against reference"""
+    reference = np.asarray(reference.convert('RGBA'), dtype=np.float64)
+    candidate = np.asarray(candidate.convert('RGBA'), dtype=np.float64)
+    mse = np.mean((reference - candidate) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def recompress_png(fig_path, output_path, mode='lossless', min_psnr=None):
+    """
+    Write the smallest acceptable encoding of a PNG figure to output_path:
+    the original bytes, a maximally compressed copy, or in 'quantize' mode
+    a palette copy within min_psnr of the original
+    """
+    min_psnr = min_psnr or QUANTIZE_MIN_PSNR
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    candidate_path = f"{output_path}.{os.getpid()}.candidate"
+    try:
+        # The original is the candidate to beat
+        shutil.copy2(fig_path, temp_path)
+        with Image.open(fig_path) as image:
+            image.load()
+            options = {'optimize': True, 'compress_level': PNG_COMPRESS_LEVEL}
+            if 'dpi' in image.info:
+                options['dpi'] = image.info['dpi']
+            
+            candidates = [image]
+            if mode == 'quantize':
+                source = image if image.mode in ('RGB', 'RGBA') else image.convert('RGBA')
+                # Only the fast octree method quantizes the alpha channel too
+                method = Image.FASTOCTREE if source.mode == 'RGBA' else Image.MEDIANCUT
+                quantized = source.quantize(colors=QUANTIZE_COLORS, method=method)
+                if image_psnr(image, quantized) >= min_psnr:
+                    candidates.append(quantized)
+            
+            for candidate in candidates:
+                candidate.save(candidate_path, format='PNG', **options)
+                if os.path.getsize(candidate_path) < os.path.getsize(temp_path):
+                    os.replace(candidate_path, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        for path in (temp_path, candidate_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def optimize_figure(fig_path, file_hash, mode='lossless', min_psnr=None):
+    """
+    Return the cached optimized version of a figure, optimizing it on a
+    cache miss
+    
+    Returns:
+    --------
+    tuple
+        (path, bytes_saved, cached); path is fig_path itself if the figure
+        could not be optimized
+    """
+    output_path = optimized_path(file_hash, os.path.basename(fig_path), mode, min_psnr)
+    cached = os.path.exists(output_path)
+    if not cached:
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            recompress_png(fig_path, output_path, mode, min_psnr)
+        except Exception as e:
+            logger.error(f"Error optimizing {fig_path}: {str(e)}")
+            return fig_path, 0, False
+    return output_path, os.path.getsize(fig_path) - os.path.getsize(output_path), cached
+
+def optimize_figures(fig_paths, mode='lossless', min_psnr=None):
+    """
+    Optimize the figures of a report, between organize_figures() and
+    generate_mne_report(). Organized figures are left untouched (they are
+    links to the synced files); optimized copies go to OPTIMIZED_CACHE_PATH.
+    
+    Parameters:
+    -----------
+    fig_paths : list
+        Paths of the organized figures
+    mode : str
+        One of OPTIMIZE_MODES
+    min_psnr : float, optional
+        Quality floor of 'quantize' mode (default: QUANTIZE_MIN_PSNR)
+    
+    Returns:
+    --------
+    dict
+        Mapping of figure path to the path of its optimized version, for
+        generate_mne_report(optimized=...)
+    """
+    if mode == 'none' or not fig_paths:
+        return {}
+    if Image is None:
+        logger.warning("Pillow is not installed, figures are not optimized")
+        return {}
+    
+    conn = open_metadata_store()
+    try:
+        file_hashes = content_hashes(conn, fig_paths)
+    finally:
+        conn.close()
+    
+    optimized = {}
+    total_saved = 0
+    newly_optimized = 0
+    for fig_path in fig_paths:
+        if not fig_path.lower().endswith('.png'):
+            continue
+        path, saved, cached = optimize_figure(fig_path, file_hashes[fig_path], mode, min_psnr)
+        optimized[fig_path] = path
+        total_saved += saved
+        if not cached and path != fig_path:
+            newly_optimized += 1
+            logger.info(f"Optimized {os.path.basename(fig_path)}: {saved} bytes saved")
+    
+    total_size = sum(os.path.getsize(fig_path) for fig_path in optimized)
+    logger.info(
+        f"Optimized {len(optimized)} figure(s) ({mode}, {newly_optimized} new): "
+        f"{total_saved} of {total_size} bytes saved"
+    )
+    return optimized
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import os
+import json
+import errno
+import fcntl
+import shutil
+import argparse
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pipeline_config import logger, LOCAL_REPORT_PATH
+
+# Configuration
+# One JSON Lines file per executed plan, usable with --undo
+ORGANIZE_LOG_PATH = os.path.join(LOCAL_REPORT_PATH, "organize_logs")
+ORGANIZE_MAX_WORKERS = 8
+
+# Ways of placing a figure, in order of preference. Reflinks and hardlinks
+# leave the flat landing directory intact, so later syncs find every file
+# they already transferred; renaming is the last resort.
+ORGANIZE_METHODS = ('reflink', 'hardlink', 'rename')
+
+# Ways a figure that aged out of the recency window is taken out of the
+# organized tree, see expire_file()
+EXPIRE_METHODS = ('unlink', 'return')
+
+# ioctl from linux/fs.h cloning a whole file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Errors meaning a method is not available here, rather than a failure
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY,
+    errno.EINVAL, errno.EMLINK, errno.ENOSYS
+}
+
+PlannedMove = namedtuple('PlannedMove', ['source', 'destination'])
+
+def build_organize_plan(file_paths, destination_dirs):
+    """Pair each file with its destination path inside its directory"""
+    return [
+        PlannedMove(file_path, os.path.join(dest_dir, os.path.basename(file_path)))
+        for file_path, dest_dir in zip(file_paths, destination_dirs)
+    ]
+
+def reflink_file(source, destination):
+    """Create destination as a copy-on-write clone of source"""
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+    except OSError:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+def place_file(move, unsupported=None):
+    """
+    Place a figure at its planned destination, replacing an older organized
+    copy (incremental syncs re-deliver changed files)
+    
+    Parameters:
+    -----------
+    move : PlannedMove
+        Source file and destination path
+    unsupported : set, optional
+        (method, device) pairs known not to work, shared between calls so
+        an unsupported method is only attempted once per filesystem
+    
+    Returns:
+    --------
+    str
+        The method used, or 'unchanged' if the destination already is the
+        same file, or a copy of it: reflinks are new inodes, but keep the
+        size and modification time of their source
+    """
+    unsupported = set() if unsupported is None else unsupported
+    source_stat = os.stat(move.source)
+    try:
+        dest_stat = os.stat(move.destination)
+        if (
+            (dest_stat.st_dev, dest_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino)
+            or (dest_stat.st_size, dest_stat.st_mtime_ns)
+            == (source_stat.st_size, source_stat.st_mtime_ns)
+        ):
+            return 'unchanged'
+    except FileNotFoundError:
+        pass
+    
+    # Links are made under a temporary name, then swapped in atomically
+    temp_path = f"{move.destination}.{threading.get_ident()}.tmp"
+    for method in ORGANIZE_METHODS:
+        if (method, source_stat.st_dev) in unsupported:
+            continue
+        try:
+            if method == 'reflink':
+                reflink_file(move.source, temp_path)
+            elif method == 'hardlink':
+                os.link(move.source, temp_path)
+            else:
+                shutil.move(move.source, move.destination)
+                return method
+            os.replace(temp_path, move.destination)
+            return method
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            unsupported.add((method, source_stat.st_dev))
+    raise OSError(f"Could not place {move.source}")
+
+def expire_file(move):
+    """
+    Take an aged-out figure out of the organized tree: unlink it if the flat
+    landing directory still holds the figure, else move it back there (it
+    was renamed into place)
+    
+    Parameters:
+    -----------
+    move : PlannedMove
+        The figure's path in the flat directory and its organized path
+    
+    Returns:
+    --------
+    str
+        The method used, one of EXPIRE_METHODS
+    """
+    if os.path.exists(move.source):
+        os.remove(move.destination)
+        return 'unlink'
+    shutil.move(move.destination, move.source)
+    return 'return'
+
+def write_plan_log(plan, methods, created_dirs, log_path=None):
+    """
+    Write an executed plan as JSON Lines: a header listing the directories
+    it created, then one line per file it placed or took out ('unchanged'
+    ones are left out). Nothing is written if the plan changed nothing.
+    
+    Returns:
+    --------
+    tuple
+        (log_path, count), count being the number of file lines written
+    """
+    entries = [
+        {'source': move.source, 'destination': move.destination, 'method': method}
+        for move, method in zip(plan, methods)
+        if method != 'unchanged'
+    ]
+    if not entries and not created_dirs:
+        return None, 0
+    if log_path is None:
+        os.makedirs(ORGANIZE_LOG_PATH, exist_ok=True)
+        log_path = os.path.join(
+            ORGANIZE_LOG_PATH,
+            f"organize_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.jsonl"
+        )
+    with open(log_path, 'w') as f:
+        f.write(json.dumps({
+            'created': datetime.now().isoformat(),
+            'created_dirs': sorted(created_dirs)
+        }) + '\n')
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+    return log_path, len(entries)
+
+def execute_plan(plan, max_workers=None, log_path=None, expired=()):
+    """
+    Create the destination directories once, then place every file of the
+    plan on a thread pool, take the expired figures out of the organized
+    tree and log what was done
+    
+    Parameters:
+    -----------
+    plan : list
+        PlannedMove entries, see build_organize_plan()
+    max_workers : int, optional
+        Size of the thread pool (default: ORGANIZE_MAX_WORKERS)
+    log_path : str, optional
+        Where to write the plan log (default: a new file in ORGANIZE_LOG_PATH)
+    expired : list, optional
+        PlannedMove entries of organized figures that aged out, see
+        expire_file()
+    
+    Returns:
+    --------
+    tuple
+        (methods, log_path), methods being the method used for each entry
+        of the plan, in order
+    """
+    created_dirs = set()
+    for dest_dir in {os.path.dirname(move.destination) for move in plan}:
+        # Record every missing level, so undo_plan() can remove them all
+        missing_dir = dest_dir
+        while not os.path.isdir(missing_dir):
+            created_dirs.add(missing_dir)
+            missing_dir = os.path.dirname(missing_dir)
+        os.makedirs(dest_dir, exist_ok=True)
+    
+    unsupported = set()
+    with ThreadPoolExecutor(max_workers=max_workers or ORGANIZE_MAX_WORKERS) as executor:
+        methods = list(executor.map(lambda move: place_file(move, unsupported), plan))
+    expire_methods = [expire_file(move) for move in expired]
+    
+    log_path, logged = write_plan_log(
+        list(plan) + list(expired), methods + expire_methods, created_dirs, log_path
+    )
+    logger.info(
+        f"Placed {logged - len(expired)} of {len(plan)} figure(s) "
+        f"({dict(Counter(methods))}), took out {len(expired)} aged-out "
+        f"figure(s), plan log: {log_path or 'none'}"
+    )
+    return methods, log_path
+
+def undo_plan(log_path):
+    """
+    Undo an executed plan: remove the links it created, move renamed files
+    back to the flat directory, put the figures it took out back in place
+    and remove the directories it created if they are empty. Organized
+    copies that the plan replaced are not restored.
+    
+    Returns:
+    --------
+    int
+        Number of files restored or unlinked
+    """
+    with open(log_path, 'r') as f:
+        header, *entries = [json.loads(line) for line in f if line.strip()]
+    
+    undone = 0
+    for entry in reversed(entries):
+        destination = entry['destination']
+        if entry['method'] in EXPIRE_METHODS:
+            if os.path.exists(destination) or not os.path.exists(entry['source']):
+                continue
+            if entry['method'] == 'return':
+                shutil.move(entry['source'], destination)
+            else:
+                place_file(PlannedMove(entry['source'], destination))
+            undone += 1
+            continue
+        if not os.path.exists(destination):
+            continue
+        if entry['method'] == 'rename':
+            if os.path.exists(entry['source']):
+                logger.warning(f"Not restoring {destination}: {entry['source']} exists")
+                continue
+            shutil.move(destination, entry['source'])
+        else:
+            os.remove(destination)
+        undone += 1
+    
+    # Deepest first, so parents are empty once their children are gone
+    for dest_dir in sorted(header['created_dirs'], key=len, reverse=True):
+        try:
+            os.rmdir(dest_dir)
+        except OSError:
+            pass
+    logger.info(f"Undid {undone} figure placement(s) from {log_path}")
+    return undone
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Figure organization plans')
+    parser.add_argument('--undo', metavar='LOG', help='Undo the plan recorded in LOG')
+    args = parser.parse_args()
+    
+    if args.undo:
+        undo_plan(args.undo)
+    else:
+        logs = sorted(os.listdir(ORGANIZE_LOG_PATH)) if os.path.isdir(ORGANIZE_LOG_PATH) else []
+        print('\n'.join(os.path.join(ORGANIZE_LOG_PATH, log) for log in logs))
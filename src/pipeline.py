@@ -8,20 +8,39 @@ import time
 
 # Import the functions from the previous scripts
 from sync_org import (
-    sync_figures_from_cluster, organize_figures, logger
+    sync_figures_from_cluster, organize_figures, organize_figures_streaming,
+    list_all_remote_figures, load_sync_manifest, plan_incremental_sync,
+    scan_figure_files, logger, SYNC_TRANSPORTS, LOCAL_FIG_PATH
 )
 from gen_report import (
-    generate_mne_report, update_github_website, send_email_notification
+    generate_mne_report, update_github_website, send_email_notification,
+    REPORT_ASSET_MODES, REPORT_LAYOUTS, REPORT_BYTE_BUDGET, REPORT_VIEWS
 )
+from figure_catalog import FigureCatalog
+from optimize import optimize_figures, OPTIMIZE_MODES
+from duplicates import DUPLICATE_THRESHOLD
+from archive import ARCHIVE_BRANCH
+from landing_watch import open_landing_watcher
 
 # Constants for messages
 STEP_SEPARATOR = "\n=== {step} ==="
 PIPELINE_STEPS = {
     "SYNC": "Step 1: Syncing and organizing figures",
-    "REPORT": "Step 2: Generating MNE report",
-    "WEBSITE": "Step 3: Updating GitHub website"
+    "OPTIMIZE": "Step 2: Optimizing figures",
+    "REPORT": "Step 3: Generating MNE report",
+    "WEBSITE": "Step 4: Updating GitHub website"
 }
 
+# Daemon mode: how often to look for new figures (when they cannot be
+# watched with inotify), and how long no new figure must arrive before a
+# burst is published (seconds)
+DAEMON_POLL_INTERVAL = 60
+DAEMON_QUIET_PERIOD = 300
+# Where the daemon looks for new figures: the remote listings compared with
+# the sync manifest, or the local landing directory when figures are
+# delivered to it by other means
+DAEMON_WATCH_MODES = ('remote', 'local')
+
 # Error message templates
 ERROR_MESSAGES = {
     "sync_failed": "Figure sync failed, aborting pipeline",
@@ -53,14 +72,39 @@ SUCCESS_MESSAGES = {
     "website_updated": "GitHub website updated with the new report"
 }
 
+# Daemon messages
+DAEMON_MESSAGES = {
+    "started": "Watching {watch} figures every {interval}s, publishing after "
+               "{quiet}s without new figures",
+    "watching": "Watching {path} with inotify, publishing after {quiet}s "
+                "without new figures",
+    "overflowed": "Missed some inotify events, scanning the landing directory",
+    "pending": "{count} new figure(s) pending, waiting for the burst to settle",
+    "settled": "No new figures for {quiet}s, publishing {count} figure(s)",
+    "sync_skipped": "Figures are delivered locally, skipping sync",
+    "listing_failed": "Could not check for new figures, retrying at next poll",
+    "rescan": "Starting the report of {date} from a full scan of the figures",
+    "burst_done": "Published {count} new figure(s) of {total}",
+    "stopped": "Daemon stopped"
+}
+
 # Error messages
 FAILURE_MESSAGES = {
     "pipeline_failed": "\nPipeline completed with errors in {time:.2f} seconds"
 }
 
 
-def run_pipeline(custom_date=None, days_threshold=7):
-    """Run the complete MNE report pipeline"""
+def run_pipeline(custom_date=None, days_threshold=7, incremental=False,
+                 stream=False, transport='rsync', sync=True, asset_mode='inline',
+                 jobs=1, layout='single', optimize='none',
+                 byte_budget=REPORT_BYTE_BUDGET, duplicate_threshold=DUPLICATE_THRESHOLD,
+                 delta=False, side_by_side=False, views=(), archive_after=None):
+    """
+    Run the complete MNE report pipeline
+    
+    With sync=False the figures already in the landing directory are
+    organized and published without contacting the cluster.
+    """
     start_time = time.time()
     success = True
     logger.info(
@@ -71,7 +115,16 @@ def run_pipeline(custom_date=None, days_threshold=7):
     try:
         # Step 1: Sync and organize figures
         logger.info(STEP_SEPARATOR.format(step=PIPELINE_STEPS["SYNC"]))
-        if not sync_figures_from_cluster():
+        # In streaming mode figures are organized while rsync is still running
+        stream = stream and sync
+        on_file, finish_organize = (
+            organize_figures_streaming(days_threshold) if stream else (None, None)
+        )
+        if not sync:
+            logger.info(DAEMON_MESSAGES["sync_skipped"])
+        elif not sync_figures_from_cluster(
+            incremental=incremental, on_file=on_file, transport=transport
+        ):
             logger.error(ERROR_MESSAGES["sync_failed"])
             send_email_notification(
                 subject=EMAIL_SUBJECTS["sync_failed"],
@@ -80,7 +133,8 @@ def run_pipeline(custom_date=None, days_threshold=7):
             )
             return False
         
-        if not organize_figures(days_threshold):
+        organized = finish_organize() if stream else organize_figures(days_threshold)
+        if not organized:
             logger.error(ERROR_MESSAGES["organization_failed"])
             send_email_notification(
                 subject=EMAIL_SUBJECTS["organization_failed"],
@@ -89,16 +143,28 @@ def run_pipeline(custom_date=None, days_threshold=7):
             )
             return False
         
-        # Step 2: Generate MNE report
+        # The later steps all read the one scan of the figures
+        catalog = FigureCatalog.scan()
+        
+        # Step 2: Optimize figures
+        logger.info(STEP_SEPARATOR.format(step=PIPELINE_STEPS["OPTIMIZE"]))
+        optimized = optimize_figures(catalog.paths, mode=optimize)
+        
+        # Step 3: Generate MNE report
         logger.info(STEP_SEPARATOR.format(step=PIPELINE_STEPS["REPORT"]))
-        report_path, date = generate_mne_report(custom_date)
+        report_path, date, stats = generate_mne_report(
+            custom_date, asset_mode=asset_mode, jobs=jobs, catalog=catalog,
+            layout=layout, optimized=optimized, byte_budget=byte_budget,
+            duplicate_threshold=duplicate_threshold, delta=delta,
+            side_by_side=side_by_side, views=views
+        )
         if not report_path:
             logger.error(ERROR_MESSAGES["report_failed"])
             return False
         
-        # Step 3: Update GitHub website
+        # Step 4: Update GitHub website
         logger.info(STEP_SEPARATOR.format(step=PIPELINE_STEPS["WEBSITE"]))
-        if not update_github_website(report_path, date):
+        if not update_github_website(report_path, date, stats, archive_after):
             logger.error(ERROR_MESSAGES["website_failed"])
             success = False
     
@@ -131,11 +197,220 @@ def run_pipeline(custom_date=None, days_threshold=7):
     return success
 
 
-def setup_cron_job():
-    """Set up a cron job to run this pipeline automatically"""
+def pending_figures(watch='remote', published=None):
+    """
+    Return the figures waiting to be published
+    
+    Parameters:
+    -----------
+    watch : str
+        'remote' compares the cluster listings with the sync manifest,
+        'local' scans the landing directory
+    published : dict, optional
+        For 'local', the {path: mtime} snapshot already published
+    
+    Returns:
+    --------
+    dict or None
+        {path: version}, where version changes whenever the file does, or
+        None if the remote could not be listed
+    """
+    if watch == 'remote':
+        remote_files = list_all_remote_figures()
+        if remote_files is None:
+            return None
+        to_fetch = plan_incremental_sync(remote_files, load_sync_manifest())
+        return {rel_path: remote_files[rel_path] for rel_path in to_fetch}
+    
+    published = published or {}
+    file_paths, mtimes = scan_figure_files()
+    return {
+        file_path: mtime for file_path, mtime in zip(file_paths, mtimes.tolist())
+        if published.get(file_path) != mtime
+    }
+
+def run_burst(burst, watch, state, days_threshold=7, transport='rsync',
+              asset_mode='inline', jobs=1, layout='single', optimize='none',
+              byte_budget=REPORT_BYTE_BUDGET, duplicate_threshold=DUPLICATE_THRESHOLD,
+              delta=False, side_by_side=False, views=(), archive_after=None):
+    """
+    Publish a settled burst of new figures, touching only those figures:
+    they are synced incrementally (for 'remote'), organized one by one,
+    added to the catalog kept in state (figures that aged out leave it) and
+    optimized, and only their report fragments are rendered, the others
+    coming from the fragment cache
+    
+    Parameters:
+    -----------
+    burst : dict
+        The pending figures, from pending_figures()
+    watch : str
+        One of DAEMON_WATCH_MODES
+    state : dict
+        Kept by run_daemon() between bursts: the 'catalog' and 'optimized'
+        figures of the report of 'date'. The first burst of a day starts
+        again from a full scan, so figures removed since are dropped.
+    
+    Returns:
+    --------
+    bool
+        True if the burst was published
+    """
+    try:
+        placed = []
+        expired = []
+        on_file, finish_organize = organize_figures_streaming(
+            days_threshold, on_placed=placed.append, on_expired=expired.append
+        )
+        if watch == 'remote':
+            if not sync_figures_from_cluster(
+                incremental=True, on_file=on_file, transport=transport
+            ):
+                logger.error(ERROR_MESSAGES["sync_failed"])
+                return False
+        else:
+            logger.info(DAEMON_MESSAGES["sync_skipped"])
+            for file_path in burst:
+                on_file(os.path.relpath(file_path, LOCAL_FIG_PATH))
+        if not finish_organize():
+            logger.error(ERROR_MESSAGES["organization_failed"])
+            return False
+        
+        today = datetime.now().date()
+        if state.get('date') != today:
+            logger.info(DAEMON_MESSAGES["rescan"].format(date=today))
+            state['catalog'] = FigureCatalog.scan()
+            state['optimized'] = optimize_figures(state['catalog'].paths, mode=optimize)
+            state['date'] = today
+        else:
+            state['catalog'] = state['catalog'].updated(placed, removed=expired)
+            for fig_path in expired:
+                state['optimized'].pop(fig_path, None)
+            state['optimized'].update(optimize_figures(placed, mode=optimize))
+        
+        report_path, date, stats = generate_mne_report(
+            asset_mode=asset_mode, jobs=jobs, catalog=state['catalog'],
+            layout=layout, optimized=state['optimized'], byte_budget=byte_budget,
+            duplicate_threshold=duplicate_threshold, delta=delta,
+            side_by_side=side_by_side, views=views
+        )
+        if not report_path:
+            logger.error(ERROR_MESSAGES["report_failed"])
+            return False
+        if not update_github_website(report_path, date, stats, archive_after):
+            logger.error(ERROR_MESSAGES["website_failed"])
+            return False
+        logger.info(
+            DAEMON_MESSAGES["burst_done"].format(
+                count=len(placed), total=len(state['catalog'])
+            )
+        )
+        return True
+    
+    except Exception as e:
+        logger.error(ERROR_MESSAGES["unhandled_error"].format(error=str(e)))
+        logger.error(traceback.format_exc())
+        # Start the next burst from a full scan
+        state.clear()
+        return False
+
+def landed_figures(names):
+    """{path: mtime} of the landed files that are figures to organize"""
+    landed = {}
+    for name in names:
+        file_path = os.path.join(LOCAL_FIG_PATH, name)
+        if name.endswith('.png') and not name.startswith('.') and os.path.isfile(file_path):
+            landed[file_path] = os.path.getmtime(file_path)
+    return landed
+
+def run_daemon(watch='remote', poll_interval=DAEMON_POLL_INTERVAL,
+               quiet_period=DAEMON_QUIET_PERIOD, days_threshold=7,
+               transport='rsync', asset_mode='inline', jobs=1,
+               layout='single', optimize='none', byte_budget=REPORT_BYTE_BUDGET,
+               duplicate_threshold=DUPLICATE_THRESHOLD, delta=False,
+               side_by_side=False, views=(), archive_after=None):
+    """
+    Publish new figures shortly after they land, as an alternative to the
+    nightly cron job
+    
+    With watch='local' the landing directory is watched with inotify, and
+    polled where inotify is not available; the remote listings are polled
+    every poll_interval seconds (see pending_figures). Once some figures are
+    pending and no new one arrived for quiet_period seconds, the burst is
+    published with run_burst(). Figures already in the landing directory
+    when the daemon starts make the first burst. Runs until interrupted.
+    """
+    watcher = open_landing_watcher(LOCAL_FIG_PATH) if watch == 'local' else None
+    if watcher is not None:
+        logger.info(DAEMON_MESSAGES["watching"].format(path=LOCAL_FIG_PATH, quiet=quiet_period))
+    else:
+        logger.info(
+            DAEMON_MESSAGES["started"].format(
+                watch=watch, interval=poll_interval, quiet=quiet_period
+            )
+        )
+    published = {}
+    state = {}
+    pending = pending_figures(watch, published) if watcher is not None else {}
+    last_change = time.time()
+    
+    try:
+        while True:
+            if watcher is None:
+                current = pending_figures(watch, published)
+            else:
+                # Sleep until a figure lands or the burst has settled
+                timeout = (
+                    max(0, quiet_period - (time.time() - last_change)) if pending else None
+                )
+                names, overflowed = watcher.wait(timeout)
+                if overflowed:
+                    logger.warning(DAEMON_MESSAGES["overflowed"])
+                    current = pending_figures(watch, published)
+                else:
+                    current = {**pending, **landed_figures(names)}
+            
+            if current is None:
+                logger.warning(DAEMON_MESSAGES["listing_failed"])
+            elif current != pending:
+                # The burst is still growing, restart the quiet period
+                pending = current
+                last_change = time.time()
+                if pending:
+                    logger.info(DAEMON_MESSAGES["pending"].format(count=len(pending)))
+            elif pending and time.time() - last_change >= quiet_period:
+                logger.info(
+                    DAEMON_MESSAGES["settled"].format(quiet=quiet_period, count=len(pending))
+                )
+                if run_burst(
+                    pending, watch, state, days_threshold=days_threshold,
+                    transport=transport, asset_mode=asset_mode, jobs=jobs,
+                    layout=layout, optimize=optimize, byte_budget=byte_budget,
+                    duplicate_threshold=duplicate_threshold, delta=delta,
+                    side_by_side=side_by_side, views=views, archive_after=archive_after
+                ):
+                    if watch == 'local':
+                        published.update(pending)
+                    pending = {}
+                # A failed burst is retried after another quiet period
+                last_change = time.time()
+            
+            if watcher is None:
+                time.sleep(poll_interval)
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+
+def setup_cron_job(daemon=False):
+    """
+    Set up a cron job to run this pipeline automatically: daily at 8pm, or
+    with daemon=True as a daemon started at boot
+    """
     try:
         # Path to this script
         script_path = os.path.abspath(__file__)
+        command = f"{script_path} --daemon" if daemon else script_path
         
         # Check if cron job already exists
         current_crontab = subprocess.check_output(
@@ -144,9 +419,10 @@ def setup_cron_job():
         if script_path in current_crontab:
             logger.info("Cron job already exists for this script")
             return True
-            
-        # Set up cron job to run daily at 8pm
-        cron_job = f"0 20 * * * {script_path}\n"
+        
+        # Set up cron job to run daily at 8pm, or the daemon at boot
+        cron_job = (f"@reboot {command}\n" if daemon
+                    else f"0 20 * * * {command}\n")
         new_crontab = current_crontab + cron_job
         
         # Write to temp file
@@ -158,7 +434,10 @@ def setup_cron_job():
         subprocess.run(['crontab', temp_file], check=True)
         os.remove(temp_file)
         
-        logger.info("Cron job set up to run daily at 8pm")
+        logger.info(
+            "Cron job set up to start the daemon at boot" if daemon
+            else "Cron job set up to run daily at 8pm"
+        )
         return True
     except Exception as e:
         logger.error(f"Failed to set up cron job: {str(e)}")
@@ -170,7 +449,76 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='MNE Report Pipeline')
     parser.add_argument(
         '--setup-cron', action='store_true',
-        help='Setup a cron job to run this pipeline daily'
+        help='Setup a cron job to run this pipeline daily '
+             '(with --daemon: to start the daemon at boot)'
+    )
+    parser.add_argument(
+        '--assets', choices=REPORT_ASSET_MODES, default='inline',
+        help='Embed figures in the report, or reference them from the shared '
+             'content-addressed files/assets/ store (default: inline)'
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='Worker processes used to downscale and encode report figures; '
+             'the report is identical whatever the number (default: 1)'
+    )
+    parser.add_argument(
+        '--layout', choices=REPORT_LAYOUTS, default='single',
+        help='One page holding every figure, or a light landing page loading '
+             'each experiment\'s figures when opened (default: single)'
+    )
+    parser.add_argument(
+        '--optimize', choices=OPTIMIZE_MODES, default='none',
+        help='Recompress figures before the report: not at all, losslessly, '
+             'or also to a palette when it stays close to the original '
+             '(default: none)'
+    )
+    parser.add_argument(
+        '--byte-budget', type=int, default=REPORT_BYTE_BUDGET,
+        help='Use smaller previews when the figures of a report weigh more '
+             f'than this many bytes, 0 to disable (default: {REPORT_BYTE_BUDGET})'
+    )
+    parser.add_argument(
+        '--duplicate-threshold', type=int, default=DUPLICATE_THRESHOLD,
+        help='Show figures of a section once when their perceptual hashes differ '
+             'by at most this many bits, -1 to show every figure '
+             f'(default: {DUPLICATE_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--delta', action='store_true',
+        help='Only report the figures added or changed since the previous report'
+    )
+    parser.add_argument(
+        '--side-by-side', action='store_true',
+        help='Delta mode: show changed figures next to their previous version'
+    )
+    parser.add_argument(
+        '--views', nargs='+', choices=REPORT_VIEWS, default=[],
+        help='Also make targeted reports: one per experiment, one per subject, or both'
+    )
+    parser.add_argument(
+        '--archive-after', type=int, metavar='DAYS',
+        help='Move published reports older than DAYS days to per-quarter bundles '
+             f'on the {ARCHIVE_BRANCH} branch, leaving stubs in their place'
+    )
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help='Keep running and publish new figures shortly after they land, '
+             'instead of once a day'
+    )
+    parser.add_argument(
+        '--watch', choices=DAEMON_WATCH_MODES, default='remote',
+        help='Daemon mode: poll the cluster for figures missing from the sync '
+             'manifest, or the local landing directory (default: remote)'
+    )
+    parser.add_argument(
+        '--poll-interval', type=int, default=DAEMON_POLL_INTERVAL,
+        help=f'Daemon mode: seconds between checks (default: {DAEMON_POLL_INTERVAL})'
+    )
+    parser.add_argument(
+        '--quiet-period', type=int, default=DAEMON_QUIET_PERIOD,
+        help='Daemon mode: publish once no new figure arrived for this many '
+             f'seconds (default: {DAEMON_QUIET_PERIOD})'
     )
     parser.add_argument(
         '--force', action='store_true',
@@ -184,10 +532,36 @@ if __name__ == "__main__":
         '--days', type=int, default=7,
         help='Number of days to consider files as recent (default: 7)'
     )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Only transfer new or changed figures instead of re-syncing everything'
+    )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='Organize figures while they are being transferred'
+    )
+    parser.add_argument(
+        '--transport', choices=SYNC_TRANSPORTS, default='rsync',
+        help='How to fetch figures: per-file rsync, or one compressed tar '
+             'stream over SSH for many small files (default: rsync)'
+    )
     args = parser.parse_args()
     
     if args.setup_cron:
-        setup_cron_job()
+        setup_cron_job(daemon=args.daemon)
+    elif args.daemon:
+        try:
+            run_daemon(
+                args.watch, args.poll_interval, args.quiet_period, args.days,
+                transport=args.transport,
+                asset_mode=args.assets, jobs=args.jobs, layout=args.layout,
+                optimize=args.optimize, byte_budget=args.byte_budget,
+                duplicate_threshold=args.duplicate_threshold, delta=args.delta,
+                side_by_side=args.side_by_side, views=args.views,
+                archive_after=args.archive_after
+            )
+        except KeyboardInterrupt:
+            logger.info(DAEMON_MESSAGES["stopped"])
     else:
         # Convert date string to date object if provided
         custom_date = None
@@ -203,4 +577,12 @@ if __name__ == "__main__":
         logger.info(
             f"Considering files from the last {args.days} days as recent"
         )
-        run_pipeline(custom_date, args.days)
\ No newline at end of file
+        run_pipeline(
+            custom_date, args.days,
+            incremental=args.incremental, stream=args.stream,
+            transport=args.transport, asset_mode=args.assets, jobs=args.jobs,
+            layout=args.layout, optimize=args.optimize, byte_budget=args.byte_budget,
+            duplicate_threshold=args.duplicate_threshold, delta=args.delta,
+            side_by_side=args.side_by_side, views=args.views,
+            archive_after=args.archive_after
+        )
\ No newline at end of file
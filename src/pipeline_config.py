@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import os
+import logging
+
+# Logger of every pipeline module; sync_org sets up its handlers
+logger = logging.getLogger("mne_pipeline")
+
+# Configuration
+# Local data: the synced and organized figures, the reports and every cache
+LOCAL_REPORT_PATH = "/home/co/data/mne_reports/"
+LOCAL_FIG_PATH = os.path.join(LOCAL_REPORT_PATH, "figures", "")
+# Clone of the website the reports are published to
+GITHUB_REPO_PATH = "/home/co/git/pi-aiche-dee/"
+GITHUB_FILES_PATH = os.path.join(GITHUB_REPO_PATH, "files")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import os
+import base64
+
+# Pillow is only needed to downscale figures; without it reports embed
+# the original PNGs as before
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from metadata_store import compute_file_hash
+from pipeline_config import logger, LOCAL_REPORT_PATH
+
+# Configuration
+# Downscaled figures, named after the content hash of the original and the
+# preview settings, so each figure is only ever downscaled once
+PREVIEW_CACHE_PATH = os.path.join(LOCAL_REPORT_PATH, "previews")
+
+# Preview settings: format ('webp', 'jpeg' or 'png' for a 256-colour
+# palette PNG), maximum width in pixels and lossy quality
+PREVIEW_FORMAT = "webp"
+PREVIEW_MAX_WIDTH = 1200
+PREVIEW_QUALITY = 80
+# Settings used instead when a report's figures are over its byte budget
+BUDGET_PREVIEW_MAX_WIDTH = 800
+BUDGET_PREVIEW_QUALITY = 60
+
+# File extension and data URI subtype of each preview format
+PREVIEW_FORMATS = {
+    'webp': ('webp', 'webp'),
+    'jpeg': ('jpg', 'jpeg'),
+    'png': ('png', 'png')
+}
+
+def preview_path(file_hash, preview_format=None, max_width=None, quality=None):
+    """Return the cache path of the preview of a figure with the given hash"""
+    preview_format = preview_format or PREVIEW_FORMAT
+    extension = PREVIEW_FORMATS[preview_format][0]
+    return os.path.join(
+        PREVIEW_CACHE_PATH,
+        f"{file_hash}_{max_width or PREVIEW_MAX_WIDTH}w_"
+        f"q{quality or PREVIEW_QUALITY}.{extension}"
+    )
+
+def render_preview(fig_path, output_path, preview_format=None, max_width=None,
+                   quality=None):
+    """Downscale a figure to at most max_width pixels wide and save it"""
+    preview_format = preview_format or PREVIEW_FORMAT
+    max_width = max_width or PREVIEW_MAX_WIDTH
+    quality = quality or PREVIEW_QUALITY
+    
+    with Image.open(fig_path) as image:
+        image.load()
+        if image.width > max_width:
+            height = round(image.height * max_width / image.width)
+            image = image.resize((max_width, max(1, height)), Image.LANCZOS)
+        
+        if preview_format == 'jpeg':
+            # JPEG has no alpha channel, flatten onto the white page
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image, options = background, {'quality': quality, 'optimize': True}
+        elif preview_format == 'png':
+            image = image.convert('RGB').quantize(colors=256)
+            options = {'optimize': True}
+        else:
+            options = {'quality': quality, 'method': 4}
+        
+        # Write under a temporary name so an interrupted run never leaves
+        # a truncated preview in the cache
+        temp_path = f"{output_path}.{os.getpid()}.tmp"
+        image.save(temp_path, format=preview_format.upper(), **options)
+        os.replace(temp_path, output_path)
+
+def make_preview(fig_path, preview_format=None, max_width=None, quality=None,
+                 file_hash=None):
+    """
+    Return the cached preview of a figure, rendering it on a cache miss
+    (file_hash, the figure's content hash, is computed when not given)
+    
+    Returns:
+    --------
+    str or None
+        Path of the preview, or None if it could not be made (the original
+        should then be embedded)
+    """
+    if Image is None:
+        return None
+    try:
+        output_path = preview_path(
+            file_hash or compute_file_hash(fig_path), preview_format, max_width, quality
+        )
+        if not os.path.exists(output_path):
+            os.makedirs(PREVIEW_CACHE_PATH, exist_ok=True)
+            render_preview(fig_path, output_path, preview_format, max_width, quality)
+        return output_path
+    except Exception as e:
+        logger.error(f"Error making preview of {fig_path}: {str(e)}")
+        return None
+
+def image_data_uri(image_path):
+    """Return an image file as a base64 data URI"""
+    extension = os.path.splitext(image_path)[1].lstrip('.').lower()
+    subtype = next(
+        (subtype for ext, subtype in PREVIEW_FORMATS.values() if ext == extension),
+        extension
+    )
+    with open(image_path, 'rb') as f:
+        data = base64.b64encode(f.read()).decode('ascii')
+    return f"data:image/{subtype};base64,{data}"
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import os
+import time
+import threading
+import subprocess
+
+from pipeline_config import logger, GITHUB_REPO_PATH
+
+# Configuration
+# A failed push is retried this many times, PUSH_RETRY_DELAY seconds after
+# the first failure and twice as long after each next one
+PUSH_RETRIES = 5
+PUSH_RETRY_DELAY = 30
+# Remote pushed to when pushing more than the current branch
+PUSH_REMOTE = "origin"
+
+# Pushes run one at a time; each sends every commit made before it started
+_push_lock = threading.Lock()
+
+def run_git(args, repo_path=None, input=None, env=None):
+    """
+    Run a git command on the website repository and return its output;
+    env holds environment variables to set for it
+    """
+    result = subprocess.run(
+        ["git", "-C", repo_path or GITHUB_REPO_PATH, *args],
+        input=input, capture_output=True, text=True, check=True,
+        env={**os.environ, **env} if env else None
+    )
+    return result.stdout
+
+def files_to_stage(paths, repo_path=None):
+    """
+    Expand the paths written to the website (files or directories) into the
+    repository-relative paths of the files to stage: the files on disk, and
+    the tracked files under paths that are gone or are directories, so
+    removals are staged too
+    
+    Returns:
+    --------
+    list
+        Sorted repository-relative paths
+    """
+    repo_path = os.path.abspath(repo_path or GITHUB_REPO_PATH)
+    to_stage = set()
+    tracked_prefixes = []
+    for path in paths:
+        path = os.path.join(repo_path, path)
+        relative_path = os.path.relpath(path, repo_path)
+        if os.path.isfile(path):
+            to_stage.add(relative_path)
+            continue
+        tracked_prefixes.append(relative_path)
+        for dirpath, _, filenames in os.walk(path):
+            to_stage.update(
+                os.path.relpath(os.path.join(dirpath, filename), repo_path)
+                for filename in filenames
+            )
+    if tracked_prefixes:
+        tracked = run_git(["ls-files", "-z", "--", *tracked_prefixes], repo_path)
+        to_stage.update(path for path in tracked.split('\0') if path)
+    return sorted(to_stage)
+
+def commit_paths(paths, commit_message, repo_path=None):
+    """
+    Commit the given website files with git plumbing. Only these paths are
+    hashed into the index (update-index), and the commit is made from the
+    index tree (write-tree, commit-tree, update-ref), so the rest of the
+    working tree is never scanned.
+    
+    Parameters:
+    -----------
+    paths : iterable
+        Files and directories written to the website, absolute or relative
+        to the repository; removed ones are staged as removals
+    commit_message : str
+        Message of the commit
+    
+    Returns:
+    --------
+    str or None
+        The new commit, or None if nothing changed
+    """
+    to_stage = files_to_stage(paths, repo_path)
+    if to_stage:
+        run_git(
+            ["update-index", "--add", "--remove", "-z", "--stdin"], repo_path,
+            input="\0".join(to_stage) + "\0"
+        )
+    tree = run_git(["write-tree"], repo_path).strip()
+    try:
+        parent = run_git(["rev-parse", "--verify", "HEAD"], repo_path).strip()
+    except subprocess.CalledProcessError:
+        # First commit of the repository
+        parent = None
+    if parent and run_git(["rev-parse", f"{parent}^{{tree}}"], repo_path).strip() == tree:
+        return None
+    
+    parent_args = ["-p", parent] if parent else []
+    commit = run_git(
+        ["commit-tree", tree, *parent_args, "-m", commit_message], repo_path
+    ).strip()
+    run_git(
+        ["update-ref", "-m", f"commit: {commit_message}", "HEAD", commit,
+         *([parent] if parent else [])],
+        repo_path
+    )
+    logger.info(f"Committed {len(to_stage)} website file(s) as {commit[:8]}")
+    return commit
+
+def push_with_retries(repo_path=None, retries=None, retry_delay=None, refs=None):
+    """
+    Push the website repository, retrying failed pushes with an exponential
+    backoff. Pushes the current branch, or all of refs at once to
+    PUSH_REMOTE.
+    
+    Returns:
+    --------
+    bool
+        Whether the push succeeded
+    """
+    retries = PUSH_RETRIES if retries is None else retries
+    retry_delay = retry_delay or PUSH_RETRY_DELAY
+    push_args = ["push", "--atomic", PUSH_REMOTE, *refs] if refs else ["push"]
+    with _push_lock:
+        for attempt in range(retries + 1):
+            try:
+                run_git(push_args, repo_path)
+                logger.info("Changes pushed to GitHub")
+                return True
+            except subprocess.CalledProcessError as e:
+                logger.warning(
+                    f"Git push failed (attempt {attempt + 1} of {retries + 1}): "
+                    f"{e.stderr.strip()}"
+                )
+                if attempt < retries:
+                    time.sleep(retry_delay * 2 ** attempt)
+    logger.error(f"Giving up pushing to GitHub after {retries + 1} attempts")
+    return False
+
+def push_in_background(repo_path=None, retries=None, retry_delay=None, refs=None):
+    """
+    Push the website repository from a background thread (see
+    push_with_retries). The thread is not a daemon, so a pipeline run still
+    finishes pushing before the process exits.
+    
+    Returns:
+    --------
+    threading.Thread
+        The pushing thread
+    """
+    thread = threading.Thread(
+        target=push_with_retries, args=(repo_path, retries, retry_delay, refs),
+        name="git-push"
+    )
+    thread.start()
+    return thread
+
+def git_commit_and_push(commit_message, paths, repo_path=None, refs=None):
+    """
+    Commit the given website files (see commit_paths) and push them in the
+    background, along with the other refs given (see push_with_retries)
+    
+    Returns:
+    --------
+    bool
+        Whether the files were committed; the push reports its own outcome
+    """
+    try:
+        if commit_paths(paths, commit_message, repo_path) is None:
+            logger.info("No website changes to commit")
+        # Pushing even without a new commit sends any left by a failed push
+        push_in_background(repo_path, refs=refs)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Git error: {str(e)}: {e.stderr.strip()}")
+        return False
+    except Exception as e:
+        logger.error(f"Error in git operations: {str(e)}")
+        return False
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import os
+import json
+from datetime import datetime
+
+from figure_names import parse_figure_name
+from pipeline_config import logger, LOCAL_REPORT_PATH
+
+# Configuration
+# One JSON snapshot of the catalog per report date, what delta reports
+# are compared with
+CATALOG_SNAPSHOT_PATH = os.path.join(LOCAL_REPORT_PATH, "catalog_snapshots")
+
+def figure_identity(filename):
+    """
+    What identifies a figure from one report to the next: its filename
+    without the timestamp, which changes whenever the figure is rerun
+    """
+    timestamp = parse_figure_name(filename).timestamp
+    return filename.replace(timestamp, '') if timestamp else filename
+
+def write_catalog_snapshot(date_str, catalog, file_hashes, source_hashes):
+    """
+    Record the figures of a report, replacing any snapshot of the same date
+    
+    Parameters:
+    -----------
+    date_str : str
+        Report date, YYYY-MM-DD
+    catalog : FigureCatalog
+        Every figure of the report
+    file_hashes : dict
+        Mapping of figure path to content hash
+    source_hashes : dict
+        Mapping of figure path to the content hash of the version shown
+        (its optimized copy, if any), whose preview is cached under it
+    """
+    os.makedirs(CATALOG_SNAPSHOT_PATH, exist_ok=True)
+    snapshot_path = os.path.join(CATALOG_SNAPSHOT_PATH, f"{date_str}.json")
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({
+            'date': date_str,
+            'created': datetime.now().isoformat(),
+            'figures': [
+                {
+                    'path': record.path,
+                    'filename': record.filename,
+                    'sha256': file_hashes[record.path],
+                    'source_sha256': source_hashes.get(record.path, file_hashes[record.path])
+                }
+                for record in catalog
+            ]
+        }, f)
+    os.replace(temp_path, snapshot_path)
+    return snapshot_path
+
+def load_previous_snapshot(date_str):
+    """Return the latest catalog snapshot from before date_str, or None"""
+    if not os.path.isdir(CATALOG_SNAPSHOT_PATH):
+        return None
+    earlier = sorted(
+        name for name in os.listdir(CATALOG_SNAPSHOT_PATH)
+        if name.endswith('.json') and name[:-len('.json')] < date_str
+    )
+    if not earlier:
+        return None
+    try:
+        with open(os.path.join(CATALOG_SNAPSHOT_PATH, earlier[-1]), 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error reading catalog snapshot {earlier[-1]}: {str(e)}")
+        return None
+
+def compare_with_snapshot(catalog, file_hashes, snapshot):
+    """
+    Find the figures added or changed since a snapshot. A figure whose
+    content was already in the snapshot, under any name, is unchanged.
+    
+    Returns:
+    --------
+    dict
+        Mapping of each added or changed figure path to its snapshot entry
+        (the previous version) for changed figures, None for added ones
+    """
+    previous = {
+        figure_identity(entry['filename']): entry for entry in snapshot['figures']
+    }
+    previous_hashes = {entry['sha256'] for entry in snapshot['figures']}
+    return {
+        record.path: previous.get(figure_identity(record.filename))
+        for record in catalog
+        if file_hashes[record.path] not in previous_hashes
+    }
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+import os
+import hashlib
+from string import Template
+
+from pipeline_config import logger, GITHUB_REPO_PATH
+
+# Configuration
+# The report stylesheet is published once for every report, next to the
+# website's own stylesheet
+GITHUB_STYLESHEET_PATH = os.path.join(GITHUB_REPO_PATH, "assets", "report.css")
+# URL of the published stylesheet, relative to a published report
+# (files/<week>/<report>.html)
+STYLESHEET_URL = "../../assets/report.css"
+
+# Style of the report chrome. Reports link to it rather than embedding it,
+# with its content hash in the URL, so browsers keep one copy for every
+# report until it changes.
+REPORT_CSS = """\
+body {
+    font-family: Arial, sans-serif;
+    margin: 20px;
+    line-height: 1.6;
+    color: #333;
+    background-color: #f8f9fa;
+}
+
+.mne-report-section {
+    margin-bottom: 30px;
+    background-color: white;
+    padding: 20px;
+    border-radius: 8px;
+    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+}
+
+.mne-report-section h2 {
+    padding: 10px 15px;
+    background-color: #e7f5ff;
+    border-left: 5px solid #1e88e5;
+    margin: 20px 0;
+    border-radius: 0 4px 4px 0;
+    font-size: 1.5em;
+}
+
+.mne-report-section h3 {
+    margin-top: 25px;
+    border-bottom: 2px solid #bbdefb;
+    padding-bottom: 5px;
+    color: #1976d2;
+    font-size: 1.3em;
+}
+
+.mne-report-section h4 {
+    margin-top: 15px;
+    color: #2962ff;
+    font-size: 1.1em;
+}
+
+.mne-report-section figure {
+    box-shadow: 0 1px 3px rgba(0,0,0,0.12);
+    padding: 15px;
+    margin: 15px 0;
+    transition: transform 0.2s;
+    max-width: 650px;
+    background-color: white;
+    border-radius: 4px;
+}
+
+.mne-report-section figure:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+
+.mne-report-section img {
+    max-width: 100%;
+    height: auto;
+}
+
+.mne-report-section figcaption {
+    font-size: 13px;
+    margin-top: 10px;
+    font-style: italic;
+    color: #505050;
+    border-top: 1px solid #eee;
+    padding-top: 8px;
+}
+
+.experiment-description {
+    background-color: #f0f7fb;
+    padding: 15px;
+    border-left: 3px solid #1e88e5;
+    margin: 15px 0;
+    font-size: 14px;
+    border-radius: 0 4px 4px 0;
+}
+
+.figure-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fill, minmax(300px, 1fr));
+    grid-gap: 20px;
+    margin: 20px 0;
+}
+
+.overview-container {
+    background-color: #e3f2fd;
+    border-radius: 8px;
+    padding: 20px;
+    margin-bottom: 25px;
+    border-left: 5px solid #1e88e5;
+    color: #0d47a1;
+}
+
+.overview-container h2 {
+    margin-top: 0;
+    color: #0d47a1;
+    background: none;
+    border-left: none;
+    padding: 0;
+}
+
+.toc-container {
+    background-color: #fff;
+    border: 1px solid #e0e0e0;
+    border-radius: 8px;
+    padding: 20px;
+    margin: 20px 0;
+    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+}
+
+.toc-container h3 {
+    margin-top: 0;
+    border-bottom: 1px solid #e0e0e0;
+    padding-bottom: 10px;
+    color: #1976d2;
+}
+
+.toc-container ul {
+    list-style-type: none;
+    padding-left: 5px;
+}
+
+.toc-container li {
+    margin-bottom: 8px;
+    padding-left: 15px;
+    position: relative;
+}
+
+.toc-container li:before {
+    content: '•';
+    position: absolute;
+    left: 0;
+    color: #1e88e5;
+}
+
+.toc-container a {
+    text-decoration: none;
+    color: #1976d2;
+    font-weight: 500;
+    transition: all 0.2s;
+}
+
+.toc-container a:hover {
+    color: #0d47a1;
+    padding-left: 3px;
+}
+
+.date-stamp {
+    color: #666;
+    font-style: italic;
+    margin-bottom: 15px;
+}
+
+.figures-summary {
+    display: flex;
+    flex-wrap: wrap;
+    gap: 10px;
+    margin: 15px 0;
+}
+
+.figure-stat {
+    background-color: #bbdefb;
+    padding: 8px 15px;
+    border-radius: 20px;
+    font-weight: 500;
+    color: #0d47a1;
+}
+
+.experiment-container {
+    margin-bottom: 30px;
+    padding: 20px;
+    background-color: white;
+    border-radius: 8px;
+    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+}
+
+.experiment-heading {
+    font-size: 1.4em;
+    color: #0d47a1;
+    border-bottom: 2px solid #bbdefb;
+    padding-bottom: 10px;
+    margin-bottom: 15px;
+}
+
+.experiment-full-description {
+    background-color: #f5f5f5;
+    padding: 15px;
+    border-radius: 5px;
+    margin: 15px 0;
+    font-size: 14px;
+    line-height: 1.6;
+}
+
+.subcategory-container {
+    margin: 15px 0 30px 0;
+    padding: 15px;
+    background-color: #f8f9fa;
+    border-radius: 6px;
+    border-left: 3px solid #bbdefb;
+}
+
+.subcategory-heading {
+    font-size: 1.2em;
+    color: #1976d2;
+    margin-bottom: 15px;
+}
+
+.no-subcategory-container {
+    margin-top: 20px;
+}
+"""
+STYLESHEET_VERSION = hashlib.sha256(REPORT_CSS.encode('utf-8')).hexdigest()[:12]
+
+# Report chrome, compiled once and filled in for each section. Values are
+# substituted as given: callers escape what needs escaping.
+STYLESHEET_LINK_TEMPLATE = Template(
+    '\n<link rel="stylesheet" type="text/css" href="$href">'
+)
+
+OVERVIEW_TEMPLATE = Template("""
+        <div class="overview-container">
+            <h2>$title</h2>
+            <p class="date-stamp">Generated on $date</p>
+            
+            <p>This report contains MEG/EEG analysis results from the past week.</p>
+            
+            <div class="figures-summary">
+                <span class="figure-stat">$figures figures</span>
+                <span class="figure-stat">$subjects subjects</span>
+                <span class="figure-stat">$tasks tasks</span>
+                <span class="figure-stat">$main_components experiment types</span>
+            </div>
+        </div>
+        """)
+
+DELTA_TEMPLATE = Template("""
+            <div class="overview-container">
+                <h2>Changes since the report of $previous_date</h2>
+                <div class="figures-summary">
+                    <span class="figure-stat">$new new figures</span>
+                    <span class="figure-stat">$changed changed figures</span>
+                    <span class="figure-stat">$unchanged unchanged figures not shown</span>
+                </div>
+            </div>
+            """)
+
+TOC_ITEM_TEMPLATE = Template('<li><a href="#$anchor">$name</a></li>')
+
+TOC_TEMPLATE = Template("""
+        <div class="toc-container">
+            <h3>Contents</h3>
+            <ul>
+                $items
+            </ul>
+        </div>
+        """)
+
+# Links of a combined report to its targeted reports
+VIEW_ITEM_TEMPLATE = Template('<li><a href="$href">$name</a></li>')
+
+VIEWS_TEMPLATE = Template("""
+        <div class="toc-container">
+            <h3>Targeted reports</h3>
+            <ul>
+                $items
+            </ul>
+        </div>
+        """)
+
+EXPERIMENT_TEMPLATE = Template("""
+            <div id="$anchor" class="experiment-container">
+                <h2 class="experiment-heading">$title</h2>
+                
+                <div class="experiment-description">
+                    $short_description
+                </div>
+                
+                <div class="experiment-full-description">
+                    $full_description
+                </div>
+                
+                <p><strong>Figures:</strong> $figure_count</p>
+            </div>
+            """)
+
+SUBCATEGORY_TEMPLATE = Template("""
+                    <div class="subcategory-container">
+                        <h3 class="subcategory-heading">$title</h3>
+                    </div>
+                    """)
+
+# Header of the figures of an experiment that are in no subcategory
+GENERAL_HTML = '<div class="no-subcategory-container"><h3>General</h3></div>'
+
+FIGURE_TEMPLATE = Template("""
+    <figure class="figure mx-auto d-block">
+        <a href="$href" target="_blank">
+            <img class="figure-img img-fluid rounded mx-auto my-0 d-block"
+                 alt="$title" src="$src">
+        </a>
+        <figcaption class="figure-caption text-center">$caption</figcaption>
+    </figure>
+    """)
+
+PREVIOUS_FIGURE_TEMPLATE = Template("""
+    <figure class="figure mx-auto d-block">
+        <img class="figure-img img-fluid rounded mx-auto my-0 d-block"
+             alt="$title" src="$src">
+        <figcaption class="figure-caption text-center">$caption</figcaption>
+    </figure>
+    """)
+
+COMPARISON_TEMPLATE = Template(
+    '<div class="delta-comparison" style="display: flex; gap: 20px; '
+    'align-items: flex-start;">$previous$current</div>'
+)
+
+SECTION_ITEM_TEMPLATE = Template("""<div class="accordion-item custom-html" id="$item_id">
+  <div class="accordion-header">
+    <button class="accordion-button pt-1 pb-1" type="button" data-bs-toggle="collapse" data-bs-target="#$item_id-collapse" aria-expanded="true">
+      <span class="me-auto">$title</span>
+    </button>
+  </div>
+  <div id="$item_id-collapse" class="accordion-collapse collapse show">
+    <div class="accordion-body">$body</div>
+  </div>
+</div>
+""")
+
+LAZY_SECTION_TEMPLATE = Template("""
+    <div class="lazy-section" data-section="$section"
+         data-src="$src">
+        <button class="btn btn-outline-primary lazy-section-button" type="button">
+            Show $figure_count figures
+        </button>
+        <p class="lazy-section-status"></p>
+    </div>
+    """)
+
+def stylesheet_url():
+    """Versioned URL of the report stylesheet, relative to a published report"""
+    return f"{STYLESHEET_URL}?v={STYLESHEET_VERSION}"
+
+def stylesheet_link_html():
+    """Markup linking a report to the shared stylesheet, for mne.Report.include"""
+    return STYLESHEET_LINK_TEMPLATE.substitute(href=stylesheet_url())
+
+def publish_report_stylesheet(dest_path=None):
+    """
+    Write the report stylesheet to the website, unless it is already there
+    
+    Returns:
+    --------
+    str or None
+        Path of the stylesheet if it was written
+    """
+    dest_path = dest_path or GITHUB_STYLESHEET_PATH
+    if os.path.exists(dest_path):
+        with open(dest_path, 'r', encoding='utf-8') as f:
+            if f.read() == REPORT_CSS:
+                return None
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    temp_path = f"{dest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(REPORT_CSS)
+    os.replace(temp_path, dest_path)
+    logger.info(f"Published report stylesheet version {STYLESHEET_VERSION} to {dest_path}")
+    return dest_path
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import os
+import re
+
+# Stands for a figure fragment in the report skeleton, until the report is
+# written out and the marker is replaced by the fragment itself
+FIGURE_MARKER = "<!-- report-figure:{key} -->"
+FIGURE_MARKER_PATTERN = re.compile(r"<!-- report-figure:(\w+) -->")
+
+def figure_marker(key):
+    """Marker to add to a report in place of the figure fragment key"""
+    return FIGURE_MARKER.format(key=key)
+
+def write_expanded(output, text, read_fragment):
+    """
+    Write text to an open file, replacing each figure marker with the
+    fragment returned by read_fragment(key), one fragment at a time
+    """
+    position = 0
+    for match in FIGURE_MARKER_PATTERN.finditer(text):
+        output.write(text[position:match.start()])
+        output.write(read_fragment(match.group(1)))
+        position = match.end()
+    output.write(text[position:])
+
+def stream_report(report, report_path, read_fragment):
+    """
+    Save a report whose figures were added as markers (see figure_marker),
+    streaming each figure's fragment into the output file in turn
+    
+    mne.Report holds everything added to it until it is saved, so figures
+    are only added as markers: the saved skeleton (header, overview,
+    table of contents, section headers) is small, and is copied
+    line by line to the report with the markers expanded. Memory use is
+    bounded by the largest figure fragment rather than the whole report,
+    and the report is the same as if the fragments had been added to it.
+    
+    Parameters:
+    -----------
+    report : mne.Report
+        The report skeleton
+    report_path : str
+        Where to write the report
+    read_fragment : callable
+        Returns the HTML of the figure fragment with the given key
+    """
+    skeleton_path = f"{report_path}.{os.getpid()}.skeleton.html"
+    temp_path = f"{report_path}.{os.getpid()}.tmp"
+    try:
+        report.save(skeleton_path, open_browser=False, overwrite=True)
+        with open(skeleton_path, 'r', encoding='utf-8') as skeleton, \
+                open(temp_path, 'w', encoding='utf-8') as output:
+            for line in skeleton:
+                write_expanded(output, line, read_fragment)
+        os.replace(temp_path, report_path)
+    finally:
+        for path in (skeleton_path, temp_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+
+from pipeline_config import logger, GITHUB_REPO_PATH
+
+# Configuration
+# One JSON record per published report, appended as each is published.
+# A later record for the same path replaces the earlier ones (a report
+# republished the same day). index.html and reports.html list the reports
+# from it, see assets/reports.js.
+REPORTS_MANIFEST_PATH = os.path.join(GITHUB_REPO_PATH, "files", "reports.jsonl")
+
+REPORT_FILENAME_PATTERN = re.compile(r"^mne_report_(\d{4}-\d{2}-\d{2})\.html$")
+
+def report_record(github_report_path, date_str, week_dir, stats=None, view_paths=(),
+                  repo_path=None):
+    """
+    Manifest record of a published report
+    
+    Parameters:
+    -----------
+    github_report_path : str
+        The published report
+    date_str : str
+        Report date, YYYY-MM-DD
+    week_dir : str
+        Week directory the report is published in
+    stats : dict, optional
+        FigureCatalog.stats() of the report's figures
+    view_paths : iterable
+        The published targeted reports made along with it
+    
+    Returns:
+    --------
+    dict
+        date, week, path (relative to the site root), figure, subject and
+        task counts, byte size, targeted reports and publication time
+    """
+    repo_path = repo_path or GITHUB_REPO_PATH
+    stats = stats or {}
+    return {
+        'date': date_str,
+        'week': week_dir,
+        'path': os.path.relpath(github_report_path, repo_path).replace(os.sep, '/'),
+        'figures': stats.get('figures'),
+        'subjects': stats.get('subjects'),
+        'tasks': stats.get('tasks'),
+        'bytes': os.path.getsize(github_report_path),
+        'views': [
+            os.path.relpath(view_path, repo_path).replace(os.sep, '/')
+            for view_path in view_paths
+        ],
+        'published': datetime.now().isoformat(timespec='seconds')
+    }
+
+def append_report(record, manifest_path=None):
+    """
+    Append a report record to the manifest, without reading it
+    
+    Returns:
+    --------
+    str
+        Path of the manifest
+    """
+    manifest_path = manifest_path or REPORTS_MANIFEST_PATH
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    return manifest_path
+
+def read_reports(manifest_path=None):
+    """
+    Read the manifest, keeping the latest record of each report
+    
+    Returns:
+    --------
+    list
+        Records by date, latest first
+    """
+    manifest_path = manifest_path or REPORTS_MANIFEST_PATH
+    reports = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    reports[record['path']] = record
+    return sorted(reports.values(), key=lambda record: record['date'], reverse=True)
+
+def rebuild_manifest(repo_path=None, manifest_path=None):
+    """
+    Write the manifest anew from the reports published under files/, for
+    reports published before it existed. Counts recorded in the current
+    manifest are kept; other reports get no counts.
+    
+    Returns:
+    --------
+    int
+        Number of reports recorded
+    """
+    repo_path = repo_path or GITHUB_REPO_PATH
+    manifest_path = manifest_path or os.path.join(repo_path, "files", "reports.jsonl")
+    known = {record['path']: record for record in read_reports(manifest_path)}
+    files_path = os.path.join(repo_path, "files")
+    records = []
+    for week_dir in sorted(os.listdir(files_path)):
+        week_path = os.path.join(files_path, week_dir)
+        if not os.path.isdir(week_path):
+            continue
+        for filename in sorted(os.listdir(week_path)):
+            match = REPORT_FILENAME_PATTERN.match(filename)
+            if not match:
+                continue
+            report_path = os.path.join(week_path, filename)
+            record = report_record(report_path, match.group(1), week_dir, repo_path=repo_path)
+            previous = known.get(record['path'])
+            if previous:
+                record = {**previous, 'bytes': record['bytes']}
+            else:
+                # When it was published is not known
+                record['published'] = None
+            records.append(record)
+    
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        for record in sorted(records, key=lambda record: (record['date'], record['path'])):
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    os.replace(temp_path, manifest_path)
+    logger.info(f"Recorded {len(records)} report(s) in {manifest_path}")
+    return len(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Published reports manifest')
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help='Write the manifest anew from the reports published on the website'
+    )
+    args = parser.parse_args()
+    
+    if args.rebuild:
+        print(f"Recorded {rebuild_manifest()} report(s)")
+    else:
+        for record in read_reports():
+            print(f"{record['date']}  {record['path']}  {record['figures']} figures")
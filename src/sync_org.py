@@ -4,28 +4,70 @@ import subprocess
 import re
 import shutil
 from datetime import datetime, timedelta
-import glob
 import logging
 import json
+import shlex
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+
+import numpy as np
+
+from figure_names import parse_figure_name, figure_name_metadata
+from pipeline_config import logger, LOCAL_FIG_PATH, LOCAL_REPORT_PATH
+from metadata_store import (
+    METADATA_FILE, METADATA_DB_FILE, open_metadata_store, upsert_metadata,
+    get_date_epochs, compute_file_hash
+)
+from categories import (
+    load_category_table, build_category_matcher, match_category
+)
+from organize_engine import (
+    PlannedMove, build_organize_plan, place_file, expire_file, execute_plan,
+    write_plan_log
+)
+from figure_catalog import iter_category_figures
 
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler("pipeline.log"),
+        logging.FileHandler("pipeline.log", delay=True),
         logging.StreamHandler()
     ]
 )
-logger = logging.getLogger("mne_pipeline")
 
 # Configuration constants
+REMOTE_HOST = "cbel@frontex"
 REMOTE_FIG_PATH = "/home/cbel/results/figs_for_report/"
-LOCAL_FIG_PATH = "/home/co/data/mne_reports/figures/"
-LOCAL_REPORT_PATH = "/home/co/data/mne_reports/"
-GITHUB_REPO_PATH = "/home/co/git/pi-aiche-dee/"
-GITHUB_FILES_PATH = os.path.join(GITHUB_REPO_PATH, "files")
-METADATA_FILE = os.path.join(LOCAL_FIG_PATH, "metadata.json")
+SYNC_MANIFEST_FILE = os.path.join(LOCAL_FIG_PATH, "sync_manifest.json")
+SYNC_STAGING_PATH = os.path.join(LOCAL_REPORT_PATH, "incoming")
+
+# Result directories to pull figures from. They are fetched concurrently and
+# merged into LOCAL_FIG_PATH; when two sources provide the same filename the
+# most recently modified file wins, then the source listed first.
+SYNC_SOURCES = [
+    {'name': 'frontex', 'host': REMOTE_HOST, 'path': REMOTE_FIG_PATH},
+]
+SYNC_MAX_WORKERS = 4
+
+# Line run_rsync() has rsync print for each transferred file: the bytes
+# transferred, then its path
+RSYNC_FILE_LINE_PATTERN = re.compile(r"^\d+ (.+\.png)$")
+
+# Transports available to sync_figures_from_cluster()
+SYNC_TRANSPORTS = ('rsync', 'archive')
+
+# Compression used by the archive transport, as (remote compress command,
+# local program handed to tar --use-compress-program). Must exist on both ends.
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_COMPRESSORS = {
+    'zstd': ("zstd -q -c", "zstd"),
+    'gzip': ("gzip -c", "gzip")
+}
 
 # Log message templates
 LOG_MESSAGES = {
@@ -44,6 +86,18 @@ LOG_MESSAGES = {
     "sync_error": "Sync failed with error: {error}",
     "sync_exception": "Error during sync: {error}",
     
+    # Incremental sync messages
+    "incremental_start": "Syncing figures from cluster (incremental)...",
+    "remote_listing_error": "Failed to list remote figures: {error}",
+    "incremental_planned": "{count} new or changed figure(s) out of {total} on the remote",
+    "incremental_up_to_date": "Local figures are up to date, nothing to transfer",
+    "incremental_transferred": "Transferred {files} file(s), {bytes} bytes",
+    "archive_start": "Syncing figures from cluster (archive transport, {compression})...",
+    "archive_compressed": "Received {bytes} compressed bytes over a single SSH session",
+    "manifest_loaded": "Loaded sync manifest with {count} entries",
+    "manifest_load_error": "Error loading sync manifest, starting from scratch: {error}",
+    "manifest_saved": "Saved sync manifest with {count} entries",
+    
     # Metadata messages
     "metadata_update": "Updated metadata database with {count} entries",
     "metadata_error": "Error updating metadata database: {error}",
@@ -55,24 +109,23 @@ LOG_MESSAGES = {
     "files_filtered": "Filtered to {count} recent files (within {days} days)",
     "no_recent_warning": "No recent files found with metadata dating. Including all files from current sync.",
     "organization_complete": "Files organized successfully",
+    "files_streamed": "Organized {count} figure(s) during transfer ({skipped} not recent)",
     "organization_error": "Error organizing figures: {error}",
     "file_date_error": "Error checking if file is recent: {error}"
 }
 
-# Figure metadata patterns
-METADATA_PATTERNS = {
+# Secondary categories for sub-organization
+FIGURE_SUBCATEGORIES = {
     'subject': r'sub-(\w+)',
     'task': r'task-(\w+)',
-    'condition': r'cond-(\w+)',
-    'analysis_type': r'(meg|eeg|source|topo)',
-    'component': r'(N[0-9]+|P[0-9]+)',
-    'timestamp': r'([0-9]{8}T[0-9]{6})'
+    'condition': r'cond-(\w+)'
 }
 
 def clean_local_figures():
     """
     Clean up local figures directory before syncing new files.
-    This preserves the metadata file but removes all other files and directories.
+    This preserves the metadata file and metadata store but removes all other
+    files and directories.
     """
     try:
         logger.info(LOG_MESSAGES["cleanup_start"])
@@ -82,7 +135,7 @@ def clean_local_figures():
             os.makedirs(LOCAL_FIG_PATH, exist_ok=True)
             logger.info(LOG_MESSAGES["dir_created"])
             return True
-            
+        
         # Backup the metadata file if it exists
         metadata_backup = None
         if os.path.exists(METADATA_FILE):
@@ -97,8 +150,10 @@ def clean_local_figures():
             if os.path.isdir(item_path):
                 shutil.rmtree(item_path)
             else:
-                # Skip the metadata file itself as we've already backed it up
-                if item_path != METADATA_FILE:
+                # Skip the metadata file itself as we've already backed it up,
+                # and the metadata store with its journal files
+                if (item_path != METADATA_FILE
+                        and not item_path.startswith(METADATA_DB_FILE)):
                     os.remove(item_path)
         
         logger.info(LOG_MESSAGES["cleanup_complete"])
@@ -108,15 +163,601 @@ def clean_local_figures():
             with open(METADATA_FILE, 'w') as f:
                 f.write(metadata_backup)
             logger.info(LOG_MESSAGES["metadata_restored"])
-            
+        
         return True
     except Exception as e:
         error_msg = LOG_MESSAGES["cleanup_error"].format(error=str(e))
         logger.error(error_msg)
         return False
 
-def sync_figures_from_cluster():
-    """Sync figures from the cluster to local machine"""
+class _SourceLogAdapter(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        return f"[{self.extra['source']}] {msg}", kwargs
+
+def get_source_logger(source):
+    """
+    Return the log stream for one sync source.
+    
+    Messages are prefixed with the source name in the main log and also
+    written to their own sync_<name>.log file, so concurrent fetches can
+    be followed separately.
+    """
+    source_logger = logger.getChild(f"sync.{source['name']}")
+    if not source_logger.handlers:
+        handler = logging.FileHandler(f"sync_{source['name']}.log")
+        handler.setFormatter(
+            logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        )
+        source_logger.addHandler(handler)
+    return _SourceLogAdapter(source_logger, {'source': source['name']})
+
+def empty_sync_manifest():
+    """Return a manifest describing an empty local figures directory"""
+    return {'last_sync': {}, 'files': {}}
+
+def load_sync_manifest():
+    """
+    Load the local sync manifest.
+    
+    The manifest maps each file path (relative to LOCAL_FIG_PATH) to the
+    source it came from and the size, mtime and content hash it had when it
+    was last transferred, so files that were already organized out of the
+    landing directory are not downloaded again. It also records the time
+    of the last successful sync of each source.
+    """
+    manifest = empty_sync_manifest()
+    if os.path.exists(SYNC_MANIFEST_FILE):
+        try:
+            with open(SYNC_MANIFEST_FILE, 'r') as f:
+                manifest.update(json.load(f))
+            if not isinstance(manifest['last_sync'], dict):
+                # Written before sources existed
+                manifest['last_sync'] = {}
+            logger.info(
+                LOG_MESSAGES["manifest_loaded"].format(count=len(manifest['files']))
+            )
+        except Exception as e:
+            logger.error(LOG_MESSAGES["manifest_load_error"].format(error=str(e)))
+            manifest = empty_sync_manifest()
+    return manifest
+
+def save_sync_manifest(manifest):
+    """Atomically write the sync manifest next to the figures"""
+    temp_path = SYNC_MANIFEST_FILE + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, SYNC_MANIFEST_FILE)
+    logger.info(LOG_MESSAGES["manifest_saved"].format(count=len(manifest['files'])))
+
+def remote_shell_command(command, host=REMOTE_HOST):
+    """Build the argv running a shell command on host (locally if host is empty)"""
+    if host:
+        return ["ssh", host, command]
+    return ["sh", "-c", command]
+
+def remote_location(remote_path, host=REMOTE_HOST):
+    """Build an rsync source spec (a plain local path if host is empty)"""
+    return f"{host}:{remote_path}" if host else remote_path
+
+def list_remote_figures(host=REMOTE_HOST, remote_path=REMOTE_FIG_PATH, log=logger):
+    """
+    List the files available on the cluster in a single SSH round-trip.
+    
+    Returns:
+    --------
+    dict or None
+        Mapping of relative path to (size, mtime), or None if listing failed
+    """
+    list_command = remote_shell_command(
+        f"find {shlex.quote(remote_path)} -type f -printf '%P\\t%s\\t%T@\\n'",
+        host
+    )
+    result = subprocess.run(list_command, capture_output=True, text=True)
+    if result.returncode != 0:
+        log.error(LOG_MESSAGES["remote_listing_error"].format(error=result.stderr))
+        return None
+    
+    remote_files = {}
+    for line in result.stdout.splitlines():
+        try:
+            rel_path, size, mtime = line.split('\t')
+            remote_files[rel_path] = (int(size), int(float(mtime)))
+        except ValueError:
+            continue
+    return remote_files
+
+def source_wins(candidate, incumbent, sources):
+    """
+    Decide whether a file from one source replaces the same path from another.
+    
+    Conflicting filenames are resolved by keeping the most recently modified
+    file; on equal mtimes the source listed first in SYNC_SOURCES wins.
+    
+    Parameters:
+    -----------
+    candidate, incumbent : tuple
+        (source_name, mtime) of the two competing files
+    sources : list
+        The sync sources, in priority order
+    """
+    if candidate[0] == incumbent[0]:
+        return True
+    if candidate[1] != incumbent[1]:
+        return candidate[1] > incumbent[1]
+    priority = [source['name'] for source in sources]
+    return priority.index(candidate[0]) < priority.index(incumbent[0])
+
+def resolve_source_conflicts(listings, sources):
+    """
+    Merge per-source listings into one, applying source_wins() to duplicates
+    
+    Returns:
+    --------
+    dict
+        Mapping of relative path to (source_name, size, mtime)
+    """
+    merged = {}
+    for source in sources:
+        for rel_path, (size, mtime) in listings.get(source['name'], {}).items():
+            current = merged.get(rel_path)
+            if current is None or source_wins(
+                (source['name'], mtime), (current[0], current[2]), sources
+            ):
+                merged[rel_path] = (source['name'], size, mtime)
+    return merged
+
+def plan_incremental_sync(remote_files, manifest):
+    """Return the remote files that are new or changed since the last sync"""
+    known_files = manifest['files']
+    to_fetch = []
+    for rel_path, (source_name, size, mtime) in remote_files.items():
+        entry = known_files.get(rel_path)
+        if (entry is None or entry.get('source') != source_name
+                or entry['size'] != size or entry['mtime'] != mtime):
+            to_fetch.append(rel_path)
+    return sorted(to_fetch)
+
+def parse_rsync_stats(output):
+    """Extract the transferred file count and byte total from rsync --stats output"""
+    stats = {}
+    patterns = {
+        'files': r'Number of (?:regular )?files transferred: ([\d,.]+)',
+        'bytes': r'Total transferred file size: ([\d,.]+)'
+    }
+    for key, pattern in patterns.items():
+        match = re.search(pattern, output)
+        if match:
+            stats[key] = int(re.sub(r'[,.]', '', match.group(1)))
+    return stats
+
+def run_rsync(rsync_command, input_text=None, on_file=None):
+    """
+    Run rsync and return (returncode, stdout, stderr, streamed_count).
+    
+    When on_file is given, rsync prints a line per file once it is in place
+    (--out-format=%b %n: with a transfer statistic in the format, the line
+    comes after the transfer rather than before it) and on_file(rel_path)
+    is called for every PNG while the rest is still transferring. Only the non-file lines (e.g. --stats)
+    are kept from stdout, so memory does not grow with the number of files.
+    """
+    if on_file is None:
+        result = subprocess.run(
+            rsync_command, input=input_text, capture_output=True, text=True
+        )
+        return result.returncode, result.stdout, result.stderr, 0
+    
+    streamed_count = 0
+    summary_lines = []
+    with tempfile.TemporaryFile(mode='w+') as stderr_file:
+        process = subprocess.Popen(
+            rsync_command[:1] + ["--out-format=%b %n"] + rsync_command[1:],
+            stdin=subprocess.PIPE if input_text is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=stderr_file, text=True, bufsize=1
+        )
+        
+        # Feed --files-from lists from a thread so a long list can't block
+        # rsync while we are reading its output
+        if input_text is not None:
+            def write_input():
+                with process.stdin:
+                    process.stdin.write(input_text)
+            threading.Thread(target=write_input, daemon=True).start()
+        
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            match = RSYNC_FILE_LINE_PATTERN.match(line)
+            if match:
+                streamed_count += 1
+                on_file(match.group(1))
+            elif ':' in line:
+                summary_lines.append(line)
+        
+        returncode = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+    return returncode, '\n'.join(summary_lines), stderr, streamed_count
+
+def run_per_source(task, sources):
+    """
+    Run task(source) for every source on a bounded thread pool
+    
+    Returns:
+    --------
+    dict
+        Mapping of source name to the task's result
+    """
+    workers = max(1, min(SYNC_MAX_WORKERS, len(sources)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {source['name']: executor.submit(task, source) for source in sources}
+        return {name: future.result() for name, future in futures.items()}
+
+def serialized(callback):
+    """Wrap a callback so concurrent source fetches invoke it one at a time"""
+    if callback is None:
+        return None
+    lock = threading.Lock()
+    def call(*args):
+        with lock:
+            return callback(*args)
+    return call
+
+def list_all_remote_figures(sources=None):
+    """
+    List every source concurrently and merge the listings with source_wins()
+    
+    Returns:
+    --------
+    dict or None
+        {rel_path: (source_name, size, mtime)}, or None if a listing failed
+    """
+    sources = SYNC_SOURCES if sources is None else sources
+    listings = run_per_source(
+        lambda source: list_remote_figures(
+            source['host'], source['path'], get_source_logger(source)
+        ),
+        sources
+    )
+    if any(listing is None for listing in listings.values()):
+        return None
+    return resolve_source_conflicts(listings, sources)
+
+def sync_figures_incremental(on_file=None, sources=None):
+    """
+    Sync only new or changed figures from the cluster.
+    
+    Unlike the default mode, the local figures directory is never wiped:
+    every source is listed once (concurrently), the listings are merged
+    with source_wins() and compared against the local sync manifest, and
+    each source's rsync is only asked for the files that differ. Sources
+    are fetched in parallel, so the sync takes as long as the slowest one.
+    
+    Parameters:
+    -----------
+    on_file : callable, optional
+        Called with each transferred file's relative path as soon as it
+        lands (see run_rsync)
+    sources : list, optional
+        Sources to sync from, defaults to SYNC_SOURCES
+    """
+    try:
+        sources = SYNC_SOURCES if sources is None else sources
+        os.makedirs(LOCAL_FIG_PATH, exist_ok=True)
+        logger.info(LOG_MESSAGES["incremental_start"])
+        
+        manifest = load_sync_manifest()
+        remote_files = list_all_remote_figures(sources)
+        if remote_files is None:
+            return False
+        to_fetch = plan_incremental_sync(remote_files, manifest)
+        logger.info(
+            LOG_MESSAGES["incremental_planned"].format(
+                count=len(to_fetch), total=len(remote_files)
+            )
+        )
+        
+        # Forget files that disappeared from the remote so they are
+        # fetched again if they ever come back
+        for rel_path in list(manifest['files']):
+            if rel_path not in remote_files:
+                del manifest['files'][rel_path]
+        
+        def record_file(rel_path):
+            local_path = os.path.join(LOCAL_FIG_PATH, rel_path)
+            if rel_path in remote_files and os.path.exists(local_path):
+                source_name, size, mtime = remote_files[rel_path]
+                manifest['files'][rel_path] = {
+                    'source': source_name,
+                    'size': size,
+                    'mtime': mtime,
+                    'sha256': compute_file_hash(local_path)
+                }
+        
+        # Streamed files may be moved away by on_file, so hash them first
+        def record_and_forward(rel_path):
+            record_file(rel_path)
+            on_file(rel_path)
+        forward = serialized(record_and_forward if on_file else None)
+        
+        def fetch_source(source):
+            log = get_source_logger(source)
+            source_files = [p for p in to_fetch if remote_files[p][0] == source['name']]
+            if not source_files:
+                log.info(LOG_MESSAGES["incremental_up_to_date"])
+                return {'files': 0, 'bytes': 0}
+            
+            # -t keeps remote mtimes so the manifest comparison stays stable
+            rsync_command = [
+                "rsync", "-t", "--stats", "--files-from=-",
+                remote_location(source['path'], source['host']), LOCAL_FIG_PATH
+            ]
+            returncode, stdout, stderr, _ = run_rsync(
+                rsync_command, input_text='\n'.join(source_files) + '\n',
+                on_file=forward
+            )
+            if returncode != 0:
+                log.error(LOG_MESSAGES["sync_error"].format(error=stderr))
+                return None
+            
+            stats = parse_rsync_stats(stdout)
+            stats.setdefault('files', len(source_files))
+            stats.setdefault('bytes', sum(remote_files[p][1] for p in source_files))
+            log.info(LOG_MESSAGES["incremental_transferred"].format(**stats))
+            return stats
+        
+        results = run_per_source(fetch_source, sources)
+        
+        # Files of a failed source keep their old entry (if any) so they
+        # are fetched again next time; a stale local copy must not be
+        # recorded with the new remote size and mtime
+        for rel_path in to_fetch:
+            if results[remote_files[rel_path][0]] is None:
+                continue
+            entry = manifest['files'].get(rel_path)
+            if entry is None or (
+                entry['source'], entry['size'], entry['mtime']
+            ) != remote_files[rel_path]:
+                record_file(rel_path)
+        now = time.time()
+        for source in sources:
+            if results[source['name']] is not None:
+                manifest['last_sync'][source['name']] = now
+        save_sync_manifest(manifest)
+        
+        if any(stats is None for stats in results.values()):
+            return False
+        
+        logger.info(LOG_MESSAGES["sync_complete"])
+        logger.info(
+            LOG_MESSAGES["incremental_transferred"].format(
+                files=sum(stats['files'] for stats in results.values()),
+                bytes=sum(stats['bytes'] for stats in results.values())
+            )
+        )
+        return True
+    except Exception as e:
+        logger.error(LOG_MESSAGES["sync_exception"].format(error=str(e)))
+        return False
+
+def fetch_source_archive(source, rel_paths, compression, on_extracted, log=logger):
+    """
+    Stream some of a source's files as a single compressed tar over SSH.
+    
+    The list of files is sent to the remote tar on stdin (tar -T -), the
+    archive is unpacked into the source's staging directory and
+    on_extracted(rel_path) is called for each file once it is complete.
+    
+    Parameters:
+    -----------
+    rel_paths : list
+        Paths of the files to send, relative to the source's path
+    
+    Returns:
+    --------
+    int or None
+        Compressed bytes received, or None on failure
+    """
+    compress_command, decompress_program = ARCHIVE_COMPRESSORS[compression]
+    staging_dir = os.path.join(SYNC_STAGING_PATH, source['name'])
+    os.makedirs(staging_dir, exist_ok=True)
+    
+    remote_script = (
+        f"cd {shlex.quote(source['path'])} && "
+        f"tar --null -T - -cf - | {compress_command}"
+    )
+    sender_errors = tempfile.TemporaryFile(mode='w+')
+    extractor_errors = tempfile.TemporaryFile(mode='w+')
+    sender = subprocess.Popen(
+        remote_shell_command(remote_script, source['host']),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=sender_errors
+    )
+    extractor = subprocess.Popen(
+        ["tar", "-x", "-v", "-f", "-", "-C", staging_dir,
+         f"--use-compress-program={decompress_program}"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=extractor_errors,
+        text=True
+    )
+    
+    # Feed the file list from a thread so a long list can't block the
+    # sender while the archive is being read
+    def write_file_list():
+        with sender.stdin:
+            sender.stdin.write(b''.join(os.fsencode(p) + b'\0' for p in rel_paths))
+    threading.Thread(target=write_file_list, daemon=True).start()
+    
+    # Pump the stream ourselves to count the bytes on the wire
+    compressed_bytes = 0
+    def pump():
+        nonlocal compressed_bytes
+        with extractor.stdin:
+            for chunk in iter(lambda: sender.stdout.read(1 << 20), b''):
+                compressed_bytes += len(chunk)
+                extractor.stdin.buffer.write(chunk)
+    pump_thread = threading.Thread(target=pump, daemon=True)
+    pump_thread.start()
+    
+    # tar names a member before extracting it, so a file is only
+    # complete once the next name (or the end of the stream) shows up
+    pending = None
+    for line in extractor.stdout:
+        rel_path = os.path.normpath(line.rstrip('\n'))
+        if pending is not None:
+            on_extracted(pending)
+        pending = rel_path
+    pump_thread.join()
+    failed = sender.wait() != 0 or extractor.wait() != 0
+    with sender_errors, extractor_errors:
+        sender_errors.seek(0)
+        extractor_errors.seek(0)
+        error = sender_errors.read() or extractor_errors.read()
+    if failed:
+        log.error(LOG_MESSAGES["sync_error"].format(error=error))
+        return None
+    if pending is not None:
+        on_extracted(pending)
+    log.info(LOG_MESSAGES["archive_compressed"].format(bytes=compressed_bytes))
+    return compressed_bytes
+
+def sync_figures_archive(on_file=None, sources=None,
+                         compression=ARCHIVE_COMPRESSION):
+    """
+    Sync figures as one compressed tar stream per source over SSH.
+    
+    Avoids rsync's per-file round-trips, which dominate when the remote
+    directory holds many small figures. The files to send are planned the
+    same way as for the incremental rsync sync: every source is listed,
+    the listings are merged with source_wins() and compared against the
+    sync manifest, and each source's tar is handed the exact list of new or
+    changed files it wins. Sources are fetched concurrently into their own
+    staging directories, and each file is moved into LOCAL_FIG_PATH as soon
+    as it is complete.
+    
+    Parameters:
+    -----------
+    on_file : callable, optional
+        Called with each extracted file's relative path once it is in place
+    sources : list, optional
+        Sources to sync from, defaults to SYNC_SOURCES. A source with an
+        empty host is read from the local filesystem.
+    compression : str
+        Key of ARCHIVE_COMPRESSORS; falls back to gzip if zstd is missing
+    """
+    try:
+        sources = SYNC_SOURCES if sources is None else sources
+        os.makedirs(LOCAL_FIG_PATH, exist_ok=True)
+        if compression == 'zstd' and not shutil.which('zstd'):
+            compression = 'gzip'
+        logger.info(LOG_MESSAGES["archive_start"].format(compression=compression))
+        
+        manifest = load_sync_manifest()
+        remote_files = list_all_remote_figures(sources)
+        if remote_files is None:
+            return False
+        to_fetch = plan_incremental_sync(remote_files, manifest)
+        logger.info(
+            LOG_MESSAGES["incremental_planned"].format(
+                count=len(to_fetch), total=len(remote_files)
+            )
+        )
+        for rel_path in list(manifest['files']):
+            if rel_path not in remote_files:
+                del manifest['files'][rel_path]
+        
+        transferred = []
+        merge_lock = threading.Lock()
+        
+        def fetch_source(source):
+            log = get_source_logger(source)
+            staging_dir = os.path.join(SYNC_STAGING_PATH, source['name'])
+            source_files = [p for p in to_fetch if remote_files[p][0] == source['name']]
+            if not source_files:
+                log.info(LOG_MESSAGES["incremental_up_to_date"])
+                return 0
+            
+            def merge_file(rel_path):
+                staged_path = os.path.join(staging_dir, rel_path)
+                if rel_path not in remote_files or not os.path.isfile(staged_path):
+                    return
+                local_path = os.path.join(LOCAL_FIG_PATH, rel_path)
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                shutil.move(staged_path, local_path)
+                source_name, size, mtime = remote_files[rel_path]
+                with merge_lock:
+                    manifest['files'][rel_path] = {
+                        'source': source_name,
+                        'size': size,
+                        'mtime': mtime,
+                        'sha256': compute_file_hash(local_path)
+                    }
+                    transferred.append(size)
+                    if on_file is not None and rel_path.endswith('.png'):
+                        on_file(rel_path)
+            
+            sync_started = time.time()
+            compressed_bytes = fetch_source_archive(
+                source, source_files, compression, merge_file, log
+            )
+            if compressed_bytes is None:
+                return None
+            with merge_lock:
+                manifest['last_sync'][source['name']] = sync_started
+            return compressed_bytes
+        
+        results = run_per_source(fetch_source, sources)
+        save_sync_manifest(manifest)
+        
+        if any(compressed is None for compressed in results.values()):
+            return False
+        
+        logger.info(LOG_MESSAGES["sync_complete"])
+        logger.info(
+            LOG_MESSAGES["incremental_transferred"].format(
+                files=len(transferred), bytes=sum(transferred)
+            )
+        )
+        logger.info(
+            LOG_MESSAGES["archive_compressed"].format(bytes=sum(results.values()))
+        )
+        return True
+    except Exception as e:
+        logger.error(LOG_MESSAGES["sync_exception"].format(error=str(e)))
+        return False
+
+def sync_figures_from_cluster(incremental=False, on_file=None, transport='rsync',
+                              sources=None):
+    """
+    Sync figures from the cluster to local machine
+    
+    Parameters:
+    -----------
+    incremental : bool
+        If True, keep the local figures and only transfer new or changed
+        files (see sync_figures_incremental). Otherwise wipe the local
+        directory and copy everything again.
+    on_file : callable, optional
+        Called with each transferred file's relative path as soon as it
+        lands, e.g. the first callable returned by organize_figures_streaming()
+    transport : str
+        'rsync', or 'archive' to stream a single compressed tar over SSH
+        (see sync_figures_archive)
+    sources : list, optional
+        Sources to sync from, defaults to SYNC_SOURCES. Several sources are
+        fetched concurrently and merged into one tree.
+    """
+    sources = SYNC_SOURCES if sources is None else sources
+    if not incremental and (transport == 'archive' or len(sources) > 1):
+        if not clean_local_figures():
+            logger.warning(
+                "Failed to clean local directory, but continuing with sync..."
+            )
+    
+    if transport == 'archive':
+        return sync_figures_archive(on_file=on_file, sources=sources)
+    
+    # Several sources always go through the listing step, which is where
+    # filename conflicts between them are resolved
+    if incremental or len(sources) > 1:
+        return sync_figures_incremental(on_file=on_file, sources=sources)
+    
     try:
         # First clean up the local directory
         if not clean_local_figures():
@@ -126,26 +767,34 @@ def sync_figures_from_cluster():
         
         os.makedirs(LOCAL_FIG_PATH, exist_ok=True)
         
+        # Per-file progress is only useful when the output is read at the end
+        verbose_flags = ["-vr", "--progress"] if on_file is None else ["-r"]
         rsync_command = [
-            "rsync", "-vr", "--progress",
-            f"cbel@frontex:{REMOTE_FIG_PATH}", LOCAL_FIG_PATH
+            "rsync", *verbose_flags,
+            remote_location(sources[0]['path'], sources[0]['host']), LOCAL_FIG_PATH
         ]
         
         # Remove the --ignore-existing flag to allow overwriting existing files
         # since we've already cleaned the directory
         
         logger.info(LOG_MESSAGES["sync_start"])
-        result = subprocess.run(rsync_command, capture_output=True, text=True)
+        returncode, stdout, stderr, streamed_count = run_rsync(
+            rsync_command, on_file=on_file
+        )
         
-        if result.returncode == 0:
+        if returncode == 0:
             logger.info(LOG_MESSAGES["sync_complete"])
             # Log number of new files
-            new_files = [line for line in result.stdout.split('\n') 
+            new_files = [line for line in stdout.split('\n') 
                         if line.endswith('.png')]
-            logger.info(LOG_MESSAGES["synced_files"].format(count=len(new_files)))
+            logger.info(
+                LOG_MESSAGES["synced_files"].format(
+                    count=len(new_files) + streamed_count
+                )
+            )
             return True
         else:
-            logger.error(LOG_MESSAGES["sync_error"].format(error=result.stderr))
+            logger.error(LOG_MESSAGES["sync_error"].format(error=stderr))
             return False
     except Exception as e:
         logger.error(LOG_MESSAGES["sync_exception"].format(error=str(e)))
@@ -157,147 +806,219 @@ def extract_metadata(filename):
         'filename': filename,
         'added_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    
-    for key, pattern in METADATA_PATTERNS.items():
-        match = re.search(pattern, filename)
-        if match:
-            metadata[key] = match.group(1)
+    metadata.update(figure_name_metadata(parse_figure_name(filename)))
     
     return metadata
 
 def update_metadata_db(new_file_metadata):
-    """Update the metadata JSON database with new file information"""
+    """Upsert new file information into the metadata store"""
     try:
-        if os.path.exists(METADATA_FILE):
-            with open(METADATA_FILE, 'r') as f:
-                metadata_db = json.load(f)
-        else:
-            metadata_db = {}
+        conn = open_metadata_store()
+        try:
+            upsert_metadata(conn, new_file_metadata)
+        finally:
+            conn.close()
         
-        # Update with new files
-        for metadata in new_file_metadata:
-            filename = metadata['filename']
-            metadata_db[filename] = metadata
-            
-        # Save updated metadata
-        with open(METADATA_FILE, 'w') as f:
-            json.dump(metadata_db, f, indent=2)
-            
         logger.info(
             LOG_MESSAGES["metadata_update"].format(count=len(new_file_metadata))
         )
-        return metadata_db
+        return True
     except Exception as e:
         logger.error(LOG_MESSAGES["metadata_error"].format(error=str(e)))
-        return {}
+        return False
 
-def is_recent_file(file_path, days=7, metadata_db=None):
+def scan_figure_files(directory=None):
     """
-    Check if a file is recent based on metadata timestamp or creation date,
-    not file system modification time which gets updated when files are synced
+    List the top-level PNG figures of a directory with their modification
+    times, in a single os.scandir pass
+    
+    Returns:
+    --------
+    tuple
+        (file_paths, mtimes), mtimes being a float array of epochs
+    """
+    directory = directory or LOCAL_FIG_PATH
+    file_paths = []
+    mtimes = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            # Same files as glob('*.png'), which skips hidden ones
+            if (entry.name.endswith('.png') and not entry.name.startswith('.')
+                    and entry.is_file()):
+                file_paths.append(entry.path)
+                mtimes.append(entry.stat().st_mtime)
+    return file_paths, np.array(mtimes, dtype=float)
+
+def recent_file_mask(file_paths, days=7, date_epochs=None, mtimes=None):
+    """
+    Check which files are recent based on their metadata date (filename
+    timestamp, else the date they were added), not file system modification
+    time which gets updated when files are synced
     
     Parameters:
     -----------
-    file_path : str
-        Path to the file
+    file_paths : list
+        Paths to the files
     days : int
         Number of days to consider a file as recent
-    metadata_db : dict
-        Metadata database containing file information
-        
+    date_epochs : dict
+        Filename to metadata date epoch, as returned by load_date_epochs()
+    mtimes : array-like
+        Modification times of the files, used for files without a metadata
+        date; looked up when not given
+    
     Returns:
     --------
-    bool
-        True if the file is recent, False otherwise
+    numpy.ndarray
+        Boolean mask over file_paths, True for recent files
     """
-    try:
-        # Get filename from path
-        filename = os.path.basename(file_path)
-        
-        # If we have metadata for this file, use it
-        if metadata_db and filename in metadata_db:
-            meta = metadata_db[filename]
-            
-            # First try to use the timestamp field if available
-            if 'timestamp' in meta:
-                # Parse timestamp in format YYYYMMDDTHHMMSS
-                try:
-                    timestamp_str = meta['timestamp']
-                    timestamp_date = datetime.strptime(timestamp_str, '%Y%m%dT%H%M%S')
-                    cutoff_date = datetime.now() - timedelta(days=days)
-                    return timestamp_date >= cutoff_date
-                except (ValueError, TypeError):
-                    # If timestamp parsing fails, continue to other methods
-                    pass
-            
-            # Then try the added_date field
-            if 'added_date' in meta:
+    # Calculate the cutoff date once for the whole batch
+    cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+    date_epochs = date_epochs or {}
+    epochs = np.array(
+        [date_epochs.get(os.path.basename(path), np.nan) for path in file_paths],
+        dtype=float
+    )
+    
+    # As a fallback, use the files' modification time
+    missing = np.isnan(epochs)
+    if missing.any():
+        if mtimes is not None:
+            epochs[missing] = np.asarray(mtimes, dtype=float)[missing]
+        else:
+            fallback = []
+            for file_path in compress(file_paths, missing):
                 try:
-                    added_date = datetime.strptime(meta['added_date'], '%Y-%m-%d %H:%M:%S')
-                    cutoff_date = datetime.now() - timedelta(days=days)
-                    return added_date >= cutoff_date
-                except (ValueError, TypeError):
-                    # If parsing fails, continue to file system date
-                    pass
-        
-        # As a fallback, use file's modification time
-        file_mtime = os.path.getmtime(file_path)
-        file_date = datetime.fromtimestamp(file_mtime)
-        
-        # Calculate the cutoff date
-        cutoff_date = datetime.now() - timedelta(days=days)
-        
-        # Return True if file is newer than cutoff date
-        return file_date >= cutoff_date
+                    fallback.append(os.path.getmtime(file_path))
+                except OSError as e:
+                    logger.error(LOG_MESSAGES["file_date_error"].format(error=str(e)))
+                    fallback.append(np.nan)
+            epochs[missing] = fallback
+    
+    # Files without any known date are included by default
+    return np.isnan(epochs) | (epochs >= cutoff)
+
+def load_date_epochs(file_paths):
+    """Look up the stored metadata dates of the given files, for recency checks"""
+    date_epochs = {}
+    try:
+        conn = open_metadata_store()
+        try:
+            date_epochs = get_date_epochs(
+                conn, (os.path.basename(path) for path in file_paths)
+            )
+        finally:
+            conn.close()
+        logger.info(
+            LOG_MESSAGES["metadata_loaded"].format(count=len(date_epochs))
+        )
     except Exception as e:
-        logger.error(LOG_MESSAGES["file_date_error"].format(error=str(e)))
-        # If there's an error, return True to include the file by default
-        return True
+        logger.error(LOG_MESSAGES["metadata_load_error"].format(error=str(e)))
+    return date_epochs
+
+def plan_figure_destination(filename, metadata, matcher):
+    """
+    Return the directory a figure is organized into: its category (and
+    subcategory) directory, or misc if no category keyword matches
+    """
+    category_name = match_category(matcher, filename)
+    if category_name is None:
+        return os.path.join(LOCAL_FIG_PATH, "misc")
+    
+    category_path = os.path.join(LOCAL_FIG_PATH, category_name)
+    for subcat in FIGURE_SUBCATEGORIES:
+        if subcat in metadata:
+            return os.path.join(category_path, f"{subcat}_{metadata[subcat]}")
+    return category_path
+
+def organize_figure_file(file, matcher, created_dirs=None, unsupported=None):
+    """
+    Place a single figure into its category (and subcategory) directory,
+    see organize_engine.place_file()
+    
+    Parameters:
+    -----------
+    file : str
+        Path of the figure in LOCAL_FIG_PATH
+    matcher : tuple
+        Category matcher from build_category_matcher()
+    created_dirs : set, optional
+        Directories already created; the destination is added to it
+    unsupported : set, optional
+        Placement methods known not to work, shared between calls
+    
+    Returns:
+    --------
+    tuple
+        (metadata, move, method): the metadata extracted from the filename,
+        the PlannedMove carried out and the placement method used
+    """
+    filename = os.path.basename(file)
+    metadata = extract_metadata(filename)
+    dest_dir = plan_figure_destination(filename, metadata, matcher)
+    if created_dirs is None or dest_dir not in created_dirs:
+        os.makedirs(dest_dir, exist_ok=True)
+        if created_dirs is not None:
+            created_dirs.add(dest_dir)
+    
+    move = build_organize_plan([file], [dest_dir])[0]
+    return metadata, move, place_file(move, unsupported)
+
+def aged_out_figures(matcher, days_threshold=7, keep=()):
+    """
+    Find the organized figures that fell out of the recency window, so the
+    organized tree (and the reports made from it) only holds recent figures
+    even though incremental syncs never clean it
+    
+    Parameters:
+    -----------
+    matcher : tuple
+        Category matcher from build_category_matcher(); only its category
+        directories and misc are looked in
+    days_threshold : int
+        Number of days to consider a file as recent
+    keep : iterable
+        Organized paths placed by this run, which stay
+    
+    Returns:
+    --------
+    list
+        PlannedMoves from each figure's path in LOCAL_FIG_PATH to its
+        organized path, see organize_engine.expire_file()
+    """
+    keep = set(keep)
+    organized = []
+    for category_name in [*matcher[2], "misc"]:
+        category_path = os.path.join(LOCAL_FIG_PATH, category_name)
+        if os.path.isdir(category_path):
+            organized.extend(
+                fig_path for fig_path in iter_category_figures(category_path)
+                if fig_path not in keep
+            )
+    aged_mask = ~recent_file_mask(organized, days_threshold, load_date_epochs(organized))
+    return [
+        PlannedMove(os.path.join(LOCAL_FIG_PATH, os.path.basename(fig_path)), fig_path)
+        for fig_path in compress(organized, aged_mask)
+    ]
 
 def organize_figures(days_threshold=7):
     """Organize figures into categories based on filename patterns and metadata"""
     try:
-        # Primary categories based on analysis type
-        categories = {
-            'language_processing': ['mindsentences', 'language', 'semantic', 'syntactic'],
-            'eeg_analysis': ['eeg', 'erp'],
-            'meg_analysis': ['meg', 'event'],
-            'source_localization': ['source', 'mne', 'dics', 'lcmv'],
-            'topographic_maps': ['topo', 'map'],
-            'connectivity': ['connect', 'network'],
-            'time_frequency': ['tf', 'frequency', 'power', 'tfr']
-        }
-        
-        # Secondary categories for sub-organization
-        subcategories = {
-            'subject': r'sub-(\w+)',
-            'task': r'task-(\w+)',
-            'condition': r'cond-(\w+)'
-        }
-        
-        # Create category directories
-        for category in categories.values():
-            os.makedirs(os.path.join(LOCAL_FIG_PATH, category[0]), exist_ok=True)
+        # Compile the category table once for the whole run
+        matcher = build_category_matcher(load_category_table())
         
         # Find all PNG files
-        all_png_files = glob.glob(os.path.join(LOCAL_FIG_PATH, "*.png"))
+        all_png_files, mtimes = scan_figure_files()
         logger.info(LOG_MESSAGES["files_found"].format(count=len(all_png_files)))
         
-        # Load metadata database to check file dates
-        metadata_db = {}
-        if os.path.exists(METADATA_FILE):
-            try:
-                with open(METADATA_FILE, 'r') as f:
-                    metadata_db = json.load(f)
-                logger.info(
-                    LOG_MESSAGES["metadata_loaded"].format(count=len(metadata_db))
-                )
-            except Exception as e:
-                logger.error(LOG_MESSAGES["metadata_load_error"].format(error=str(e)))
+        # Load the stored dates of these files
+        date_epochs = load_date_epochs(all_png_files)
         
         # Filter to only include recent files
-        recent_png_files = [f for f in all_png_files 
-                           if is_recent_file(f, days_threshold, metadata_db)]
+        recent_mask = recent_file_mask(
+            all_png_files, days_threshold, date_epochs, mtimes
+        )
+        recent_png_files = list(compress(all_png_files, recent_mask))
         logger.info(
             LOG_MESSAGES["files_filtered"].format(
                 count=len(recent_png_files), 
@@ -310,58 +1031,26 @@ def organize_figures(days_threshold=7):
             logger.warning(LOG_MESSAGES["no_recent_warning"])
             recent_png_files = all_png_files
         
-        # Track metadata for all files
-        all_metadata = []
-        
-        # Categorize files
-        for file in recent_png_files:
-            filename = os.path.basename(file)
-            metadata = extract_metadata(filename)
-            all_metadata.append(metadata)
-            
-            # Determine primary category
-            assigned = False
-            for category_name, keywords in categories.items():
-                for keyword in keywords:
-                    if keyword in filename.lower():
-                        # Create category dir if it doesn't exist
-                        category_path = os.path.join(LOCAL_FIG_PATH, category_name)
-                        os.makedirs(category_path, exist_ok=True)
-                        
-                        # Check for subcategory organization
-                        for subcat, pattern in subcategories.items():
-                            if subcat in metadata:
-                                subcat_value = metadata[subcat]
-                                subcat_path = os.path.join(
-                                    category_path, f"{subcat}_{subcat_value}"
-                                )
-                                os.makedirs(subcat_path, exist_ok=True)
-                                dest_path = os.path.join(subcat_path, filename)
-                                break
-                        else:
-                            # No subcategory found
-                            dest_path = os.path.join(category_path, filename)
-                        
-                        # Move file if destination doesn't exist
-                        if not os.path.exists(dest_path):
-                            shutil.move(file, dest_path)
-                        
-                        assigned = True
-                        break
-                
-                if assigned:
-                    break
-            
-            # If no category matched, put in misc
-            if not assigned:
-                misc_path = os.path.join(LOCAL_FIG_PATH, "misc")
-                os.makedirs(misc_path, exist_ok=True)
-                dest_path = os.path.join(misc_path, filename)
-                if not os.path.exists(dest_path):
-                    shutil.move(file, dest_path)
+        # Plan every destination in memory first, then carry out the plan
+        all_metadata = [
+            extract_metadata(os.path.basename(file)) for file in recent_png_files
+        ]
+        destinations = [
+            plan_figure_destination(metadata['filename'], metadata, matcher)
+            for metadata in all_metadata
+        ]
+        # Figures organized by earlier runs that aged out are taken out
+        plan = build_organize_plan(recent_png_files, destinations)
+        methods, _ = execute_plan(plan, expired=aged_out_figures(
+            matcher, days_threshold, (move.destination for move in plan)
+        ))
         
-        # Update metadata database
-        update_metadata_db(all_metadata)
+        # Update metadata database, leaving figures that were already in
+        # place (and their added_date) untouched
+        update_metadata_db([
+            metadata for metadata, method in zip(all_metadata, methods)
+            if method != 'unchanged'
+        ])
         
         logger.info(LOG_MESSAGES["organization_complete"])
         return True
@@ -369,6 +1058,87 @@ def organize_figures(days_threshold=7):
         logger.error(LOG_MESSAGES["organization_error"].format(error=str(e)))
         return False
 
+def organize_figures_streaming(days_threshold=7, on_placed=None, on_expired=None):
+    """
+    Organize figures while they are still being transferred.
+    
+    Returns a pair of callables: ``on_file(rel_path)`` is meant to be passed
+    to sync_figures_from_cluster() and organizes each PNG as soon as rsync
+    reports it finished; ``finish()`` applies the same fallback as
+    organize_figures() and updates the metadata database once the sync is
+    over. It returns True on success.
+    
+    on_placed, if given, is called with the organized path of every figure
+    that was placed or replaced (not of those already in place), and
+    on_expired with that of every figure finish() takes out of the organized
+    tree because it aged out (see aged_out_figures()).
+    """
+    matcher = build_category_matcher(load_category_table())
+    created_dirs = set()
+    unsupported = set()
+    conn = open_metadata_store()
+    placed = []
+    skipped_files = []
+    
+    def place(file):
+        result = organize_figure_file(file, matcher, created_dirs, unsupported)
+        placed.append(result)
+        _, move, method = result
+        if on_placed is not None and method != 'unchanged':
+            on_placed(move.destination)
+    
+    def on_file(rel_path):
+        file = os.path.join(LOCAL_FIG_PATH, rel_path)
+        # Like organize_figures(), only top-level PNGs are organized
+        if not rel_path.endswith('.png') or os.sep in rel_path:
+            return
+        try:
+            # Per-file primary key lookup, nothing is loaded up front
+            date_epochs = get_date_epochs(conn, [os.path.basename(rel_path)])
+            if recent_file_mask([file], days_threshold, date_epochs)[0]:
+                place(file)
+            else:
+                skipped_files.append(file)
+        except Exception as e:
+            logger.error(LOG_MESSAGES["organization_error"].format(error=str(e)))
+    
+    def finish():
+        conn.close()
+        try:
+            logger.info(
+                LOG_MESSAGES["files_streamed"].format(
+                    count=len(placed), skipped=len(skipped_files)
+                )
+            )
+            if not placed and skipped_files:
+                logger.warning(LOG_MESSAGES["no_recent_warning"])
+                for file in skipped_files:
+                    place(file)
+            all_metadata, moves, methods = zip(*placed) if placed else ((), (), ())
+            expired = aged_out_figures(
+                matcher, days_threshold, (move.destination for move in moves)
+            )
+            expire_methods = [expire_file(move) for move in expired]
+            if on_expired is not None:
+                for move in expired:
+                    on_expired(move.destination)
+            write_plan_log(
+                list(moves) + expired, list(methods) + expire_methods, created_dirs
+            )
+            # Figures that were already in place keep their added_date
+            if not update_metadata_db([
+                metadata for metadata, method in zip(all_metadata, methods)
+                if method != 'unchanged'
+            ]):
+                return False
+            logger.info(LOG_MESSAGES["organization_complete"])
+            return True
+        except Exception as e:
+            logger.error(LOG_MESSAGES["organization_error"].format(error=str(e)))
+            return False
+    
+    return on_file, finish
+
 if __name__ == "__main__":
     if sync_figures_from_cluster():
         organize_figures()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import sys
+import random
+import subprocess
+import logging
+
+import pytest
+
+# The pipeline modules import each other as top-level modules from src/
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+# sync_org logs to pipeline.log (opened on first use) unless the root
+# logger already has a handler
+logging.getLogger().addHandler(logging.NullHandler())
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run each test from its own directory, where the per-source logs go"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def pipeline_paths(tmp_path, monkeypatch):
+    """
+    Point the paths of pipeline_config, and the paths the loaded pipeline
+    modules derive from them, at tmp_path: the local data directory at
+    tmp_path/data, the website repository at tmp_path/site
+    
+    Returns:
+    --------
+    tuple
+        (data_path, site_path), as pathlib paths
+    """
+    import pipeline_config
+    data_path = tmp_path / "data"
+    site_path = tmp_path / "site"
+    # Paths derived from the configured ones, in any module, move along
+    moved = [
+        (pipeline_config.LOCAL_REPORT_PATH.rstrip(os.sep), str(data_path)),
+        (pipeline_config.GITHUB_REPO_PATH.rstrip(os.sep), str(site_path)),
+    ]
+    for module in list(sys.modules.values()):
+        if not getattr(module, '__file__', None) or not module.__file__.startswith(SRC_PATH):
+            continue
+        for name, value in list(vars(module).items()):
+            if not (name.isupper() and isinstance(value, str)):
+                continue
+            for configured, moved_to in moved:
+                if value == configured or value.startswith(configured + os.sep):
+                    monkeypatch.setattr(module, name, moved_to + value[len(configured):])
+    data_path.mkdir(exist_ok=True)
+    site_path.mkdir(exist_ok=True)
+    return data_path, site_path
+
+@pytest.fixture
+def write_png():
+    """
+    Write a PNG figure: write_png(path, size=(width, height), color=None).
+    Without a color the figure is noise seeded by its filename, so that
+    figures with different names are not near-duplicates of each other.
+    Skips the test if Pillow is not installed.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    def write_png(path, size=(300, 200), color=None, mode='RGB'):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if color is None:
+            noise = random.Random(path.name).randbytes(size[0] * size[1] * len(mode))
+            image = Image.frombytes(mode, size, noise)
+        else:
+            image = Image.new(mode, size, color)
+        image.save(path)
+        return path
+    return write_png
+
+def git(repo_path, *args):
+    return subprocess.run(
+        ["git", "-C", str(repo_path), *args], capture_output=True, text=True, check=True
+    ).stdout
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    """
+    A scratch website repository at tmp_path/site with one commit on main,
+    tracking the bare repository tmp_path/remote.git as origin
+    
+    Returns:
+    --------
+    callable
+        git(*args), running git in the repository and returning its output
+    """
+    for variable in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{variable}_NAME", "Pipeline Test")
+        monkeypatch.setenv(f"{variable}_EMAIL", "pipeline@example.com")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", os.devnull)
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    remote_path = tmp_path / "remote.git"
+    repo_path = tmp_path / "site"
+    subprocess.run(["git", "init", "-q", "--bare", "-b", "main", str(remote_path)], check=True)
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo_path)], check=True)
+    (repo_path / "index.html").write_text("<html></html>\n")
+    git(repo_path, "add", "index.html")
+    git(repo_path, "commit", "-q", "-m", "Initial commit")
+    git(repo_path, "remote", "add", "origin", str(remote_path))
+    git(repo_path, "push", "-q", "-u", "origin", "main")
+    return lambda *args: git(repo_path, *args)
@@ -0,0 +1,120 @@
+import tarfile
+from datetime import datetime
+
+import pytest
+
+import archive
+from publish import commit_paths, PUSH_REMOTE
+
+ASSET = f"{'a' * 64}.png"
+SHARED_ASSET = f"{'b' * 64}.webp"
+LIVE_ASSET = f"{'c' * 64}.png"
+
+def publish_report(site_path, week_dir, date, *asset_names):
+    """Publish a report of the given date using the given assets"""
+    week_path = site_path / "files" / week_dir
+    (week_path / f"mne_report_{date}_figures").mkdir(parents=True, exist_ok=True)
+    (week_path / f"mne_report_{date}_figures" / "figure.png").write_bytes(b'png')
+    (week_path / f"mne_report_{date}.html").write_text("<html>\n" + "".join(
+        f'<img src="../assets/{asset_name}">\n' for asset_name in asset_names
+    ) + "</html>\n")
+    for asset_name in asset_names:
+        (site_path / "files" / "assets").mkdir(exist_ok=True)
+        (site_path / "files" / "assets" / asset_name).write_bytes(asset_name.encode())
+
+@pytest.fixture
+def site(tmp_path, git_repo):
+    """The scratch website, on a GitHub remote, with two old weeks and a recent one"""
+    site_path = tmp_path / "site"
+    git_repo("remote", "set-url", PUSH_REMOTE, "git@github.com:lab/site.git")
+    publish_report(site_path, "week1_2025", "2025-01-02", ASSET, SHARED_ASSET)
+    publish_report(site_path, "week2_2025", "2025-01-09", SHARED_ASSET)
+    publish_report(site_path, "week30_2026", "2026-07-20", LIVE_ASSET)
+    (site_path / "files" / "assets" / f"{'d' * 64}.png").write_bytes(b'orphan')
+    git_repo("add", "files")
+    git_repo("commit", "-q", "-m", "Reports")
+    return site_path
+
+def bundle_members(git_repo, bundle_name, tmp_path):
+    bundle_path = tmp_path / bundle_name
+    bundle_path.write_bytes(
+        archive.subprocess.run(
+            ["git", "-C", str(tmp_path / "site"), "cat-file", "blob",
+             f"{archive.ARCHIVE_BRANCH}:{bundle_name}"],
+            capture_output=True, check=True
+        ).stdout
+    )
+    with tarfile.open(bundle_path, 'r:xz') as bundle:
+        return sorted(member.name for member in bundle if member.isfile())
+
+@pytest.mark.parametrize("remote_url", [
+    "git@github.com:lab/site.git",
+    "https://github.com/lab/site.git",
+    "https://github.com/lab/site",
+    "ssh://git@github.com/lab/site.git",
+])
+def test_archive_url_follows_the_remote(tmp_path, git_repo, remote_url):
+    git_repo("remote", "set-url", PUSH_REMOTE, remote_url)
+    assert archive.archive_url(str(tmp_path / "site")) == (
+        "https://github.com/lab/site/raw/report-archive/"
+    )
+
+def test_archive_url_setting(tmp_path, git_repo, monkeypatch):
+    with pytest.raises(ValueError):
+        archive.archive_url(str(tmp_path / "site"))
+    monkeypatch.setattr(archive, "ARCHIVE_URL", "https://example.org/bundles/")
+    assert archive.archive_url(str(tmp_path / "site")) == "https://example.org/bundles/"
+
+def test_quarters_and_candidates(site):
+    assert archive.quarter_bundle(datetime(2025, 3, 31)) == "2025-Q1.tar.xz"
+    assert archive.quarter_bundle(datetime(2025, 4, 1)) == "2025-Q2.tar.xz"
+    assert archive.archive_candidates(str(site / "files"), datetime(2025, 1, 5)) == {
+        "2025-Q1.tar.xz": [("week1_2025", ["mne_report_2025-01-02.html"])]
+    }
+
+def test_old_reports_are_bundled_with_their_assets(tmp_path, site, git_repo):
+    changed = archive.archive_old_reports(90, today=datetime(2026, 7, 30), repo_path=str(site))
+    assert bundle_members(git_repo, "2025-Q1.tar.xz", tmp_path) == [
+        f"assets/{ASSET}", f"assets/{SHARED_ASSET}",
+        "week1_2025/mne_report_2025-01-02.html",
+        "week1_2025/mne_report_2025-01-02_figures/figure.png",
+        "week2_2025/mne_report_2025-01-09.html",
+        "week2_2025/mne_report_2025-01-09_figures/figure.png",
+    ]
+    
+    stub = (site / "files" / "week1_2025" / "mne_report_2025-01-02.html").read_text()
+    assert archive.is_stub(str(site / "files" / "week1_2025" / "mne_report_2025-01-02.html"))
+    assert 'href="https://github.com/lab/site/raw/report-archive/2025-Q1.tar.xz"' in stub
+    assert sorted(path.name for path in (site / "files" / "week1_2025").iterdir()) == [
+        "mne_report_2025-01-02.html"
+    ]
+    # Only the assets of the report left on the site are kept
+    assert [path.name for path in (site / "files" / "assets").iterdir()] == [LIVE_ASSET]
+    
+    commit_paths(changed, "Archive", str(site))
+    assert git_repo("status", "--porcelain") == ""
+    assert git_repo("ls-files", "files/assets").split() == [f"files/assets/{LIVE_ASSET}"]
+    # Archived reports are not archived again
+    assert archive.archive_old_reports(
+        90, today=datetime(2026, 7, 30), repo_path=str(site)
+    ) == []
+
+def test_later_weeks_join_the_quarter_bundle(tmp_path, site, git_repo):
+    archive.archive_old_reports(90, today=datetime(2025, 4, 5), repo_path=str(site))
+    assert bundle_members(git_repo, "2025-Q1.tar.xz", tmp_path) == [
+        f"assets/{ASSET}", f"assets/{SHARED_ASSET}",
+        "week1_2025/mne_report_2025-01-02.html",
+        "week1_2025/mne_report_2025-01-02_figures/figure.png",
+    ]
+    archive.archive_old_reports(90, today=datetime(2025, 4, 12), repo_path=str(site))
+    assert bundle_members(git_repo, "2025-Q1.tar.xz", tmp_path) == [
+        f"assets/{ASSET}", f"assets/{SHARED_ASSET}",
+        "week1_2025/mne_report_2025-01-02.html",
+        "week1_2025/mne_report_2025-01-02_figures/figure.png",
+        "week2_2025/mne_report_2025-01-09.html",
+        "week2_2025/mne_report_2025-01-09_figures/figure.png",
+    ]
+    # The archive branch is a single commit
+    assert git_repo("rev-list", "--count", archive.ARCHIVE_BRANCH).strip() == "1"
+    index = (site / "files" / "archive" / "index.html").read_text()
+    assert index.count("https://github.com/lab/site/raw/report-archive/2025-Q1.tar.xz") == 2
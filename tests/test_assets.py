@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import assets
+from metadata_store import compute_file_hash
+
+@pytest.fixture
+def asset_store(tmp_path, monkeypatch):
+    store_path = tmp_path / "assets"
+    monkeypatch.setattr(assets, "LOCAL_ASSET_PATH", str(store_path))
+    return store_path
+
+def test_assets_are_stored_once_under_their_hash(tmp_path, asset_store):
+    first = tmp_path / "first.PNG"
+    second = tmp_path / "second.png"
+    first.write_bytes(b'same')
+    second.write_bytes(b'same')
+    name = assets.store_asset(str(first))
+    assert name == f"{compute_file_hash(str(first))}.png"
+    assert assets.store_asset(str(second)) == name
+    assert assets.store_asset(str(second), file_hash="given") == "given.png"
+    assert sorted(os.listdir(asset_store)) == sorted([name, "given.png"])
+    assert assets.asset_url(name) == f"../assets/{name}"
+
+def test_only_referenced_assets_are_published(tmp_path, asset_store):
+    names = []
+    for content in (b'used', b'unused'):
+        figure = tmp_path / "figure.png"
+        figure.write_bytes(content)
+        names.append(assets.store_asset(str(figure)))
+    report = tmp_path / "report.html"
+    report.write_text(f'<img src="../assets/{names[0]}"><a href="../assets/{"0" * 64}.png">')
+    referenced = assets.referenced_assets([str(report), str(tmp_path / "missing.html")])
+    assert referenced == {names[0], f"{'0' * 64}.png"}
+    
+    published = tmp_path / "site" / "files" / "assets"
+    assert assets.publish_assets(referenced, str(published)) == [str(published / names[0])]
+    assert assets.publish_assets(referenced, str(published)) == []
+    assert os.listdir(published) == [names[0]]
+
+def test_assets_referenced_from_a_directory(tmp_path):
+    name = f"{'a' * 64}.webp"
+    sections = tmp_path / "report_sections"
+    sections.mkdir()
+    (sections / "erp.html").write_text(f'<img src="../assets/{name}">')
+    (sections / "notes.txt").write_text(f"../assets/{'b' * 64}.png")
+    assert assets.referenced_assets([str(tmp_path)]) == {name}
+
+def test_unreferenced_assets_are_pruned(tmp_path):
+    published = tmp_path / "assets"
+    published.mkdir()
+    for name in ("kept.png", "dropped.png"):
+        (published / name).write_bytes(b'')
+    assert assets.prune_assets({"kept.png"}, str(published)) == [str(published / "dropped.png")]
+    assert os.listdir(published) == ["kept.png"]
+    assert assets.prune_assets(set(), str(tmp_path / "none")) == []
@@ -0,0 +1,59 @@
+import json
+import random
+
+from categories import (
+    DEFAULT_FIGURE_CATEGORIES, load_category_table, build_category_matcher, match_category
+)
+
+def naive_category(table, filename):
+    """First category in table order with a keyword in filename"""
+    lower = filename.lower()
+    for category, keywords in table.items():
+        if any(keyword and keyword.lower() in lower for keyword in keywords):
+            return category
+    return None
+
+def test_default_table_matches_in_priority_order():
+    matcher = build_category_matcher(DEFAULT_FIGURE_CATEGORIES)
+    assert match_category(matcher, "mindsentences_eeg_topo.png") == 'language_processing'
+    assert match_category(matcher, "probe_ERP_topo.png") == 'eeg_analysis'
+    assert match_category(matcher, "probe_topo.png") == 'topographic_maps'
+    assert match_category(matcher, "probe_tfr.png") == 'time_frequency'
+    assert match_category(matcher, "probe.png") is None
+
+def test_overlapping_keywords_keep_the_best_priority():
+    # 'ab' (priority 1) ends inside 'xab' (priority 2), and 'b' (0) inside both
+    table = {'zero': ['b'], 'one': ['ab'], 'two': ['xabc']}
+    matcher = build_category_matcher(table)
+    assert match_category(matcher, "xabc") == 'zero'
+    table = {'one': ['ab'], 'two': ['xabc'], 'zero': ['']}
+    matcher = build_category_matcher(table)
+    assert match_category(matcher, "xxabc") == 'one'
+    assert match_category(matcher, "xab") == 'one'
+    assert match_category(matcher, "xa") is None
+
+def test_automaton_agrees_with_checking_every_keyword():
+    rng = random.Random(7)
+    alphabet = "abc_"
+    for _ in range(200):
+        table = {
+            f"category{i}": [
+                ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                for _ in range(rng.randint(1, 3))
+            ]
+            for i in range(rng.randint(1, 5))
+        }
+        matcher = build_category_matcher(table)
+        for _ in range(20):
+            filename = ''.join(rng.choice(alphabet + "AB") for _ in range(rng.randint(0, 12)))
+            assert match_category(matcher, filename) == naive_category(table, filename)
+
+def test_category_table_is_loaded_from_the_config(tmp_path):
+    config_path = tmp_path / "categories.json"
+    assert load_category_table(str(config_path)) is DEFAULT_FIGURE_CATEGORIES
+    config_path.write_text(json.dumps({'custom': ['probe']}))
+    assert load_category_table(str(config_path)) == {'custom': ['probe']}
+    config_path.write_text(json.dumps({'custom': 'probe'}))
+    assert load_category_table(str(config_path)) is DEFAULT_FIGURE_CATEGORIES
+    config_path.write_text("{")
+    assert load_category_table(str(config_path)) is DEFAULT_FIGURE_CATEGORIES
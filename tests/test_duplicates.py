@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+import duplicates
+from duplicates import collapse_duplicates, difference_hash, perceptual_hashes, DHASH_BITS
+from metadata_store import open_metadata_store
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def test_banded_search_finds_what_a_pairwise_scan_finds():
+    rng = random.Random(0)
+    for threshold in (0, 1, 4, 12):
+        # Clusters of close hashes, so that many pairs are within threshold
+        centers = [rng.getrandbits(DHASH_BITS) for _ in range(20)]
+        dhashes = {}
+        for index in range(300):
+            value = rng.choice(centers)
+            for bit in rng.sample(range(DHASH_BITS), rng.randint(0, 2 * threshold + 1)):
+                value ^= 1 << bit
+            dhashes[f"{index}.png"] = value
+        fig_paths = list(dhashes)
+        file_hashes = {fig_path: fig_path for fig_path in fig_paths}
+        
+        kept = []
+        for fig_path in fig_paths:
+            if not any(hamming(dhashes[fig_path], dhashes[other]) <= threshold for other in kept):
+                kept.append(fig_path)
+        
+        groups = collapse_duplicates(fig_paths, file_hashes, dhashes, threshold)
+        collapsed = [fig_path for copies in groups.values() for fig_path in copies]
+        assert [fig_path for fig_path in fig_paths if fig_path not in collapsed] == kept
+        for fig_path, copies in groups.items():
+            assert all(hamming(dhashes[fig_path], dhashes[copy]) <= threshold for copy in copies)
+
+def test_identical_contents_collapse_without_perceptual_hashes():
+    file_hashes = {'a.png': 'x', 'b.png': 'y', 'c.png': 'x'}
+    assert collapse_duplicates(list(file_hashes), file_hashes, {}, 4) == {'a.png': ['c.png']}
+
+def test_rescaled_figure_is_a_near_duplicate(tmp_path, write_png):
+    from PIL import Image
+    original = write_png(tmp_path / "plot.png", size=(400, 300))
+    with Image.open(original) as image:
+        image.resize((200, 150), Image.LANCZOS).save(tmp_path / "small.png")
+    other = write_png(tmp_path / "other.png", size=(400, 300))
+    dhash = difference_hash(str(original))
+    assert hamming(dhash, difference_hash(str(tmp_path / "small.png"))) <= 4
+    assert hamming(dhash, difference_hash(str(other))) > 4
+
+def test_perceptual_hashes_are_stored_by_content(tmp_path, write_png, monkeypatch):
+    conn = open_metadata_store(str(tmp_path / "metadata.sqlite"), json_path='')
+    paths = [str(write_png(tmp_path / name)) for name in ("a.png", "b.png")]
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b'not a png')
+    file_hashes = {paths[0]: "h1", paths[1]: "h2", str(tmp_path / "copy.png"): "h1",
+                   str(broken): "h3"}
+    first = perceptual_hashes(conn, file_hashes)
+    assert set(first) == set(file_hashes) - {str(broken)}
+    assert first[str(tmp_path / "copy.png")] == first[paths[0]]
+    
+    monkeypatch.setattr(duplicates, "difference_hash", lambda *args: pytest.fail("hashed again"))
+    del file_hashes[str(broken)]
+    assert perceptual_hashes(conn, file_hashes) == first
+    conn.close()
@@ -0,0 +1,90 @@
+import glob
+import os
+
+import pytest
+
+from figure_catalog import FigureCatalog
+
+@pytest.fixture
+def figures(tmp_path):
+    """An organized figures directory with a few nested categories"""
+    for rel_path in (
+        "loose_20250101T000000.png",
+        "language_processing/mindsentences_erp_sub-01_20250101T000000.png",
+        "language_processing/mindsentences.png",
+        "language_processing/deeper/mindsentences_source_20250101T000000.png",
+        "language_processing/.hidden.png",
+        "language_processing/notes.txt",
+        "topographic_maps/probe_topo_20250101T000000.png",
+    ):
+        path = tmp_path / "figures" / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'png')
+    return tmp_path / "figures"
+
+METADATA = {
+    "mindsentences_erp_sub-01_20250101T000000.png": {'subject': '01', 'task': 'read'},
+    "mindsentences_source_20250101T000000.png": {'task': 'read'},
+    "probe_topo_20250101T000000.png": {'subject': '02'},
+}
+
+def test_scan_lists_category_figures_in_glob_order(figures):
+    catalog = FigureCatalog.scan(str(figures), METADATA)
+    expected = [
+        path
+        for entry in os.scandir(figures) if entry.is_dir()
+        for path in glob.glob(os.path.join(entry.path, '**', '*.png'), recursive=True)
+    ]
+    assert catalog.paths == expected
+    assert len(catalog) == 4
+
+def test_indexes(figures):
+    catalog = FigureCatalog.scan(str(figures), METADATA)
+    names = lambda records: sorted(record.filename for record in records)
+    assert sorted(catalog.by_main_component) == ['mindsentences', 'probe']
+    assert {
+        subcategory: names(records)
+        for subcategory, records in catalog.by_subcategory['mindsentences'].items()
+    } == {
+        'erp': ["mindsentences_erp_sub-01_20250101T000000.png"],
+        'source': ["mindsentences_source_20250101T000000.png"],
+    }
+    assert names(catalog.uncategorized('mindsentences')) == [
+        "mindsentences.png"
+    ]
+    assert catalog.uncategorized('unknown') == []
+    assert names(catalog.by_task['read']) == [
+        "mindsentences_erp_sub-01_20250101T000000.png",
+        "mindsentences_source_20250101T000000.png",
+    ]
+    assert catalog.stats() == {
+        'figures': 4, 'subjects': 2, 'tasks': 1, 'main_components': 2
+    }
+
+def test_metadata_is_read_from_the_store(figures, pipeline_paths):
+    from metadata_store import open_metadata_store, upsert_metadata
+    conn = open_metadata_store()
+    upsert_metadata(conn, [{'filename': "probe_topo_20250101T000000.png", 'subject': '07'}])
+    conn.close()
+    catalog = FigureCatalog.scan(str(figures))
+    assert list(catalog.by_subject) == ['07']
+
+def test_updated_adds_and_refreshes_records(figures):
+    catalog = FigureCatalog.scan(str(figures), METADATA)
+    replaced = str(figures / "topographic_maps" / "probe_topo_20250101T000000.png")
+    added = str(figures / "topographic_maps" / "probe_topo_sub-03_20250102T000000.png")
+    updated = catalog.updated([added, replaced], {
+        "probe_topo_20250101T000000.png": {'subject': '05'},
+        "probe_topo_sub-03_20250102T000000.png": {'subject': '03'},
+    })
+    assert updated.paths == catalog.paths + [added]
+    assert sorted(updated.by_subject) == ['01', '03', '05']
+    # The catalog it was made from is left as it was
+    assert sorted(catalog.by_subject) == ['01', '02']
+
+def test_updated_leaves_out_removed_figures(figures):
+    catalog = FigureCatalog.scan(str(figures), METADATA)
+    removed = str(figures / "topographic_maps" / "probe_topo_20250101T000000.png")
+    updated = catalog.updated([], METADATA, removed=[removed])
+    assert updated.paths == [path for path in catalog.paths if path != removed]
+    assert 'probe' not in updated.by_main_component
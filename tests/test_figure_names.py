@@ -0,0 +1,37 @@
+from figure_names import (
+    FigureName, parse_figure_name, parse_figure_names, figure_name_metadata
+)
+from bench_figure_names import make_names, legacy_parse, as_legacy_results
+
+def test_parse_matches_the_per_stage_parsing():
+    names = make_names(2000, seed=1)
+    assert as_legacy_results(parse_figure_names(names)) == [
+        legacy_parse(name) for name in names
+    ]
+
+def test_parse_figure_name_fields():
+    record = parse_figure_name("Probe_erp_sub-07_P300_meg_20250102T030405.png")
+    assert isinstance(record, FigureName)
+    assert record.main_component == 'probe'
+    assert record.parts == ('Probe', 'erp', 'sub-07', 'P300', 'meg', '20250102T030405')
+    assert record.sub_parts == ('erp', 'sub-07', 'p300', 'meg', '20250102t030405')
+    assert record.component == 'P300'
+    assert record.analysis_type == 'meg'
+    assert record.timestamp == '20250102T030405'
+    # \w+ runs across '_', as the metadata patterns always did
+    assert record.subject == '07_P300_meg_20250102T030405'
+    assert record.task is None
+
+def test_metadata_leaves_out_missing_fields():
+    record = parse_figure_name("expertlm_topo.png")
+    assert figure_name_metadata(record) == {'analysis_type': 'topo'}
+
+def test_sub_parts_skip_short_numeric_and_common_parts():
+    record = parse_figure_name("main_ab_123_fig_run_decoding_score.png")
+    assert record.sub_parts == ('decoding', 'score')
+
+def test_parses_are_cached_and_batches_keep_order():
+    names = ["b_x.png", "a_y.png", "b_x.png"]
+    records = parse_figure_names(names)
+    assert [record.filename for record in records] == names
+    assert records[0] is records[2] is parse_figure_name("b_x.png")
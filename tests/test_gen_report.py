@@ -0,0 +1,234 @@
+import re
+import shutil
+
+import pytest
+
+pytest.importorskip("mne")
+
+import gen_report
+from report_templates import stylesheet_link_html
+
+@pytest.fixture
+def week_figures(pipeline_paths, write_png):
+    """
+    A week of organized figures; returns add(category, filename, **png)
+    writing one more
+    """
+    fig_path = pipeline_paths[0] / "figures"
+    def add(category, filename, **png):
+        return write_png(fig_path / category / filename, **png)
+    add("language_processing", "mindsentences_erp_sub-01_20260101T000000.png", size=(2000, 1000))
+    add("language_processing", "mindsentences_erp_sub-02_20260101T000000.png")
+    add("topographic_maps", "probe_topo_20260101T000000.png")
+    return add
+
+def report_html(**options):
+    """
+    The report made with the given options, without the time mne.Report
+    stamps in its footer
+    """
+    report_path, _, _ = gen_report.generate_mne_report(**options)
+    assert report_path
+    with open(report_path) as f:
+        return re.sub(r'Created on [\d: -]+ via', 'Created on ... via', f.read())
+
+def forget_rendered_figures(data_path):
+    """Drop the fragment and preview caches, so the next report renders everything"""
+    (data_path / "figures" / "metadata.sqlite").unlink()
+    shutil.rmtree(data_path / "previews")
+
+def test_report_embeds_previews_linking_to_originals(week_figures, pipeline_paths):
+    html = report_html()
+    assert len(re.findall(r'src="data:image/webp;base64,', html)) == 3
+    assert 'href="mne_report_' in html
+    figures_dir = next(pipeline_paths[0].glob("mne_report_*_figures"))
+    assert sorted(path.name for path in figures_dir.iterdir()) == [
+        "mindsentences_erp_sub-01_20260101T000000.png",
+        "mindsentences_erp_sub-02_20260101T000000.png",
+        "probe_topo_20260101T000000.png",
+    ]
+
+def test_external_reports_reference_shared_assets(week_figures, pipeline_paths):
+    html = report_html(asset_mode='external')
+    assert not re.search(r'<img class="figure-img[^>]*src="data:', html)
+    asset_path = pipeline_paths[0] / "assets"
+    urls = set(re.findall(r'(?:src|href)="\.\./assets/([0-9a-f]{64}\.\w+)"', html))
+    # A preview and an original per figure, each stored once
+    assert len(urls) == 6
+    assert urls == {path.name for path in asset_path.iterdir()}
+    
+    # Another report of the same figures adds nothing to the store
+    week_figures("topographic_maps", "probe_topo_20260102T000000.png")
+    report_html(asset_mode='external', custom_date=gen_report.datetime(2026, 1, 3))
+    assert len(list(asset_path.iterdir())) == 8
+
+@pytest.mark.parametrize("asset_mode", ["inline", "external"])
+def test_parallel_report_is_byte_identical(week_figures, pipeline_paths, caplog, asset_mode):
+    for index in range(3, 9):
+        week_figures("topographic_maps", f"probe_topo_sub-0{index}_20260101T000000.png")
+    serial = report_html(asset_mode=asset_mode, jobs=1)
+    forget_rendered_figures(pipeline_paths[0])
+    caplog.set_level("INFO", logger="mne_pipeline")
+    parallel = report_html(asset_mode=asset_mode, jobs=3)
+    assert "0 cached, 9 rendered with 3 job(s)" in caplog.text
+    assert parallel == serial
+
+def test_rerun_reuses_cached_fragments(week_figures, pipeline_paths, caplog):
+    caplog.set_level("INFO", logger="mne_pipeline")
+    uncached = report_html()
+    assert "0 cached, 3 rendered" in caplog.text
+    caplog.clear()
+    assert report_html() == uncached
+    assert "3 cached, 0 rendered" in caplog.text
+    
+    # Only the changed figure and the new one are rendered again
+    caplog.clear()
+    week_figures("topographic_maps", "probe_topo_20260101T000000.png", size=(320, 200))
+    week_figures("topographic_maps", "probe_topo_sub-03_20260101T000000.png")
+    report_html()
+    assert "2 cached, 2 rendered" in caplog.text
+    
+    # As is every figure with other rendering settings
+    caplog.clear()
+    report_html(preview_max_width=100)
+    assert "0 cached, 4 rendered" in caplog.text
+
+def test_fragment_key_covers_what_the_html_shows():
+    settings = ['webp', 1200, 80, 'inline']
+    key = gen_report.fragment_key("hash", settings, "Title", "Caption")
+    assert key == gen_report.fragment_key("hash", list(settings), "Title", "Caption")
+    assert len({
+        key,
+        gen_report.fragment_key("other", settings, "Title", "Caption"),
+        gen_report.fragment_key("hash", ['jpeg', 1200, 80, 'inline'], "Title", "Caption"),
+        gen_report.fragment_key("hash", settings, "Other", "Caption"),
+        gen_report.fragment_key("hash", settings, "Title", "Other"),
+    }) == 5
+
+def test_paged_report_loads_sections_on_demand(week_figures, pipeline_paths):
+    html = report_html(layout='paged')
+    assert not re.search(r'<img class="figure-img', html)
+    sections = re.findall(r'data-src="([^"]+)"', html)
+    report_path = next(pipeline_paths[0].glob("mne_report_*.html"))
+    assert sections == [
+        f"{report_path.stem}_sections/mindsentences.html",
+        f"{report_path.stem}_sections/probe.html",
+    ]
+    
+    data_path = pipeline_paths[0]
+    section_html = (data_path / sections[0]).read_text()
+    # Sections are fragments inserted into the report page, so their links
+    # are relative to the report
+    assert len(re.findall(r'<img class="figure-img', section_html)) == 2
+    for href in re.findall(r'<a href="([^"]+)"', section_html):
+        assert (data_path / href).is_file()
+
+def test_duplicates_are_shown_once(week_figures, pipeline_paths):
+    from PIL import Image
+    original = "language_processing/mindsentences_erp_sub-01_20260101T000000.png"
+    figures = pipeline_paths[0] / "figures"
+    # The same pixels, encoded differently
+    with Image.open(figures / original) as image:
+        image.save(
+            figures / "language_processing" / "mindsentences_erp_sub-03_20260101T000000.png",
+            compress_level=1
+        )
+    html = report_html()
+    assert len(re.findall(r'<img class="figure-img', html)) == 3
+    # Captioned with the filenames of both copies
+    caption = re.search(r'Shown once for 2 figures: ([^<]+)</figcaption>', html).group(1)
+    assert sorted(caption.split(', ')) == [
+        "mindsentences_erp_sub-01_20260101T000000.png",
+        "mindsentences_erp_sub-03_20260101T000000.png",
+    ]
+    assert len(re.findall(r'<img class="figure-img', report_html(duplicate_threshold=None))) == 4
+
+def test_stats_count_the_figures_shown(week_figures, pipeline_paths):
+    from PIL import Image
+    figures = pipeline_paths[0] / "figures" / "language_processing"
+    with Image.open(figures / "mindsentences_erp_sub-01_20260101T000000.png") as image:
+        image.save(figures / "mindsentences_erp_sub-03_20260101T000000.png", compress_level=1)
+    _, _, stats = gen_report.generate_mne_report(
+        delta=True, custom_date=gen_report.datetime(2026, 1, 1)
+    )
+    # The copy of the first figure is collapsed into it
+    assert stats['figures'] == 3
+    
+    week_figures("topographic_maps", "probe_topo_sub-04_20260101T000000.png")
+    _, _, stats = gen_report.generate_mne_report(
+        delta=True, custom_date=gen_report.datetime(2026, 1, 2)
+    )
+    assert stats == {'figures': 1, 'subjects': 0, 'tasks': 0, 'main_components': 0}
+
+def test_delta_report_shows_what_changed(week_figures, pipeline_paths):
+    first = report_html(delta=True, custom_date=gen_report.datetime(2026, 1, 1))
+    assert len(re.findall(r'<img class="figure-img', first)) == 3
+    assert "Changes since" not in first
+    
+    week_figures("topographic_maps", "probe_topo_20260101T000000.png", size=(320, 200))
+    week_figures("topographic_maps", "probe_topo_sub-03_20260101T000000.png")
+    html = report_html(
+        delta=True, side_by_side=True, custom_date=gen_report.datetime(2026, 1, 2)
+    )
+    assert "Changes since the report of 2026-01-01" in html
+    assert re.search(r'1 new figures.*1 changed figures.*2 unchanged figures not shown', html, re.S)
+    assert len(re.findall(r'<img class="figure-img', html)) == 3
+    assert html.count('class="delta-comparison"') == 1
+
+def test_reports_link_the_stylesheet_instead_of_embedding_it(week_figures):
+    html = report_html()
+    assert html.count(stylesheet_link_html().strip()) == 1
+    assert ".mne-report-section h2 {" not in html
+
+def test_figure_markup_is_escaped():
+    markup = gen_report.figure_html('data:,"x"', 'a&b.png', '<Title>', 'Caption "quoted"')
+    assert 'src="data:,&quot;x&quot;"' in markup
+    assert 'href="a&amp;b.png"' in markup
+    assert 'alt="&lt;Title&gt;"' in markup
+    assert 'Caption &quot;quoted&quot;' in markup
+
+def test_report_views_cut_the_catalog():
+    from figure_catalog import FigureCatalog, build_records
+    catalog = FigureCatalog(build_records(
+        ["/f/a/erp_sub-01.png", "/f/a/erp_sub-02.png", "/f/b/misc.png", "/f/b/probe.png"],
+        {"erp_sub-01.png": {'subject': '01'}, "erp_sub-02.png": {'subject': 'x y'},
+         "probe.png": {'subject': '01'}}
+    ))
+    assert gen_report.report_views(catalog, ('experiment', 'subject')) == [
+        ('erp', 'Erp', {"/f/a/erp_sub-01.png", "/f/a/erp_sub-02.png"}),
+        ('misc', 'Misc', {"/f/b/misc.png"}),
+        ('probe', 'Probe', {"/f/b/probe.png"}),
+        ('sub-01', 'Subject 01', {"/f/a/erp_sub-01.png", "/f/b/probe.png"}),
+        ('sub-x_y', 'Subject x y', {"/f/a/erp_sub-02.png"}),
+    ]
+    assert gen_report.report_views(catalog, ()) == []
+
+def test_targeted_reports_are_linked_and_reuse_fragments(week_figures, pipeline_paths, caplog):
+    from metadata_store import open_metadata_store, upsert_metadata
+    conn = open_metadata_store()
+    upsert_metadata(conn, [
+        {'filename': "mindsentences_erp_sub-01_20260101T000000.png", 'subject': '01'},
+        {'filename': "probe_topo_20260101T000000.png", 'subject': '01'},
+    ])
+    conn.close()
+    caplog.set_level("INFO", logger="mne_pipeline")
+    html = report_html(views=('experiment', 'subject'), jobs=2)
+    data_path = pipeline_paths[0]
+    view_paths = sorted(data_path.glob("mne_report_*_view-*.html"))
+    assert [path.name.split('_view-')[1] for path in view_paths] == [
+        "mindsentences.html", "probe.html", "sub-01.html"
+    ]
+    for path in view_paths:
+        assert f'href="{path.name}"' in html
+    subject_html = view_paths[2].read_text()
+    assert "MEG Weekly Analysis Report - Subject 01" in subject_html
+    assert len(re.findall(r'<img class="figure-img', subject_html)) == 2
+    assert "Generated 3 of 3 targeted report(s)" in caplog.text
+    # The targeted reports used the fragments of the combined report
+    conn = open_metadata_store()
+    assert conn.execute("SELECT COUNT(*) FROM fragments").fetchone()[0] == 3
+    conn.close()
+    
+    # A rerun without views removes those of the earlier run
+    report_html()
+    assert not list(data_path.glob("mne_report_*_view-*.html"))
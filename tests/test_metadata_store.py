@@ -0,0 +1,116 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import metadata_store
+from metadata_store import (
+    open_metadata_store, upsert_metadata, get_metadata, get_date_epochs,
+    query_metadata, summarize_metadata, get_file_hashes, upsert_file_hashes,
+    content_hashes, compute_file_hash, find_fragments, get_fragment,
+    upsert_fragments, prune_fragments
+)
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = open_metadata_store(str(tmp_path / "metadata.sqlite"), json_path='')
+    yield conn
+    conn.close()
+
+def figure(filename, **fields):
+    return {'filename': filename, **fields}
+
+def test_legacy_json_is_imported_once(tmp_path):
+    json_path = tmp_path / "metadata.json"
+    json_path.write_text(json.dumps({
+        'a.png': figure('a.png', subject='01', added_date='2025-01-02 03:04:05'),
+    }))
+    db_path = str(tmp_path / "metadata.sqlite")
+    conn = open_metadata_store(db_path, str(json_path))
+    assert get_metadata(conn, ['a.png'])['a.png']['subject'] == '01'
+    upsert_metadata(conn, [figure('a.png', subject='02')])
+    conn.close()
+    
+    conn = open_metadata_store(db_path, str(json_path))
+    assert get_metadata(conn, ['a.png'])['a.png']['subject'] == '02'
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == metadata_store.SCHEMA_VERSION
+    conn.close()
+
+def test_metadata_round_trip_leaves_out_missing_fields(conn):
+    upsert_metadata(conn, [figure('a.png', subject='01', task='read')])
+    assert get_metadata(conn, ['a.png', 'unknown.png']) == {
+        'a.png': {'filename': 'a.png', 'subject': '01', 'task': 'read'}
+    }
+
+def test_date_epoch_prefers_the_filename_timestamp(conn):
+    upsert_metadata(conn, [
+        figure('stamped.png', timestamp='20250102T030405', added_date='2026-01-01 00:00:00'),
+        figure('added.png', added_date='2026-01-01 00:00:00'),
+        figure('bad.png', timestamp='not a date'),
+    ])
+    assert get_date_epochs(conn, ['stamped.png', 'added.png', 'bad.png']) == {
+        'stamped.png': datetime(2025, 1, 2, 3, 4, 5).timestamp(),
+        'added.png': datetime(2026, 1, 1).timestamp(),
+    }
+
+def test_lookups_are_chunked(conn, monkeypatch):
+    monkeypatch.setattr(metadata_store, "QUERY_CHUNK_SIZE", 3)
+    names = [f"{i}.png" for i in range(10)]
+    upsert_metadata(conn, [figure(name, task='t') for name in names])
+    assert set(get_metadata(conn, names)) == set(names)
+
+def test_query_by_fields_and_dates(conn):
+    upsert_metadata(conn, [
+        figure('a.png', subject='01', timestamp='20250101T000000'),
+        figure('b.png', subject='01', timestamp='20250301T000000'),
+        figure('c.png', subject='02', timestamp='20250201T000000'),
+    ])
+    assert [m['filename'] for m in query_metadata(conn, subject='01')] == ['a.png', 'b.png']
+    assert [m['filename'] for m in query_metadata(conn, since=datetime(2025, 1, 15))] == [
+        'c.png', 'b.png'
+    ]
+    with pytest.raises(ValueError):
+        query_metadata(conn, filename='a.png')
+
+def test_summaries(conn):
+    upsert_metadata(conn, [
+        figure('a.png', subject='01', task='read'),
+        figure('b.png', subject='02', task='read'),
+        figure('c.png'),
+    ])
+    assert summarize_metadata(conn) == {'figures': 3, 'subjects': 2, 'tasks': 1}
+    assert summarize_metadata(conn, ['a.png', 'c.png', 'gone.png']) == {
+        'figures': 2, 'subjects': 1, 'tasks': 1
+    }
+
+def test_file_hashes(conn):
+    upsert_file_hashes(conn, [('/x.png', 3, 10, 'abc')])
+    upsert_file_hashes(conn, [('/x.png', 4, 11, 'def')])
+    assert get_file_hashes(conn, ['/x.png', '/y.png']) == {'/x.png': (4, 11, 'def')}
+
+def test_content_hashes_only_hash_changed_files(conn, tmp_path, monkeypatch):
+    unchanged = tmp_path / "unchanged.png"
+    changed = tmp_path / "changed.png"
+    unchanged.write_bytes(b'same')
+    changed.write_bytes(b'before')
+    paths = [str(unchanged), str(changed)]
+    assert content_hashes(conn, paths) == {path: compute_file_hash(path) for path in paths}
+    
+    changed.write_bytes(b'after!')
+    hashed = []
+    def counting_hash(path):
+        hashed.append(path)
+        return compute_file_hash(path)
+    monkeypatch.setattr(metadata_store, "compute_file_hash", counting_hash)
+    assert content_hashes(conn, paths)[str(changed)] == compute_file_hash(str(changed))
+    assert hashed == [str(changed)]
+
+def test_fragments_are_pruned_when_unused(conn, monkeypatch):
+    upsert_fragments(conn, {'old': '<p>old</p>'})
+    upsert_fragments(conn, iter([('kept', '<p>kept</p>')]))
+    now = metadata_store.time.time()
+    monkeypatch.setattr(metadata_store.time, "time", lambda: now + 10 * 86400)
+    assert find_fragments(conn, ['kept', 'missing']) == {'kept'}
+    assert prune_fragments(conn, max_age_days=5) == 1
+    assert get_fragment(conn, 'old') is None
+    assert get_fragment(conn, 'kept') == '<p>kept</p>'
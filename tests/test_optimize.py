@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import optimize
+from optimize import optimize_figures, optimized_path, image_psnr
+
+@pytest.fixture
+def figures(pipeline_paths):
+    """Figures that compress well: flat areas, as plots mostly are"""
+    Image = pytest.importorskip("PIL.Image")
+    from PIL import ImageDraw
+    paths = []
+    for index in range(2):
+        path = pipeline_paths[0] / "figures" / "misc" / f"plot_{index}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        image = Image.new('RGB', (400, 300), 'white')
+        draw = ImageDraw.Draw(image)
+        for x in range(0, 400, 20):
+            draw.line((x, 0, 399 - x, 299), fill=(x % 256, 80, 160), width=2)
+        # Saved without compression, as some plotting backends do
+        image.save(path, compress_level=0)
+        paths.append(str(path))
+    return paths
+
+def test_none_leaves_figures_alone(figures):
+    assert optimize_figures(figures, mode='none') == {}
+
+def test_lossless_keeps_the_pixels(figures):
+    from PIL import Image
+    optimized = optimize_figures(figures)
+    assert set(optimized) == set(figures)
+    for fig_path, path in optimized.items():
+        assert os.path.basename(path) == os.path.basename(fig_path)
+        assert os.path.getsize(path) < os.path.getsize(fig_path)
+        with Image.open(fig_path) as original, Image.open(path) as recompressed:
+            assert image_psnr(original, recompressed) == float('inf')
+
+def test_quantize_stays_above_the_psnr_floor(figures):
+    from PIL import Image
+    lossless = optimize_figures(figures, mode='lossless')
+    quantized = optimize_figures(figures, mode='quantize', min_psnr=30)
+    for fig_path, path in quantized.items():
+        assert os.path.getsize(path) <= os.path.getsize(lossless[fig_path])
+        with Image.open(fig_path) as original, Image.open(path) as candidate:
+            assert image_psnr(original, candidate) >= 30
+
+def test_figures_are_optimized_once(figures, monkeypatch):
+    first = optimize_figures(figures)
+    monkeypatch.setattr(optimize, "recompress_png", lambda *args: pytest.fail("recompressed"))
+    assert optimize_figures(figures) == first
+
+def test_optimized_copies_are_keyed_by_settings(pipeline_paths):
+    assert optimized_path("h", "a.png", 'lossless') != optimized_path("h", "a.png", 'quantize')
+    assert optimized_path("h", "a.png", 'quantize', 30) != optimized_path("h", "a.png", 'quantize')
+
+def test_unreadable_figures_are_used_as_they_are(pipeline_paths):
+    broken = pipeline_paths[0] / "broken.png"
+    broken.write_bytes(b'not a png')
+    assert optimize_figures([str(broken)]) == {str(broken): str(broken)}
@@ -0,0 +1,184 @@
+import os
+import time
+
+import pytest
+
+import sync_org
+from metadata_store import open_metadata_store, get_metadata
+
+RECENT = time.strftime("%Y%m%dT%H%M%S")
+OLD = "20200101T000000"
+
+@pytest.fixture
+def figures(pipeline_paths):
+    """The landing directory, with the pipeline pointed at tmp_path"""
+    fig_path = pipeline_paths[0] / "figures"
+    fig_path.mkdir()
+    return fig_path
+
+def add_figure(fig_path, filename, content=b'png'):
+    """Write a figure, as old as its timestamp says (rsync -t keeps mtimes)"""
+    path = fig_path / filename
+    path.write_bytes(content)
+    if OLD in filename:
+        os.utime(path, (1_577_836_800, 1_577_836_800))
+    return path
+
+def organized(fig_path):
+    """Relative paths of the organized figures (those in subdirectories)"""
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, filename), fig_path)
+        for dirpath, _, filenames in os.walk(fig_path)
+        if dirpath != str(fig_path)
+        for filename in filenames
+    )
+
+def stored_metadata(filenames):
+    conn = open_metadata_store()
+    try:
+        return get_metadata(conn, filenames)
+    finally:
+        conn.close()
+
+def test_streaming_organizes_each_file_as_it_lands(figures):
+    on_file, finish = sync_org.organize_figures_streaming()
+    add_figure(figures, f"mindsentences_erp_{RECENT}.png")
+    on_file(f"mindsentences_erp_{RECENT}.png")
+    # Placed before the sync is over
+    assert organized(figures) == [f"language_processing/mindsentences_erp_{RECENT}.png"]
+    
+    add_figure(figures, f"unknown_{RECENT}.png")
+    on_file(f"unknown_{RECENT}.png")
+    on_file("notes.txt")
+    assert finish()
+    assert organized(figures) == [
+        f"language_processing/mindsentences_erp_{RECENT}.png",
+        f"misc/unknown_{RECENT}.png",
+    ]
+    assert set(stored_metadata([
+        f"mindsentences_erp_{RECENT}.png", f"unknown_{RECENT}.png"
+    ])) == {f"mindsentences_erp_{RECENT}.png", f"unknown_{RECENT}.png"}
+
+def test_streaming_falls_back_to_old_files_when_none_is_recent(figures):
+    on_file, finish = sync_org.organize_figures_streaming()
+    add_figure(figures, f"probe_topo_{OLD}.png")
+    on_file(f"probe_topo_{OLD}.png")
+    assert organized(figures) == []
+    assert finish()
+    assert organized(figures) == [f"topographic_maps/probe_topo_{OLD}.png"]
+
+def test_streaming_matches_organize_figures(figures, tmp_path):
+    names = [
+        f"mindsentences_sub-01_{RECENT}.png",
+        f"expertlm_source_task-read_{RECENT}.png",
+        f"distraction_erp_{OLD}.png",
+        f"probe_{RECENT}.png",
+    ]
+    for name in names:
+        add_figure(figures, name)
+    assert sync_org.organize_figures()
+    batch = organized(figures)
+    assert f"eeg_analysis/distraction_erp_{OLD}.png" not in batch
+    
+    # Start over from the flat landing directory and an empty store
+    for dirpath, _, filenames in os.walk(figures, topdown=False):
+        if dirpath != str(figures):
+            for filename in filenames:
+                os.remove(os.path.join(dirpath, filename))
+            os.rmdir(dirpath)
+    os.remove(figures / "metadata.sqlite")
+    on_file, finish = sync_org.organize_figures_streaming()
+    for name in names:
+        on_file(name)
+    assert finish()
+    assert organized(figures) == batch
+
+def test_scan_lists_top_level_pngs_with_mtimes(figures):
+    add_figure(figures, "a.png")
+    add_figure(figures, f"b_{OLD}.png")
+    add_figure(figures, ".hidden.png")
+    add_figure(figures, "notes.txt")
+    (figures / "misc").mkdir()
+    add_figure(figures / "misc", "c.png")
+    file_paths, mtimes = sync_org.scan_figure_files(str(figures))
+    found = dict(zip((os.path.basename(path) for path in file_paths), mtimes))
+    assert set(found) == {"a.png", f"b_{OLD}.png"}
+    assert found[f"b_{OLD}.png"] == 1_577_836_800
+
+def test_recent_mask_prefers_stored_dates_over_mtimes(figures):
+    now = time.time()
+    paths = [
+        str(add_figure(figures, name))
+        for name in ("stored_old.png", "stored_new.png", "no_date.png", "gone.png")
+    ]
+    os.remove(paths[3])
+    date_epochs = {"stored_old.png": now - 30 * 86400, "stored_new.png": now - 86400}
+    mask = sync_org.recent_file_mask(paths, 7, date_epochs)
+    # Unknown dates (the file is gone) are kept
+    assert mask.tolist() == [False, True, True, True]
+    
+    mtimes = [now, now - 30 * 86400, now - 30 * 86400, now]
+    assert sync_org.recent_file_mask(paths, 7, date_epochs, mtimes).tolist() == [
+        False, True, False, True
+    ]
+
+def test_streaming_reports_placed_figures(figures):
+    placed = []
+    on_file, finish = sync_org.organize_figures_streaming(on_placed=placed.append)
+    add_figure(figures, f"probe_topo_{RECENT}.png")
+    on_file(f"probe_topo_{RECENT}.png")
+    assert finish()
+    assert placed == [str(figures / "topographic_maps" / f"probe_topo_{RECENT}.png")]
+    
+    # Figures already in place are not reported again
+    on_file, finish = sync_org.organize_figures_streaming(on_placed=placed.append)
+    on_file(f"probe_topo_{RECENT}.png")
+    assert finish()
+    assert len(placed) == 1
+
+def test_aged_out_figures_leave_the_organized_tree(figures):
+    from figure_catalog import FigureCatalog
+    from organize_engine import undo_plan
+    # Organized by an earlier run, while it still was recent
+    add_figure(figures, f"probe_topo_{OLD}.png")
+    assert sync_org.organize_figures()
+    assert organized(figures) == [f"topographic_maps/probe_topo_{OLD}.png"]
+    
+    add_figure(figures, f"mindsentences_erp_{RECENT}.png")
+    assert sync_org.organize_figures(7)
+    assert [record.filename for record in FigureCatalog.scan(str(figures))] == [
+        f"mindsentences_erp_{RECENT}.png"
+    ]
+    # The landing directory keeps it, and the plan log can put it back
+    assert (figures / f"probe_topo_{OLD}.png").exists()
+    log_dir = figures.parent / "organize_logs"
+    log_path = str(max(log_dir.iterdir()))
+    with open(log_path) as f:
+        assert '"method": "unlink"' in f.read()
+    undo_plan(log_path)
+    assert f"topographic_maps/probe_topo_{OLD}.png" in organized(figures)
+
+def test_streaming_takes_out_aged_out_figures(figures):
+    add_figure(figures, f"probe_topo_{OLD}.png")
+    assert sync_org.organize_figures()
+    expired = []
+    on_file, finish = sync_org.organize_figures_streaming(on_expired=expired.append)
+    add_figure(figures, f"mindsentences_erp_{RECENT}.png")
+    on_file(f"mindsentences_erp_{RECENT}.png")
+    assert finish()
+    assert expired == [str(figures / "topographic_maps" / f"probe_topo_{OLD}.png")]
+    assert organized(figures) == [f"language_processing/mindsentences_erp_{RECENT}.png"]
+
+def test_reorganizing_copies_keeps_their_added_date(figures, monkeypatch):
+    import shutil
+    import organize_engine
+    monkeypatch.setattr(organize_engine, "reflink_file", shutil.copy2)
+    name = "probe_topo.png"
+    add_figure(figures, name)
+    assert sync_org.organize_figures()
+    added_date = stored_metadata([name])[name]['added_date']
+    logs = list((figures.parent / "organize_logs").iterdir())
+    time.sleep(1.1)
+    assert sync_org.organize_figures()
+    assert stored_metadata([name])[name]['added_date'] == added_date
+    assert list((figures.parent / "organize_logs").iterdir()) == logs
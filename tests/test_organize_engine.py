@@ -0,0 +1,132 @@
+import os
+import json
+import errno
+import shutil
+
+import pytest
+
+import organize_engine
+from organize_engine import (
+    PlannedMove, build_organize_plan, place_file, execute_plan, undo_plan, expire_file
+)
+
+@pytest.fixture
+def landing(tmp_path):
+    landing_path = tmp_path / "figures"
+    landing_path.mkdir()
+    for name in ("a.png", "b.png"):
+        (landing_path / name).write_bytes(name.encode())
+    return landing_path
+
+def no_links(monkeypatch):
+    """Make reflinks and hardlinks unavailable, as across filesystems"""
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "cross-device link")
+    monkeypatch.setattr(organize_engine, "reflink_file", unsupported)
+    monkeypatch.setattr(organize_engine.os, "link", unsupported)
+
+def test_plan_pairs_files_with_destinations():
+    assert build_organize_plan(["/in/a.png", "/in/b.png"], ["/out/x", "/out/y"]) == [
+        PlannedMove("/in/a.png", "/out/x/a.png"), PlannedMove("/in/b.png", "/out/y/b.png")
+    ]
+
+def test_execute_links_files_and_logs_the_plan(landing, tmp_path):
+    plan = build_organize_plan(
+        [str(landing / "a.png"), str(landing / "b.png")],
+        [str(landing / "cat" / "sub"), str(landing / "misc")]
+    )
+    log_path = str(tmp_path / "plan.jsonl")
+    methods, written_log = execute_plan(plan, log_path=log_path)
+    assert written_log == log_path
+    assert set(methods) <= {'reflink', 'hardlink'}
+    # The landing directory keeps its files
+    assert (landing / "a.png").exists()
+    assert (landing / "cat" / "sub" / "a.png").read_bytes() == b"a.png"
+    
+    with open(log_path) as f:
+        header, *entries = [json.loads(line) for line in f]
+    assert sorted(header['created_dirs']) == sorted([
+        str(landing / "cat"), str(landing / "cat" / "sub"), str(landing / "misc")
+    ])
+    assert [entry['destination'] for entry in entries] == [move.destination for move in plan]
+    
+    # Running the same plan again changes nothing and logs nothing
+    methods, written_log = execute_plan(plan, log_path=str(tmp_path / "again.jsonl"))
+    assert methods == ['unchanged', 'unchanged'] and written_log is None
+
+def test_undo_removes_links_and_created_dirs(landing, tmp_path):
+    plan = build_organize_plan([str(landing / "a.png")], [str(landing / "cat" / "sub")])
+    _, log_path = execute_plan(plan, log_path=str(tmp_path / "plan.jsonl"))
+    assert undo_plan(log_path) == 1
+    assert sorted(os.listdir(landing)) == ["a.png", "b.png"]
+
+def test_rename_is_the_fallback_and_is_undone(landing, tmp_path, monkeypatch):
+    no_links(monkeypatch)
+    plan = build_organize_plan([str(landing / "a.png")], [str(landing / "misc")])
+    methods, log_path = execute_plan(plan, log_path=str(tmp_path / "plan.jsonl"))
+    assert methods == ['rename']
+    assert not (landing / "a.png").exists()
+    assert undo_plan(log_path) == 1
+    assert (landing / "a.png").read_bytes() == b"a.png"
+    assert not (landing / "misc").exists()
+
+def test_unsupported_methods_are_tried_once_per_filesystem(landing, monkeypatch):
+    attempts = []
+    def unsupported_reflink(source, destination):
+        attempts.append(source)
+        raise OSError(errno.EOPNOTSUPP, "not supported")
+    monkeypatch.setattr(organize_engine, "reflink_file", unsupported_reflink)
+    (landing / "out").mkdir()
+    unsupported = set()
+    for name in ("a.png", "b.png"):
+        move = PlannedMove(str(landing / name), str(landing / "out" / name))
+        assert place_file(move, unsupported) == 'hardlink'
+    assert len(attempts) == 1
+
+def test_changed_files_replace_their_organized_copy(landing):
+    (landing / "out").mkdir()
+    (landing / "out" / "a.png").write_bytes(b"old")
+    move = PlannedMove(str(landing / "a.png"), str(landing / "out" / "a.png"))
+    assert place_file(move) in ('reflink', 'hardlink')
+    assert (landing / "out" / "a.png").read_bytes() == b"a.png"
+    assert [name for name in os.listdir(landing / "out") if name.endswith(".tmp")] == []
+
+def test_expired_figures_are_taken_out_and_undone(landing, tmp_path):
+    plan = build_organize_plan(
+        [str(landing / "a.png"), str(landing / "b.png")], [str(landing / "misc")] * 2
+    )
+    execute_plan(plan, log_path=str(tmp_path / "first.jsonl"))
+    # b.png was renamed into place: it goes back to the landing directory
+    os.remove(landing / "b.png")
+    methods, log_path = execute_plan([], expired=plan, log_path=str(tmp_path / "plan.jsonl"))
+    assert methods == []
+    assert sorted(os.listdir(landing)) == ["a.png", "b.png", "misc"]
+    assert os.listdir(landing / "misc") == []
+    with open(log_path) as f:
+        _, *entries = [json.loads(line) for line in f]
+    assert [entry['method'] for entry in entries] == ['unlink', 'return']
+    
+    assert undo_plan(log_path) == 2
+    assert sorted(os.listdir(landing / "misc")) == ["a.png", "b.png"]
+    assert not (landing / "b.png").exists()
+
+def test_expire_file_unlinks_only_the_organized_copy(landing):
+    (landing / "misc").mkdir()
+    os.link(landing / "a.png", landing / "misc" / "a.png")
+    move = PlannedMove(str(landing / "a.png"), str(landing / "misc" / "a.png"))
+    assert expire_file(move) == 'unlink'
+    assert (landing / "a.png").read_bytes() == b"a.png"
+
+def test_reflinked_copies_are_left_in_place(landing, tmp_path, monkeypatch):
+    # Reflinks are copies with their own inode, like shutil.copy2's
+    monkeypatch.setattr(organize_engine, "reflink_file", shutil.copy2)
+    plan = build_organize_plan([str(landing / "a.png")], [str(landing / "misc")])
+    assert execute_plan(plan, log_path=str(tmp_path / "first.jsonl"))[0] == ['reflink']
+    methods, log_path = execute_plan(plan, log_path=str(tmp_path / "again.jsonl"))
+    assert methods == ['unchanged'] and log_path is None
+    
+    # A re-delivered figure replaces its copy
+    (landing / "a.png").write_bytes(b"changed")
+    os.utime(landing / "a.png", (0, 0))
+    assert place_file(plan[0]) == 'reflink'
+    assert (landing / "misc" / "a.png").read_bytes() == b"changed"
@@ -0,0 +1,108 @@
+import os
+import time
+
+import pytest
+
+import pipeline
+from landing_watch import LandingWatcher, open_landing_watcher
+from .test_organize import add_figure, RECENT, OLD
+
+@pytest.fixture
+def watcher(tmp_path):
+    watcher = open_landing_watcher(str(tmp_path))
+    if watcher is None:
+        pytest.skip("inotify is not available")
+    yield watcher
+    watcher.close()
+
+def test_watcher_reports_written_and_moved_files(tmp_path, watcher):
+    assert watcher.wait(timeout=0) == (set(), False)
+    (tmp_path / "written.png").write_bytes(b'png')
+    (tmp_path / ".moved.png.tmp").write_bytes(b'png')
+    os.rename(tmp_path / ".moved.png.tmp", tmp_path / "moved.png")
+    names, overflowed = watcher.wait(timeout=5)
+    assert names == {"written.png", ".moved.png.tmp", "moved.png"} and not overflowed
+    assert pipeline.landed_figures(names | {"gone.png"}) == {}
+
+def test_watcher_on_a_missing_directory(tmp_path):
+    with pytest.raises(OSError):
+        LandingWatcher(str(tmp_path / "nowhere"))
+    assert open_landing_watcher(str(tmp_path / "nowhere")) is None
+
+@pytest.fixture
+def burst_steps(pipeline_paths, monkeypatch):
+    """
+    The landing directory, with the steps after organizing replaced by
+    recorders: what was optimized, and the catalog each report was made of
+    """
+    fig_path = pipeline_paths[0] / "figures"
+    fig_path.mkdir()
+    steps = {'optimized': [], 'reported': []}
+    def optimize_figures(fig_paths, mode='lossless'):
+        steps['optimized'].append(sorted(os.path.basename(path) for path in fig_paths))
+        return {path: path for path in fig_paths}
+    def generate_mne_report(catalog=None, optimized=None, **options):
+        assert set(optimized) == set(catalog.paths)
+        steps['reported'].append(sorted(os.path.basename(path) for path in catalog.paths))
+        return "report.html", "2026-01-01", catalog.stats()
+    monkeypatch.setattr(pipeline, "optimize_figures", optimize_figures)
+    monkeypatch.setattr(pipeline, "generate_mne_report", generate_mne_report)
+    monkeypatch.setattr(pipeline, "update_github_website", lambda *args: True)
+    return fig_path, steps
+
+def test_burst_only_handles_its_own_figures(burst_steps):
+    fig_path, steps = burst_steps
+    first = f"mindsentences_erp_{RECENT}.png"
+    second = f"probe_topo_{RECENT}.png"
+    state = {}
+    burst = {str(add_figure(fig_path, first)): 0}
+    assert pipeline.run_burst(burst, 'local', state)
+    # The first burst of the day starts from a full scan
+    assert steps['optimized'] == [[first]]
+    
+    burst = {str(add_figure(fig_path, second)): 0}
+    assert pipeline.run_burst(burst, 'local', state)
+    assert steps['optimized'][1] == [second]
+    assert steps['reported'][1] == sorted([first, second])
+    assert state['catalog'].by_main_component['probe'][0].metadata['filename'] == second
+
+def test_burst_drops_aged_out_figures(burst_steps):
+    fig_path, steps = burst_steps
+    old = f"probe_topo_{OLD}.png"
+    recent = f"mindsentences_erp_{RECENT}.png"
+    state = {}
+    # With nothing recent, the old figure is organized after all
+    assert pipeline.run_burst({str(add_figure(fig_path, old)): 0}, 'local', state)
+    assert pipeline.run_burst({str(add_figure(fig_path, recent)): 0}, 'local', state)
+    assert steps['reported'] == [[old], [recent]]
+    assert list(state['optimized']) == state['catalog'].paths
+
+def test_burst_rescans_on_a_new_day(burst_steps):
+    fig_path, steps = burst_steps
+    name = f"mindsentences_erp_{RECENT}.png"
+    state = {'date': None}
+    assert pipeline.run_burst({str(add_figure(fig_path, name)): 0}, 'local', state)
+    state['date'] = None
+    assert pipeline.run_burst({}, 'local', state)
+    assert steps['optimized'] == [[name], [name]]
+
+def test_failed_burst_starts_over_from_a_scan(burst_steps, monkeypatch):
+    fig_path, steps = burst_steps
+    def broken_report(**options):
+        raise RuntimeError("broken")
+    monkeypatch.setattr(pipeline, "generate_mne_report", broken_report)
+    state = {}
+    name = f"mindsentences_erp_{RECENT}.png"
+    assert not pipeline.run_burst({str(add_figure(fig_path, name)): 0}, 'local', state)
+    assert state == {}
+
+def test_landed_figures_skips_hidden_and_other_files(tmp_path, burst_steps):
+    fig_path, _ = burst_steps
+    add_figure(fig_path, "a.png")
+    add_figure(fig_path, ".a.png")
+    add_figure(fig_path, "notes.txt")
+    mtime = time.time() - 100
+    os.utime(fig_path / "a.png", (mtime, mtime))
+    assert pipeline.landed_figures(["a.png", ".a.png", "notes.txt"]) == {
+        str(fig_path / "a.png"): mtime
+    }
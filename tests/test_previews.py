@@ -0,0 +1,63 @@
+import base64
+
+import pytest
+
+import previews
+from previews import preview_path, make_preview, image_data_uri
+
+@pytest.fixture
+def preview_cache(tmp_path, monkeypatch):
+    cache_path = tmp_path / "previews"
+    monkeypatch.setattr(previews, "PREVIEW_CACHE_PATH", str(cache_path))
+    return cache_path
+
+def test_preview_is_keyed_by_hash_and_settings(preview_cache):
+    assert preview_path("abc") == str(preview_cache / "abc_1200w_q80.webp")
+    assert preview_path("abc", 'jpeg', 640, 50) == str(preview_cache / "abc_640w_q50.jpg")
+
+@pytest.mark.parametrize("preview_format", ["webp", "jpeg", "png"])
+def test_preview_is_downscaled(tmp_path, preview_cache, write_png, preview_format):
+    from PIL import Image
+    fig_path = write_png(tmp_path / "wide.png", size=(2000, 1000))
+    output_path = make_preview(str(fig_path), preview_format, max_width=500, file_hash="h")
+    assert output_path == preview_path("h", preview_format, 500)
+    with Image.open(output_path) as image:
+        assert image.size == (500, 250)
+        assert image.format == preview_format.upper()
+
+def test_narrow_figures_keep_their_size(tmp_path, preview_cache, write_png):
+    from PIL import Image
+    fig_path = write_png(tmp_path / "narrow.png", size=(100, 80))
+    with Image.open(make_preview(str(fig_path))) as image:
+        assert image.size == (100, 80)
+
+def test_jpeg_previews_are_flattened_onto_white(tmp_path, preview_cache, write_png):
+    from PIL import Image
+    fig_path = write_png(tmp_path / "clear.png", color=(0, 0, 0, 0), mode='RGBA')
+    with Image.open(make_preview(str(fig_path), 'jpeg')) as image:
+        assert image.getpixel((0, 0)) == (255, 255, 255)
+
+def test_each_figure_is_downscaled_once(tmp_path, preview_cache, write_png, monkeypatch):
+    fig_path = write_png(tmp_path / "figure.png")
+    first = make_preview(str(fig_path))
+    rendered = []
+    monkeypatch.setattr(previews, "render_preview", lambda *args: rendered.append(args))
+    # The same contents under another name hit the cache too
+    copy_path = tmp_path / "copy.png"
+    copy_path.write_bytes(fig_path.read_bytes())
+    assert make_preview(str(copy_path)) == first
+    assert rendered == []
+    assert list(preview_cache.iterdir()) == [preview_cache / first.split('/')[-1]]
+
+def test_unreadable_figures_have_no_preview(tmp_path, preview_cache, write_png):
+    fig_path = tmp_path / "broken.png"
+    fig_path.write_bytes(b'not a png')
+    assert make_preview(str(fig_path)) is None
+    assert not any(preview_cache.glob("*.tmp"))
+
+def test_data_uri_uses_the_format_subtype(tmp_path):
+    jpeg_path = tmp_path / "preview.jpg"
+    jpeg_path.write_bytes(b'\xff\xd8data')
+    uri = image_data_uri(str(jpeg_path))
+    assert uri.startswith("data:image/jpeg;base64,")
+    assert base64.b64decode(uri.split(',', 1)[1]) == b'\xff\xd8data'
@@ -0,0 +1,78 @@
+import subprocess
+
+import pytest
+
+import publish
+from publish import files_to_stage, commit_paths, push_with_retries, push_in_background
+
+@pytest.fixture
+def site(tmp_path, git_repo):
+    """The scratch website repository, with a published week"""
+    site_path = tmp_path / "site"
+    week = site_path / "files" / "week1_2026"
+    (week / "report_figures").mkdir(parents=True)
+    (week / "report.html").write_text("report")
+    (week / "report_figures" / "a.png").write_bytes(b'a')
+    (week / "report_figures" / "b.png").write_bytes(b'b')
+    git_repo("add", "files")
+    git_repo("commit", "-q", "-m", "Week 1")
+    return site_path
+
+def test_files_to_stage_covers_removals(site):
+    week = site / "files" / "week1_2026"
+    (week / "report_figures" / "b.png").unlink()
+    (week / "report_figures" / "c.png").write_bytes(b'c')
+    (week / "gone.html").write_text("")
+    (week / "gone.html").unlink()
+    assert files_to_stage([week / "report.html", week / "report_figures"], str(site)) == [
+        "files/week1_2026/report.html",
+        "files/week1_2026/report_figures/a.png",
+        "files/week1_2026/report_figures/b.png",
+        "files/week1_2026/report_figures/c.png",
+    ]
+    assert files_to_stage(["files/week1_2026/gone.html"], str(site)) == []
+
+def test_commit_paths_commits_only_the_given_paths(site, git_repo):
+    week = site / "files" / "week1_2026"
+    (week / "report.html").write_text("report, updated")
+    (week / "report_figures" / "b.png").unlink()
+    (site / "index.html").write_text("edited by hand, not published")
+    (site / "scratch.txt").write_text("untracked")
+    
+    commit = commit_paths(
+        [str(week / "report.html"), str(week / "report_figures")], "Update", str(site)
+    )
+    assert git_repo("rev-parse", "HEAD").strip() == commit
+    assert git_repo("log", "-1", "--format=%s").strip() == "Update"
+    assert git_repo("diff", "--name-status", "HEAD~1", "HEAD").splitlines() == [
+        "M\tfiles/week1_2026/report.html",
+        "D\tfiles/week1_2026/report_figures/b.png",
+    ]
+    assert git_repo("show", "HEAD:files/week1_2026/report.html") == "report, updated"
+    # What was not published is left alone
+    assert git_repo("status", "--porcelain").splitlines() == [
+        " M index.html", "?? scratch.txt"
+    ]
+    assert commit_paths([str(week / "report.html")], "Again", str(site)) is None
+
+def test_commit_paths_makes_the_first_commit(tmp_path, git_repo):
+    repo_path = tmp_path / "empty"
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo_path)], check=True)
+    (repo_path / "a.txt").write_text("a")
+    commit = commit_paths(["a.txt"], "First", str(repo_path))
+    assert commit and publish.run_git(["rev-parse", "HEAD"], str(repo_path)).strip() == commit
+
+def test_push_reaches_the_remote(site, git_repo):
+    assert push_with_retries(str(site))
+    assert git_repo("rev-parse", "origin/main") == git_repo("rev-parse", "HEAD")
+    git_repo("branch", "extra")
+    thread = push_in_background(str(site), refs=["HEAD", "extra"])
+    thread.join()
+    assert git_repo("ls-remote", "origin", "extra").strip()
+
+def test_failed_push_is_retried_with_backoff(site, git_repo, monkeypatch):
+    git_repo("remote", "set-url", "origin", str(site.parent / "missing.git"))
+    delays = []
+    monkeypatch.setattr(publish.time, "sleep", delays.append)
+    assert not push_with_retries(str(site), retries=3, retry_delay=2)
+    assert delays == [2, 4, 8]
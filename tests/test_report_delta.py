@@ -0,0 +1,58 @@
+import pytest
+
+import report_delta
+from figure_catalog import FigureCatalog, build_records
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_delta, "CATALOG_SNAPSHOT_PATH", str(tmp_path / "snapshots"))
+    return tmp_path / "snapshots"
+
+def catalog_of(*filenames):
+    return FigureCatalog(build_records([f"/figures/misc/{name}" for name in filenames], {}))
+
+def test_identity_leaves_out_the_timestamp():
+    assert report_delta.figure_identity("erp_sub-01_20250101T000000.png") == (
+        report_delta.figure_identity("erp_sub-01_20250108T120000.png")
+    )
+    assert report_delta.figure_identity("erp.png") == "erp.png"
+
+def test_latest_earlier_snapshot_is_compared_with(snapshots):
+    assert report_delta.load_previous_snapshot("2025-01-10") is None
+    catalog = catalog_of("a.png")
+    hashes = {"/figures/misc/a.png": "h"}
+    for date in ("2025-01-01", "2025-01-08", "2025-01-10"):
+        report_delta.write_catalog_snapshot(date, catalog, hashes, {})
+    (snapshots / "2025-01-09.json.123.tmp").write_text("partial")
+    snapshot = report_delta.load_previous_snapshot("2025-01-10")
+    assert snapshot['date'] == "2025-01-08"
+    assert snapshot['figures'][0]['source_sha256'] == "h"
+
+def test_unreadable_snapshot_means_no_delta(snapshots):
+    snapshots.mkdir()
+    (snapshots / "2025-01-01.json").write_text("{")
+    assert report_delta.load_previous_snapshot("2025-01-02") is None
+
+def test_changes_since_a_snapshot(snapshots):
+    before = catalog_of(
+        "kept_20250101T000000.png", "rerun_20250101T000000.png", "renamed.png"
+    )
+    report_delta.write_catalog_snapshot("2025-01-01", before, {
+        "/figures/misc/kept_20250101T000000.png": "kept",
+        "/figures/misc/rerun_20250101T000000.png": "rerun-old",
+        "/figures/misc/renamed.png": "renamed",
+    }, {})
+    snapshot = report_delta.load_previous_snapshot("2025-01-02")
+    after = catalog_of(
+        "kept_20250101T000000.png", "rerun_20250102T000000.png", "renamed_again.png",
+        "new.png"
+    )
+    changes = report_delta.compare_with_snapshot(after, {
+        "/figures/misc/kept_20250101T000000.png": "kept",
+        "/figures/misc/rerun_20250102T000000.png": "rerun-new",
+        "/figures/misc/renamed_again.png": "renamed",
+        "/figures/misc/new.png": "new",
+    }, snapshot)
+    assert set(changes) == {"/figures/misc/rerun_20250102T000000.png", "/figures/misc/new.png"}
+    assert changes["/figures/misc/rerun_20250102T000000.png"]['sha256'] == "rerun-old"
+    assert changes["/figures/misc/new.png"] is None
@@ -0,0 +1,27 @@
+import posixpath
+
+import report_templates
+from report_templates import (
+    REPORT_CSS, STYLESHEET_VERSION, stylesheet_url, stylesheet_link_html,
+    publish_report_stylesheet
+)
+
+def test_stylesheet_url_reaches_the_published_stylesheet():
+    # Reports are published as files/<week>/<report>.html
+    url = stylesheet_url()
+    assert url.endswith(f"?v={STYLESHEET_VERSION}")
+    assert posixpath.normpath(
+        posixpath.join("files/week1_2026", url.split('?')[0])
+    ) == "assets/report.css"
+    assert f'href="{url}"' in stylesheet_link_html()
+
+def test_stylesheet_is_only_written_when_it_changed(tmp_path, monkeypatch):
+    dest_path = tmp_path / "assets" / "report.css"
+    assert publish_report_stylesheet(str(dest_path)) == str(dest_path)
+    assert dest_path.read_text(encoding='utf-8') == REPORT_CSS
+    assert publish_report_stylesheet(str(dest_path)) is None
+    
+    monkeypatch.setattr(report_templates, "REPORT_CSS", REPORT_CSS + "p { margin: 0; }\n")
+    assert publish_report_stylesheet(str(dest_path)) == str(dest_path)
+    assert dest_path.read_text(encoding='utf-8').endswith("p { margin: 0; }\n")
+    assert [path.name for path in dest_path.parent.iterdir()] == ["report.css"]
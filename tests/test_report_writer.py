@@ -0,0 +1,40 @@
+import io
+import re
+
+import pytest
+
+from report_writer import figure_marker, write_expanded, stream_report
+
+FRAGMENTS = {
+    'a1': '<figure>\n  <img src="data:image/webp;base64,AAAA" alt="A &amp; B">\n</figure>',
+    'b2': '<figure><img src="data:image/webp;base64,BBBB" alt="B"></figure>',
+}
+
+def test_markers_are_expanded_in_place():
+    output = io.StringIO()
+    write_expanded(output, f"x{figure_marker('a1')}y{figure_marker('b2')}z", FRAGMENTS.get)
+    assert output.getvalue() == f"x{FRAGMENTS['a1']}y{FRAGMENTS['b2']}z"
+
+def test_streamed_report_matches_a_saved_one(tmp_path):
+    mne = pytest.importorskip("mne")
+    items = [
+        ("<h2>Overview</h2>", "Overview"),
+        (figure_marker('a1'), "Figure A"),
+        (f"<div>{figure_marker('b2')}{figure_marker('a1')}</div>", "Figures B and A"),
+    ]
+    streamed = mne.Report(title="Report")
+    saved = mne.Report(title="Report")
+    for item_html, title in items:
+        streamed.add_html(item_html, title=title, tags=("custom-image",))
+        expanded = io.StringIO()
+        write_expanded(expanded, item_html, FRAGMENTS.get)
+        saved.add_html(expanded.getvalue(), title=title, tags=("custom-image",))
+    
+    stream_report(streamed, str(tmp_path / "streamed.html"), FRAGMENTS.get)
+    saved.save(str(tmp_path / "saved.html"), open_browser=False)
+    # Leaving out the time each report was made at
+    read = lambda name: re.sub(
+        r'Created on [\d: -]+ via', '', (tmp_path / name).read_text(encoding='utf-8')
+    )
+    assert read("streamed.html") == read("saved.html")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["saved.html", "streamed.html"]
@@ -0,0 +1,63 @@
+import json
+
+from reports_manifest import report_record, append_report, read_reports, rebuild_manifest
+
+STATS = {'figures': 12, 'subjects': 3, 'tasks': 2, 'main_components': 4}
+
+def publish(repo_path, week_dir, date_str, content="<html></html>"):
+    """Write a published report, returning its path"""
+    report_path = repo_path / "files" / week_dir / f"mne_report_{date_str}.html"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(content)
+    return report_path
+
+def test_record_describes_the_report(tmp_path):
+    report_path = publish(tmp_path, "week1_2026", "2026-01-02", "x" * 10)
+    view_path = report_path.parent / "mne_report_2026-01-02_view-sub-01.html"
+    record = report_record(
+        str(report_path), "2026-01-02", "week1_2026", STATS, [str(view_path)],
+        repo_path=str(tmp_path)
+    )
+    assert record.pop('published')
+    assert record == {
+        'date': "2026-01-02", 'week': "week1_2026",
+        'path': "files/week1_2026/mne_report_2026-01-02.html",
+        'figures': 12, 'subjects': 3, 'tasks': 2, 'bytes': 10,
+        'views': ["files/week1_2026/mne_report_2026-01-02_view-sub-01.html"],
+    }
+    assert report_record(
+        str(report_path), "2026-01-02", "week1_2026", repo_path=str(tmp_path)
+    )['figures'] is None
+
+def test_appended_records_replace_earlier_ones(tmp_path):
+    manifest_path = str(tmp_path / "files" / "reports.jsonl")
+    for date_str, figures in (("2026-01-02", 1), ("2026-01-09", 2), ("2026-01-02", 3)):
+        append_report({'date': date_str, 'path': date_str, 'figures': figures}, manifest_path)
+    with open(manifest_path) as f:
+        assert len(f.readlines()) == 3
+    assert read_reports(manifest_path) == [
+        {'date': "2026-01-09", 'path': "2026-01-09", 'figures': 2},
+        {'date': "2026-01-02", 'path': "2026-01-02", 'figures': 3},
+    ]
+    assert read_reports(str(tmp_path / "missing.jsonl")) == []
+
+def test_rebuild_keeps_known_counts(tmp_path):
+    first = publish(tmp_path, "week1_2026", "2026-01-02")
+    publish(tmp_path, "week2_2026", "2026-01-09", "<html>longer</html>")
+    (tmp_path / "files" / "week2_2026" / "notes.html").write_text("")
+    (tmp_path / "files" / "index.html").write_text("")
+    manifest_path = str(tmp_path / "files" / "reports.jsonl")
+    append_report(report_record(
+        str(first), "2026-01-02", "week1_2026", STATS, repo_path=str(tmp_path)
+    ), manifest_path)
+    first.write_text("<html>republished</html>")
+    
+    assert rebuild_manifest(str(tmp_path)) == 2
+    with open(manifest_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [(record['path'], record['figures'], record['bytes']) for record in records] == [
+        ("files/week1_2026/mne_report_2026-01-02.html", 12, 24),
+        ("files/week2_2026/mne_report_2026-01-09.html", None, 19),
+    ]
+    assert records[0]['published'] and records[1]['published'] is None
+    assert not list((tmp_path / "files").glob("*.tmp"))
@@ -0,0 +1,267 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+import sync_org
+
+@pytest.fixture
+def local_figures(tmp_path, monkeypatch):
+    """Point sync_org at a landing directory under tmp_path"""
+    fig_path = tmp_path / "figures"
+    monkeypatch.setattr(sync_org, "LOCAL_FIG_PATH", str(fig_path) + os.sep)
+    monkeypatch.setattr(sync_org, "SYNC_MANIFEST_FILE", str(fig_path / "sync_manifest.json"))
+    monkeypatch.setattr(sync_org, "SYNC_STAGING_PATH", str(tmp_path / "incoming"))
+    monkeypatch.setattr(sync_org, "METADATA_FILE", str(fig_path / "metadata.json"))
+    return fig_path
+
+def make_source(tmp_path, name, files):
+    """A local sync source (empty host) holding files {rel_path: content}"""
+    source_path = tmp_path / "remote" / name
+    for rel_path, content in files.items():
+        write_file(source_path / rel_path, content)
+    return {'name': name, 'host': '', 'path': str(source_path) + os.sep}
+
+def write_file(path, content, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+def copying_rsync(calls):
+    """
+    Stand-in for run_rsync that copies the --files-from list locally, the
+    way rsync -t does, recording each call
+    """
+    def run_rsync(rsync_command, input_text=None, on_file=None):
+        source_path, dest_path = rsync_command[-2:]
+        rel_paths = input_text.split()
+        calls.append(rel_paths)
+        for rel_path in rel_paths:
+            os.makedirs(os.path.dirname(os.path.join(dest_path, rel_path)), exist_ok=True)
+            shutil.copy2(os.path.join(source_path, rel_path), os.path.join(dest_path, rel_path))
+            if on_file is not None:
+                on_file(rel_path)
+        return 0, "", "", len(rel_paths)
+    return run_rsync
+
+def failing_rsync(rsync_command, input_text=None, on_file=None):
+    return 23, "", "rsync: connection unexpectedly closed", 0
+
+def test_plan_incremental_sync_picks_new_and_changed_files():
+    manifest = {'last_sync': {}, 'files': {
+        'same.png': {'source': 'a', 'size': 10, 'mtime': 100},
+        'resized.png': {'source': 'a', 'size': 10, 'mtime': 100},
+        'touched.png': {'source': 'a', 'size': 10, 'mtime': 100},
+        'moved.png': {'source': 'a', 'size': 10, 'mtime': 100},
+    }}
+    remote_files = {
+        'same.png': ('a', 10, 100),
+        'resized.png': ('a', 11, 100),
+        'touched.png': ('a', 10, 101),
+        'moved.png': ('b', 10, 100),
+        'new.png': ('a', 5, 100),
+    }
+    assert sync_org.plan_incremental_sync(remote_files, manifest) == [
+        'moved.png', 'new.png', 'resized.png', 'touched.png'
+    ]
+
+def test_source_conflicts_keep_the_newest_then_the_first_source():
+    sources = [{'name': 'a'}, {'name': 'b'}]
+    listings = {
+        'a': {'newer_on_b.png': (1, 100), 'tie.png': (1, 100), 'only_a.png': (1, 100)},
+        'b': {'newer_on_b.png': (2, 200), 'tie.png': (2, 100)},
+    }
+    assert sync_org.resolve_source_conflicts(listings, sources) == {
+        'newer_on_b.png': ('b', 2, 200),
+        'tie.png': ('a', 1, 100),
+        'only_a.png': ('a', 1, 100),
+    }
+
+def test_list_remote_figures_reads_a_local_source(tmp_path):
+    source = make_source(tmp_path, 'a', {'x.png': b'12345', 'sub/y.png': b'1'})
+    listing = sync_org.list_remote_figures(source['host'], source['path'])
+    assert {rel_path: size for rel_path, (size, _) in listing.items()} == {
+        'x.png': 5, 'sub/y.png': 1
+    }
+
+def test_incremental_sync_only_fetches_changes(tmp_path, local_figures, monkeypatch):
+    source = make_source(tmp_path, 'a', {'one.png': b'1', 'two.png': b'2'})
+    calls = []
+    monkeypatch.setattr(sync_org, "run_rsync", copying_rsync(calls))
+    
+    assert sync_org.sync_figures_incremental(sources=[source])
+    assert calls == [['one.png', 'two.png']]
+    assert (local_figures / "two.png").read_bytes() == b'2'
+    
+    assert sync_org.sync_figures_incremental(sources=[source])
+    assert len(calls) == 1
+    
+    write_file(tmp_path / "remote" / "a" / "two.png", b'22', mtime=2_000_000_000)
+    assert sync_org.sync_figures_incremental(sources=[source])
+    assert calls[1] == ['two.png']
+    manifest = sync_org.load_sync_manifest()
+    assert manifest['files']['two.png']['size'] == 2
+    assert manifest['files']['two.png']['sha256'] == sync_org.compute_file_hash(
+        str(local_figures / "two.png")
+    )
+
+def test_incremental_sync_streams_files_after_hashing_them(tmp_path, local_figures, monkeypatch):
+    source = make_source(tmp_path, 'a', {'one.png': b'1'})
+    monkeypatch.setattr(sync_org, "run_rsync", copying_rsync([]))
+    streamed = []
+    def organize(rel_path):
+        # Move the file away, as organizing does
+        streamed.append(rel_path)
+        os.remove(local_figures / rel_path)
+    
+    assert sync_org.sync_figures_incremental(on_file=organize, sources=[source])
+    assert streamed == ['one.png']
+    assert 'one.png' in sync_org.load_sync_manifest()['files']
+    # Organized files are not fetched again
+    assert sync_org.sync_figures_incremental(on_file=organize, sources=[source])
+    assert streamed == ['one.png']
+
+def test_failed_source_is_retried_with_its_stale_copy(tmp_path, local_figures, monkeypatch):
+    good = make_source(tmp_path, 'good', {'g.png': b'g'})
+    bad = make_source(tmp_path, 'bad', {'b.png': b'b'})
+    monkeypatch.setattr(sync_org, "run_rsync", copying_rsync([]))
+    assert sync_org.sync_figures_incremental(sources=[good, bad])
+    old_entry = sync_org.load_sync_manifest()['files']['b.png']
+    
+    write_file(tmp_path / "remote" / "bad" / "b.png", b'bb', mtime=2_000_000_000)
+    write_file(tmp_path / "remote" / "good" / "g.png", b'gg', mtime=2_000_000_000)
+    real_rsync = copying_rsync([])
+    def rsync_failing_for_bad(rsync_command, input_text=None, on_file=None):
+        if rsync_command[-2] == bad['path']:
+            return failing_rsync(rsync_command, input_text, on_file)
+        return real_rsync(rsync_command, input_text, on_file)
+    monkeypatch.setattr(sync_org, "run_rsync", rsync_failing_for_bad)
+    assert not sync_org.sync_figures_incremental(sources=[good, bad])
+    
+    manifest = sync_org.load_sync_manifest()
+    assert manifest['files']['b.png'] == old_entry
+    assert manifest['files']['g.png']['size'] == 2
+    assert 'bad' in manifest['last_sync']
+    
+    calls = []
+    monkeypatch.setattr(sync_org, "run_rsync", copying_rsync(calls))
+    assert sync_org.sync_figures_incremental(sources=[good, bad])
+    assert calls == [['b.png']]
+    assert (local_figures / "b.png").read_bytes() == b'bb'
+
+def test_files_gone_from_the_remote_are_forgotten(tmp_path, local_figures, monkeypatch):
+    source = make_source(tmp_path, 'a', {'one.png': b'1', 'two.png': b'2'})
+    monkeypatch.setattr(sync_org, "run_rsync", copying_rsync([]))
+    assert sync_org.sync_figures_incremental(sources=[source])
+    os.remove(tmp_path / "remote" / "a" / "two.png")
+    assert sync_org.sync_figures_incremental(sources=[source])
+    assert set(sync_org.load_sync_manifest()['files']) == {'one.png'}
+
+@pytest.mark.skipif(shutil.which("rsync") is None, reason="rsync is not installed")
+def test_incremental_sync_with_rsync(tmp_path, local_figures):
+    source = make_source(tmp_path, 'a', {'one.png': b'1', 'sub/two.png': b'2'})
+    assert sync_org.sync_figures_incremental(sources=[source])
+    assert (local_figures / "sub" / "two.png").read_bytes() == b'2'
+    assert set(sync_org.load_sync_manifest()['files']) == {'one.png', 'sub/two.png'}
+
+@pytest.mark.skipif(shutil.which("rsync") is None, reason="rsync is not installed")
+def test_rsync_reports_files_once_they_are_in_place(tmp_path):
+    source_path = tmp_path / "remote"
+    dest_path = tmp_path / "figures"
+    contents = {'new.png': os.urandom(1 << 20), 'sub/changed.png': os.urandom(1 << 20)}
+    for rel_path, content in contents.items():
+        write_file(source_path / rel_path, content)
+    write_file(dest_path / "sub" / "changed.png", b'old', mtime=0)
+    seen = []
+    def on_file(rel_path):
+        seen.append(rel_path)
+        assert (dest_path / rel_path).read_bytes() == contents[rel_path]
+    returncode, _, stderr, count = sync_org.run_rsync(
+        ["rsync", "-rt", f"{source_path}/", f"{dest_path}/"], on_file=on_file
+    )
+    assert returncode == 0, stderr
+    assert sorted(seen) == sorted(contents) and count == 2
+
+def test_parse_rsync_stats():
+    output = (
+        "Number of regular files transferred: 1,204\n"
+        "Total transferred file size: 3,456,789 bytes\n"
+    )
+    assert sync_org.parse_rsync_stats(output) == {'files': 1204, 'bytes': 3456789}
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_archive_sync_sends_only_new_and_changed_files(tmp_path, local_figures, compression):
+    if shutil.which(compression) is None:
+        pytest.skip(f"{compression} is not installed")
+    source = make_source(tmp_path, 'a', {'one.png': b'1', 'sub/two.png': b'2'})
+    landed = []
+    assert sync_org.sync_figures_archive(
+        on_file=landed.append, sources=[source], compression=compression
+    )
+    assert sorted(landed) == ['one.png', 'sub/two.png']
+    assert (local_figures / "sub" / "two.png").read_bytes() == b'2'
+    
+    # A rerun right away sends nothing
+    assert sync_org.sync_figures_archive(
+        on_file=landed.append, sources=[source], compression=compression
+    )
+    assert len(landed) == 2
+    
+    # Files copied onto the remote with an old mtime are still picked up
+    write_file(tmp_path / "remote" / "a" / "old.png", b'old', mtime=1_000_000_000)
+    write_file(tmp_path / "remote" / "a" / "one.png", b'11')
+    assert sync_org.sync_figures_archive(
+        on_file=landed.append, sources=[source], compression=compression
+    )
+    assert sorted(landed[2:]) == ['old.png', 'one.png']
+    assert (local_figures / "one.png").read_bytes() == b'11'
+    manifest = sync_org.load_sync_manifest()
+    assert manifest['files']['old.png']['mtime'] == 1_000_000_000
+
+def test_archive_sync_merges_sources_by_listing(tmp_path, local_figures):
+    first = make_source(tmp_path, 'first', {'shared.png': b'first'})
+    second = make_source(tmp_path, 'second', {'shared.png': b'second', 'own.png': b'own'})
+    os.utime(tmp_path / "remote" / "first" / "shared.png", (2_000_000_000, 2_000_000_000))
+    os.utime(tmp_path / "remote" / "second" / "shared.png", (1_000_000_000, 1_000_000_000))
+    assert sync_org.sync_figures_archive(sources=[first, second], compression='gzip')
+    assert (local_figures / "shared.png").read_bytes() == b'first'
+    assert (local_figures / "own.png").read_bytes() == b'own'
+    assert sync_org.load_sync_manifest()['files']['shared.png']['source'] == 'first'
+
+def test_archive_sync_fails_on_a_missing_source(tmp_path, local_figures):
+    source = {'name': 'gone', 'host': '', 'path': str(tmp_path / "nowhere") + os.sep}
+    assert not sync_org.sync_figures_archive(sources=[source], compression='gzip')
+
+def test_sources_are_fetched_concurrently():
+    sources = [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}]
+    # Every task waits for the others, so this only returns if they overlap
+    barrier = threading.Barrier(len(sources), timeout=5)
+    def task(source):
+        barrier.wait()
+        return source['name'].upper()
+    assert sync_org.run_per_source(task, sources) == {'a': 'A', 'b': 'B', 'c': 'C'}
+
+def test_serialized_callbacks_never_overlap():
+    active = []
+    overlaps = []
+    def callback(value):
+        active.append(value)
+        overlaps.append(len(active) > 1)
+        active.remove(value)
+    call = sync_org.serialized(callback)
+    threads = [threading.Thread(target=lambda i=i: [call(i) for _ in range(200)]) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(overlaps) == 800 and not any(overlaps)
+    assert sync_org.serialized(None) is None
+
+def test_each_source_logs_to_its_own_file(tmp_path):
+    log = sync_org.get_source_logger({'name': 'logged'})
+    log.warning("hello")
+    for handler in log.logger.handlers:
+        handler.flush()
+    assert "[logged] hello" in (tmp_path / "sync_logged.log").read_text()